@@ -0,0 +1,223 @@
+import argparse
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from pdf_processing import HEADER, reference_rows_from_pages
+from extraction_cache import add_cache_arguments, configure_cache_from_args, get_cache, configure_cache, section_pages
+from pdf_backends import add_backend_argument
+from output_sink import open_sink
+import instrumentation
+from instrumentation import add_profile_arguments, configure_from_args, document
+
+# Asynchronous version of process_all_pdfs.
+#
+# The run is split into stages connected by bounded asyncio queues:
+#
+#   scan    list the directory (in a thread)
+#   read    read each PDF's bytes (in threads, several files at a time)
+#   decode  extract the section page texts from the bytes (worker processes)
+#   parse   count the references under each bold heading
+#   write   stream the rows to the output, in directory order
+#
+# Every stage runs concurrently, so reading files from a slow or
+# network-mounted corpus directory overlaps with the CPU-bound decoding, and
+# a run takes about as long as its slowest stage instead of the sum of all
+# of them. A full queue blocks the stage feeding it, which keeps at most
+# queue_size files in memory between any two stages.
+#
+# Usage: python async_pipeline.py <directory> <output.csv> [--workers 4] [--readers 8]
+
+# Marks the end of a queue's input; each consumer gets one
+DONE = None
+
+def list_pdfs(directory_path):
+    with os.scandir(directory_path) as entries:
+        return sorted(entry.name for entry in entries if entry.name.endswith('.pdf') and entry.is_file())
+
+def read_file(path):
+    with open(path, 'rb') as file:
+        return file.read()
+
+def init_worker(cache_args, profile_memory):
+    configure_cache(*cache_args)
+    instrumentation.init_worker(profile_memory)
+
+def decode_pdf(path, data, backend):
+    # Runs in a worker process; the bytes were already read by the parent.
+    # Stage timings, if profiling is on, travel back with the pages
+    with document(path):
+        pages = section_pages(path, backend, data=data)
+    return pages, instrumentation.drain()
+
+class StageTimer:
+    """Busy time and item counts per stage, to show which stage limits the run."""
+
+    def __init__(self):
+        self.busy = {}
+        self.items = {}
+
+    def add(self, stage, seconds):
+        self.busy[stage] = self.busy.get(stage, 0.0) + seconds
+        self.items[stage] = self.items.get(stage, 0) + 1
+
+    def report(self, wall_time):
+        logging.info("Wall time: %.2fs", wall_time)
+        for stage, busy in self.busy.items():
+            logging.info("  %-7s %6d items  %8.2fs busy", stage, self.items[stage], busy)
+
+async def scan_stage(directory_path, path_queue, readers, timer):
+    start = time.perf_counter()
+    names = await asyncio.to_thread(list_pdfs, directory_path)
+    timer.add("scan", time.perf_counter() - start)
+    for seq, name in enumerate(names):
+        await path_queue.put((seq, os.path.abspath(os.path.join(directory_path, name))))
+    for _ in range(readers):
+        await path_queue.put(DONE)
+    return len(names)
+
+async def read_stage(path_queue, bytes_queue, timer):
+    while (item := await path_queue.get()) is not DONE:
+        seq, path = item
+        start = time.perf_counter()
+        try:
+            data, error = await asyncio.to_thread(read_file, path), None
+        except OSError as e:
+            data, error = None, f"{type(e).__name__}: {e}"
+        timer.add("read", time.perf_counter() - start)
+        await bytes_queue.put((seq, path, data, error))
+
+async def decode_stage(bytes_queue, pages_queue, executor, backend, timer, profile_records):
+    loop = asyncio.get_running_loop()
+    while (item := await bytes_queue.get()) is not DONE:
+        seq, path, data, error = item
+        pages = None
+        if error is None:
+            start = time.perf_counter()
+            try:
+                pages, records = await loop.run_in_executor(executor, decode_pdf, path, data, backend)
+                profile_records.extend(records)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            timer.add("decode", time.perf_counter() - start)
+        # Drop the bytes as soon as they are decoded
+        await pages_queue.put((seq, path, pages, error))
+
+async def parse_stage(pages_queue, rows_queue, timer):
+    while (item := await pages_queue.get()) is not DONE:
+        seq, path, pages, error = item
+        rows = []
+        if error is None:
+            start = time.perf_counter()
+            try:
+                with document(path):
+                    rows = reference_rows_from_pages(path, pages)
+            except Exception as e:
+                # A failure here would otherwise end the stage and stall the writer
+                rows, error = [], f"{type(e).__name__}: {e}"
+            timer.add("parse", time.perf_counter() - start)
+        await rows_queue.put((seq, path, rows, error))
+
+async def write_stage(rows_queue, sink, timer):
+    # Results can finish out of order; hold them until their turn comes so the
+    # output follows the directory listing, as in process_all_pdfs
+    pending = {}
+    next_seq = 0
+    failed_files = []
+    while (item := await rows_queue.get()) is not DONE:
+        pending[item[0]] = item
+        while next_seq in pending:
+            seq, path, rows, error = pending.pop(next_seq)
+            next_seq += 1
+            filename = os.path.basename(path)
+            if error is not None:
+                failed_files.append(filename)
+                logging.warning("Failed to process %s: %s", filename, error)
+                continue
+            start = time.perf_counter()
+            sink.write_many(rows)
+            timer.add("write", time.perf_counter() - start)
+            logging.info("Finished processing %s (%d).", filename, next_seq)
+    return failed_files
+
+async def run_pipeline(directory_path, output_file, workers=4, readers=8, queue_size=16, backend="pymupdf",
+                       profile_report=None):
+    """
+    Count references under each bold heading for every PDF in a directory.
+
+    Args:
+    directory_path (str): Directory containing PDF files
+    output_file (str): Output file (.csv, .jsonl or .parquet)
+    workers (int): Decoding worker processes
+    readers (int): Files read concurrently
+    queue_size (int): Capacity of each queue between stages
+    backend (str): PDF library to extract text with (see pdf_backends)
+    profile_report (str): Run report path; needs profiling enabled (see instrumentation)
+
+    Returns:
+    list: File names that failed
+    """
+    path_queue = asyncio.Queue(queue_size)
+    bytes_queue = asyncio.Queue(queue_size)
+    pages_queue = asyncio.Queue(queue_size)
+    rows_queue = asyncio.Queue(queue_size)
+    timer = StageTimer()
+    profile_records = []
+    start = time.perf_counter()
+
+    # Workers use the same extraction cache as the parent
+    cache = get_cache()
+    cache_args = (cache.cache_dir, cache.max_bytes) if cache is not None else (None,)
+
+    async def close_after(tasks, queue, consumers):
+        # Once every producer of a queue is done, tell each of its consumers to stop
+        await asyncio.gather(*tasks)
+        for _ in range(consumers):
+            await queue.put(DONE)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(cache_args, instrumentation.worker_args())) as executor, \
+            open_sink(output_file, HEADER) as sink:
+        scan = asyncio.create_task(scan_stage(directory_path, path_queue, readers, timer))
+        read_tasks = [asyncio.create_task(read_stage(path_queue, bytes_queue, timer)) for _ in range(readers)]
+        # One decode task per worker keeps every worker busy without queueing more bytes in the executor
+        decode_tasks = [asyncio.create_task(decode_stage(bytes_queue, pages_queue, executor, backend, timer, profile_records))
+                        for _ in range(workers)]
+        parse = asyncio.create_task(parse_stage(pages_queue, rows_queue, timer))
+        write = asyncio.create_task(write_stage(rows_queue, sink, timer))
+
+        # An exception in any stage surfaces here instead of leaving the others waiting
+        results = await asyncio.gather(
+            scan,
+            close_after(read_tasks, bytes_queue, workers),
+            close_after(decode_tasks, pages_queue, 1),
+            close_after([parse], rows_queue, 1),
+            write,
+        )
+        total_files, failed_files = results[0], results[-1]
+
+    logging.info("All %d files processed (%d failed). Results saved to %s.", total_files, len(failed_files), output_file)
+    timer.report(time.perf_counter() - start)
+    if profile_report:
+        # Parse timings were recorded in this process
+        instrumentation.write_report(profile_report, profile_records + instrumentation.drain())
+    return failed_files
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Count references under each bold heading for every PDF in a directory, with overlapping I/O and parsing.")
+    parser.add_argument("directory_path", help="Directory containing PDF files")
+    parser.add_argument("output_file_path", help="Output file (.csv, .jsonl or .parquet)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Decoding worker processes")
+    parser.add_argument("--readers", type=int, default=8, help="Files read concurrently")
+    parser.add_argument("--queue-size", type=int, default=16, help="Capacity of each queue between stages")
+    add_backend_argument(parser)
+    add_cache_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    configure_from_args(args)
+    configure_cache_from_args(args)
+    asyncio.run(run_pipeline(args.directory_path, args.output_file_path, args.workers, args.readers,
+                             args.queue_size, args.backend, args.profile))
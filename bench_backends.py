@@ -0,0 +1,170 @@
+import argparse
+import csv
+import json
+import os
+import subprocess
+import sys
+import time
+
+from pdf_backends import BACKENDS, open_backend
+
+# Benchmark the pdf_backends over a local fixture corpus.
+#
+# Each backend runs in its own child process so the peak RSS it reports
+# belongs to that backend alone. For every backend we report:
+#
+#   pages/sec       full-document page text extraction throughput
+#   section ms/doc  time to locate and extract the included-studies section
+#   peak RSS        maximum resident set size of the child process
+#   recall          share of the reference (file, heading) pairs the backend finds
+#   count agreement share of those headings whose reference count also matches
+#
+# The reference is either a hand-labelled CSV (--labels, columns
+# File Name/Bold Text/Number of References as written by process_all_pdfs)
+# or the output of another backend (--reference, pymupdf by default).
+#
+# Usage: python bench_backends.py <fixture_dir> [--backends pymupdf pypdf2] [--json report.json]
+
+def peak_rss_kb():
+    # ru_maxrss is in KB on Linux and bytes on macOS; resource is missing on Windows
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        memory = psutil.Process().memory_info()
+        return getattr(memory, 'peak_wset', memory.rss) // 1024
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+def run_worker(backend, fixture_dir):
+    """Benchmark one backend in this process and return its measurements."""
+    from extraction_cache import configure_cache
+    from pdf_processing import count_bold_headings_and_blocks_for_csv, extract_references_section
+    from section_locator import section_pages
+
+    # Always measure real extraction, never cache hits
+    configure_cache(None)
+
+    pdf_files = sorted(f for f in os.listdir(fixture_dir) if f.lower().endswith('.pdf'))
+    pages = 0
+    extract_seconds = 0.0
+    section_seconds = 0.0
+    headings = {}
+    errors = {}
+
+    for filename in pdf_files:
+        pdf_path = os.path.join(fixture_dir, filename)
+        try:
+            # Full-document throughput
+            start = time.perf_counter()
+            with open_backend(pdf_path, backend) as document:
+                for page_index in range(document.page_count):
+                    document.page_text(page_index)
+                pages += document.page_count
+            extract_seconds += time.perf_counter() - start
+
+            # Production path: section pages only, then the heading counter
+            start = time.perf_counter()
+            with open_backend(pdf_path, backend) as document:
+                text = "".join(section_pages(document))
+            section_seconds += time.perf_counter() - start
+
+            reference_blocks = count_bold_headings_and_blocks_for_csv(extract_references_section(text))
+            headings[filename] = [[heading, count] for heading, count in reference_blocks]
+        except Exception as e:
+            errors[filename] = f"{type(e).__name__}: {e}"
+
+    return {
+        "backend": backend,
+        "files": len(pdf_files),
+        "pages": pages,
+        "extract_seconds": extract_seconds,
+        "pages_per_sec": pages / extract_seconds if extract_seconds else None,
+        "section_ms_per_doc": 1000 * section_seconds / len(pdf_files) if pdf_files else None,
+        "peak_rss_kb": peak_rss_kb(),
+        "headings": headings,
+        "errors": errors,
+    }
+
+def run_backend(backend, fixture_dir):
+    # A fresh interpreter per backend keeps the RSS measurements independent
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), "--worker", backend, fixture_dir],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"{backend} benchmark failed:\n{result.stderr}")
+    return json.loads(result.stdout.splitlines()[-1])
+
+def load_labels(labels_path):
+    headings = {}
+    with open(labels_path, newline='', encoding='utf-8') as csvfile:
+        for row in csv.DictReader(csvfile):
+            headings.setdefault(row['File Name'], []).append([row['Bold Text'], int(row['Number of References'])])
+    return headings
+
+def agreement(headings, reference):
+    """
+    Compare one backend's headings with the reference headings.
+
+    Returns:
+    tuple: (recall, count_agreement), both fractions of the reference headings
+    """
+    expected = {(filename, heading): count for filename, rows in reference.items() for heading, count in rows}
+    found = {(filename, heading): count for filename, rows in headings.items() for heading, count in rows}
+    if not expected:
+        return None, None
+    matched = [key for key in expected if key in found]
+    counts_equal = sum(1 for key in matched if found[key] == expected[key])
+    return len(matched) / len(expected), counts_equal / len(expected)
+
+def format_number(value, spec):
+    return "n/a" if value is None else format(value, spec)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PDF text backends over a fixture corpus.")
+    parser.add_argument("fixture_dir", help="Directory of fixture PDFs")
+    parser.add_argument("--backends", nargs="+", default=sorted(BACKENDS), choices=sorted(BACKENDS), help="Backends to benchmark")
+    parser.add_argument("--reference", default="pymupdf", choices=sorted(BACKENDS), help="Backend whose headings count as ground truth")
+    parser.add_argument("--labels", help="Hand-labelled CSV to use as ground truth instead of a reference backend")
+    parser.add_argument("--json", help="Write the full report to this JSON file")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, args.fixture_dir)))
+        return 0
+
+    results = {backend: run_backend(backend, args.fixture_dir) for backend in args.backends}
+
+    if args.labels:
+        reference = load_labels(args.labels)
+        reference_name = os.path.basename(args.labels)
+    else:
+        if args.reference not in results:
+            results[args.reference] = run_backend(args.reference, args.fixture_dir)
+        reference = results[args.reference]["headings"]
+        reference_name = args.reference
+
+    print(f"Benchmark over {args.fixture_dir} (reference: {reference_name})\n")
+    print(f"{'backend':<10} {'pages/sec':>10} {'section ms/doc':>15} {'peak RSS MB':>12} {'recall':>8} {'count agr.':>11} {'errors':>7}")
+    for backend in args.backends:
+        result = results[backend]
+        recall, count_agreement = agreement(result["headings"], reference)
+        result["recall"] = recall
+        result["count_agreement"] = count_agreement
+        peak_mb = result["peak_rss_kb"] / 1024 if result["peak_rss_kb"] is not None else None
+        print(f"{backend:<10} {format_number(result['pages_per_sec'], '10.1f')} "
+              f"{format_number(result['section_ms_per_doc'], '15.1f')} {format_number(peak_mb, '12.1f')} "
+              f"{format_number(recall, '8.3f')} {format_number(count_agreement, '11.3f')} {len(result['errors']):>7}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"reference": reference_name, "results": results}, f, indent=2)
+        print(f"\nFull report saved to {args.json}")
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
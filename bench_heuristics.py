@@ -0,0 +1,267 @@
+import argparse
+import json
+import os
+import re
+import statistics
+import time
+from collections import Counter
+from functools import partial
+
+from matchers import (BLOCK_RE, BRACKETED_REFERENCE_RE, HEADING_RE, NUMBERED_SPLIT_RE, V18_HEADING_RE,
+                      V20_HEADING_RE, WHITESPACE_RE, count_heading_blocks)
+from pdf_processing import extract_references_section
+from text_normalize import NormalizedText, split_span
+from extraction_cache import add_cache_arguments, configure_cache, configure_cache_from_args, get_cache, section_pages
+from pdf_backends import add_backend_argument
+
+# Accuracy and speed of the reference heuristics on a labelled fixture set.
+#
+# Every version of the heading and reference patterns (reference_extraction
+# v18 and v20, cochrane_bias v3 and v6, the pdf_processing block counter) is
+# registered in HEURISTICS and run over the same documents: the .txt and .pdf
+# files of bench_fixtures/, whose included-studies headings and reference
+# counts are hand-labelled in bench_fixtures/labels.json. Text fixtures are
+# the included-studies pages as a backend extracts them; PDF fixtures are read
+# through the extraction cache, so repeated runs only time the patterns.
+#
+# For each heuristic the report gives
+#
+#   headings P/R     predicted headings that are labelled / labelled
+#                    headings that were found (heading heuristics only)
+#   refs P/R         references credited, min(predicted, labelled) per
+#                    heading, over those predicted / labelled. Heuristics
+#                    that only split out references are credited per document.
+#   ms/doc           mean of the best of --repeat runs per document
+#
+# Text fixtures carry no font information, so the v18 and v20 patterns are
+# matched at line starts in place of the bold spans they are applied to in
+# the extractors, and reference counts under their headings come from the
+# pdf_processing block separators.
+#
+# Python's re engine exposes no backtracking counters, so hotspots are found
+# by timing each pattern line by line: the lines costing the most per
+# character, against the pattern's median, are where the engine retries most.
+# The time of a findall on an empty string, the per-call overhead, is taken
+# off each line's time first, and lines shorter than MIN_HOTSPOT_CHARS are
+# left out, since on those the overhead that remains still dominates.
+#
+# Usage: python bench_heuristics.py [--fixtures bench_fixtures] [--workers 4] [--repeat 20]
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_fixtures")
+LABELS_FILE = "labels.json"
+
+# Shortest line timed for the regex hotspots
+MIN_HOTSPOT_CHARS = 20
+
+START_TERM = "Referencestostudiesincludedinthisreview"
+END_TERM = "Referencestostudiesexcludedfromthisreview"
+
+def line_start_heading_re(pattern):
+    # A heading pattern anchored at line starts, with the one group count_heading_blocks splits on
+    return re.compile(r'(?m)^(' + pattern.pattern + r')')
+
+V18_LINE_HEADING_RE = line_start_heading_re(V18_HEADING_RE)
+V20_LINE_HEADING_RE = line_start_heading_re(V20_HEADING_RE)
+
+def heading_counts(heading_re, text):
+    return count_heading_blocks(extract_references_section(text), heading_re)
+
+def section_span(text):
+    # cochrane_bias: section bounds found ignoring whitespace, as offsets into text
+    return NormalizedText(text).between(START_TERM, END_TERM)
+
+def numbered_references(text):
+    # cochrane_bias_v3: split the section on reference numbers
+    section = section_span(text)
+    if section is None:
+        return []
+    references = (WHITESPACE_RE.sub(' ', reference).strip() for reference in split_span(NUMBERED_SPLIT_RE, text, *section))
+    return [(None, 1) for reference in references if reference]
+
+def bracketed_references(text):
+    # cochrane_bias_v6: references ending with [...] or (...).
+    section = section_span(text)
+    if section is None:
+        return []
+    return [(None, 1) for _ in BRACKETED_REFERENCE_RE.findall(text, *section)]
+
+# Heuristic name -> (function of the section pages text returning (heading, count)
+# rows, heading None for a reference with no heading; the patterns it runs)
+HEURISTICS = {
+    "pdf_processing": (partial(heading_counts, HEADING_RE), [("HEADING_RE", HEADING_RE), ("BLOCK_RE", BLOCK_RE)]),
+    "v18": (partial(heading_counts, V18_LINE_HEADING_RE), [("V18_HEADING_RE", V18_LINE_HEADING_RE), ("BLOCK_RE", BLOCK_RE)]),
+    "v20": (partial(heading_counts, V20_LINE_HEADING_RE), [("V20_HEADING_RE", V20_LINE_HEADING_RE), ("BLOCK_RE", BLOCK_RE)]),
+    "v3_numbered": (numbered_references, [("NUMBERED_SPLIT_RE", NUMBERED_SPLIT_RE)]),
+    "v6_bracketed": (bracketed_references, [("BRACKETED_REFERENCE_RE", BRACKETED_REFERENCE_RE)]),
+}
+
+def load_fixtures(fixtures_dir):
+    """
+    Fixture paths and their labels.
+
+    Returns:
+    list: (path, {heading: reference count}) for every labelled .txt or .pdf file
+    """
+    with open(os.path.join(fixtures_dir, LABELS_FILE), encoding='utf-8') as f:
+        labels = json.load(f)
+    fixtures = []
+    for name in sorted(labels):
+        path = os.path.join(fixtures_dir, name)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Labelled fixture {name} is missing from {fixtures_dir}")
+        fixtures.append((path, labels[name]))
+    return fixtures
+
+def fixture_text(path, backend):
+    if path.lower().endswith('.pdf'):
+        return "".join(section_pages(path, backend))
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+def score(rows, labels):
+    """
+    Credit one document's rows against its labels.
+
+    Returns:
+    dict: Heading and reference counts predicted, labelled and credited
+    """
+    predicted = Counter()
+    for heading, count in rows:
+        predicted[heading] += count
+    labelled_refs = sum(labels.values())
+    predicted_refs = sum(predicted.values())
+    if None in predicted:
+        # No headings to match on: credit the references per document
+        return {'headings': 0, 'labelled_headings': len(labels), 'matched_headings': 0,
+                'refs': predicted_refs, 'labelled_refs': labelled_refs,
+                'matched_refs': min(predicted_refs, labelled_refs)}
+    matched = [heading for heading in predicted if heading in labels]
+    return {'headings': len(predicted), 'labelled_headings': len(labels), 'matched_headings': len(matched),
+            'refs': predicted_refs, 'labelled_refs': labelled_refs,
+            'matched_refs': sum(min(predicted[heading], labels[heading]) for heading in matched)}
+
+def best_time(func, text, repeat):
+    # Best wall time of repeat calls, in seconds
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def line_costs(pattern, text, repeat):
+    # (ns per character, line number, line) of every line of MIN_HOTSPOT_CHARS
+    # or more, net of the cost of the call itself
+    overhead = best_time(pattern.findall, "", repeat)
+    costs = []
+    for number, line in enumerate(text.splitlines(), start=1):
+        if len(line.strip()) >= MIN_HOTSPOT_CHARS:
+            elapsed = max(best_time(pattern.findall, line, repeat) - overhead, 0.0)
+            costs.append((elapsed * 1e9 / len(line), number, line))
+    return costs
+
+def run_fixture(fixture, backend="pymupdf", repeat=20, hotspots=3):
+    """
+    Run every heuristic over one fixture.
+
+    Args:
+    fixture (tuple): (path, labels) from load_fixtures
+    backend (str): PDF library for PDF fixtures (see pdf_backends)
+    repeat (int): Timed runs per heuristic; the best is kept
+    hotspots (int): Costliest lines kept per pattern
+
+    Returns:
+    tuple: (file name, {heuristic: (score, seconds)},
+    {pattern name: ([ns per char of every line], [(ns per char, file name, line number, line)])})
+    """
+    path, labels = fixture
+    name = os.path.basename(path)
+    text = fixture_text(path, backend)
+    results = {}
+    costs = {}
+    for heuristic, (func, patterns) in HEURISTICS.items():
+        results[heuristic] = (score(func(text), labels), best_time(func, text, repeat))
+        for pattern_name, pattern in patterns:
+            if pattern_name not in costs:
+                lines = sorted(line_costs(pattern, text, max(repeat // 4, 1)), reverse=True)
+                costs[pattern_name] = ([cost for cost, _, _ in lines],
+                                       [(cost, name, number, line) for cost, number, line in lines[:hotspots]])
+    return name, results, costs
+
+def ratio(numerator, denominator):
+    return numerator / denominator if denominator else 0.0
+
+def print_report(results, hot_lines, top):
+    print(f"{'heuristic':<16} {'headings P':>10} {'R':>6} {'refs P':>8} {'R':>6} {'ms/doc':>8}")
+    for heuristic in HEURISTICS:
+        totals = Counter()
+        seconds = []
+        for document in results.values():
+            document_score, elapsed = document[heuristic]
+            totals.update(document_score)
+            seconds.append(elapsed)
+        if totals['headings']:
+            headings = f"{ratio(totals['matched_headings'], totals['headings']):>10.2f} " \
+                       f"{ratio(totals['matched_headings'], totals['labelled_headings']):>6.2f}"
+        else:
+            headings = f"{'-':>10} {'-':>6}"
+        print(f"{heuristic:<16} {headings} {ratio(totals['matched_refs'], totals['refs']):>8.2f} "
+              f"{ratio(totals['matched_refs'], totals['labelled_refs']):>6.2f} {statistics.mean(seconds) * 1000:>8.3f}")
+
+    print("\nPer document (refs predicted/labelled):")
+    for name, document in sorted(results.items()):
+        counts = "  ".join(f"{heuristic} {document[heuristic][0]['refs']}/{document[heuristic][0]['labelled_refs']}"
+                           for heuristic in HEURISTICS)
+        print(f"  {name}: {counts}")
+
+    print(f"\nRegex hotspots (costliest lines of {MIN_HOTSPOT_CHARS}+ characters per pattern, "
+          "ns per character net of call overhead):")
+    for pattern_name, (costs, lines) in sorted(hot_lines.items()):
+        if not costs:
+            continue
+        median = statistics.median(costs)
+        print(f"  {pattern_name}: median {median:.1f}")
+        for cost, name, number, line in sorted(lines, reverse=True)[:top]:
+            print(f"    {cost:8.1f} ({ratio(cost, median):4.1f}x)  {name}:{number}  {line[:60]}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure accuracy and speed of the reference heuristics on labelled fixtures.")
+    parser.add_argument("--fixtures", default=FIXTURES_DIR, help=f"Fixture directory with a {LABELS_FILE}")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of worker processes (1 = serial)")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed runs per heuristic and document")
+    parser.add_argument("--hotspots", type=int, default=3, help="Costliest lines to list per pattern")
+    add_backend_argument(parser)
+    add_cache_arguments(parser)
+    args = parser.parse_args()
+
+    configure_cache_from_args(args)
+    fixtures = load_fixtures(args.fixtures)
+    run_one = partial(run_fixture, backend=args.backend, repeat=args.repeat, hotspots=args.hotspots)
+
+    start = time.perf_counter()
+    workers = min(args.workers, len(fixtures))
+    if workers > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        # Workers read PDF fixtures through the same extraction cache as the parent
+        cache = get_cache()
+        cache_args = (cache.cache_dir, cache.max_bytes) if cache is not None else (None,)
+        with ProcessPoolExecutor(max_workers=workers, initializer=configure_cache, initargs=cache_args) as executor:
+            outputs = list(executor.map(run_one, fixtures))
+    else:
+        outputs = [run_one(fixture) for fixture in fixtures]
+
+    results = {name: document for name, document, _ in outputs}
+    hot_lines = {}
+    for _, _, costs in outputs:
+        for pattern_name, (line_costs, lines) in costs.items():
+            pattern_costs, pattern_lines = hot_lines.setdefault(pattern_name, ([], []))
+            pattern_costs.extend(line_costs)
+            pattern_lines.extend(lines)
+    print(f"{len(fixtures)} fixtures from {args.fixtures}, best of {args.repeat} runs, "
+          f"{workers} worker(s), {time.perf_counter() - start:.1f}s\n")
+    print_report(results, hot_lines, args.hotspots)
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,98 @@
+import argparse
+import csv
+import re
+import timeit
+
+import matchers
+
+# Micro-benchmarks for matchers.py against the inline raw-string call sites it
+# replaced. Each pair runs over the same text, and the match counts are
+# printed next to the timings so it is visible that both sides agree.
+#
+# The default sample has no bracketed identifiers or author-year keys; pass
+# --text with a bench_fixtures/*.txt file for a section that has them.
+#
+# Usage: python bench_matchers.py [--csv extracted_references.csv | --text bench_fixtures/surnames.txt] [--number 200]
+
+def load_text(csv_path):
+    # The sample CSV holds one reference section per row under a "Reference" header
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        return "\n".join(row[0] for row in csv.reader(f) if row and row[0] != "Reference")
+
+def inline_identifiers(text):
+    # reference_extraction_v20.save_to_csv before matchers: two passes, raw strings
+    doi_matches = re.findall(r'\[DOI:(.*?)\]', text)
+    pmid_matches = re.findall(r'\[PMID:(.*?)\]', text)
+    return doi_matches, pmid_matches
+
+def inline_heading_blocks(text):
+    # pdf_processing.count_bold_headings_and_blocks_for_csv before matchers
+    heading_pattern = r"([A-Za-z]+ \d{4})"
+    text_blocks = re.split(heading_pattern, text)[1:]
+    block_pattern = r"(\n\s*\n|[•\d\)\(]+\s+|(?<=\n)[A-Z][a-z]+\s+\d{4}|\*{3,})"
+    reference_blocks = []
+    for i in range(0, len(text_blocks), 2):
+        reference = text_blocks[i].strip()
+        block_count = len(re.findall(block_pattern, text_blocks[i + 1].strip())) + 1
+        reference_blocks.append((reference, block_count))
+    return reference_blocks
+
+def inline_author_year_split(text):
+    # reference-parser.parse_references before matchers
+    return re.split(r'([A-Z][a-z]+(?:\s[A-Z][a-z]+)?\s+(?:et\s+al\.?\s+)?(?:\d{4}[a-z]?))', text)
+
+def inline_chunk_fields(text):
+    # Everything scan_chunk returns, gathered the old way: one pass per field
+    doi_matches, pmid_matches = inline_identifiers(text)
+    author_years = re.findall(r'[A-Z][a-z]+(?:\s[A-Z][a-z]+)?\s+(?:et\s+al\.?\s+)?\d{4}[a-z]?', text)
+    block_count = len(re.findall(r"(\n\s*\n|[•\d\)\(]+\s+|(?<=\n)[A-Z][a-z]+\s+\d{4}|\*{3,})", text))
+    return doi_matches, pmid_matches, author_years, block_count
+
+def chunk_count(result):
+    if isinstance(result, tuple):
+        return "/".join(str(len(part)) if isinstance(part, list) else str(part) for part in result)
+    return str(len(result))
+
+def best_time(func, text, number, repeat=5):
+    return min(timeit.repeat(lambda: func(text), number=number, repeat=repeat)) / number
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the precompiled matchers against inline patterns.")
+    parser.add_argument("--csv", default="extracted_references.csv", help="Sample text (first column of a CSV)")
+    parser.add_argument("--text", help="Sample text file, used instead of --csv")
+    parser.add_argument("--number", type=int, default=200, help="Calls per timing run")
+    args = parser.parse_args()
+
+    if args.text:
+        with open(args.text, encoding='utf-8') as f:
+            text = f.read()
+    else:
+        text = load_text(args.csv)
+    # Chunks as reference_extraction_v20 sees them: one per reference-sized piece
+    chunks = [chunk for chunk in re.split(r'(?<=\.)(?=[A-Z][a-z]+\d{4}\{)', text) if chunk]
+
+    cases = [
+        ("DOI+PMID, whole text", inline_identifiers, matchers.scan_identifiers, text),
+        ("DOI+PMID, per chunk", lambda t: [inline_identifiers(c) for c in chunks],
+         lambda t: [matchers.scan_identifiers(c) for c in chunks], text),
+        ("all chunk fields", inline_chunk_fields,
+         lambda t: tuple(matchers.scan_chunk(t)), text),
+        ("heading blocks", inline_heading_blocks,
+         lambda t: matchers.count_heading_blocks(t, matchers.HEADING_RE), text),
+        ("author-year split", inline_author_year_split, matchers.AUTHOR_YEAR_SPLIT_RE.split, text),
+    ]
+
+    print(f"Sample: {args.text or args.csv} ({len(text)} chars, {len(chunks)} chunks)\n")
+    print(f"{'case':<22} {'inline us':>10} {'matchers us':>12} {'speedup':>8}  matches (inline | matchers)")
+    for name, inline, compiled, sample in cases:
+        inline_time = best_time(inline, sample, args.number)
+        compiled_time = best_time(compiled, sample, args.number)
+        inline_result = inline(sample)
+        compiled_result = compiled(sample)
+        print(f"{name:<22} {inline_time * 1e6:>10.1f} {compiled_time * 1e6:>12.1f} {inline_time / compiled_time:>7.2f}x  "
+              f"{chunk_count(inline_result)} | {chunk_count(compiled_result)}")
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,90 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Cold-start benchmark for cli.py.
+#
+# Each measurement starts a fresh interpreter, the way a job scheduler calling
+# the CLI once per PDF does. For every subcommand it times
+#
+#   parser   python cli.py <command> --help (argparse only, no handler)
+#   import   importing the subcommand's handler (cli.load)
+#
+# against a bare interpreter and against importing the standalone script the
+# subcommand replaces. With --pdf, a full single-file run of triage and
+# extract is timed too. The heaviest modules behind each import are listed
+# from python -X importtime.
+#
+# Usage: python bench_startup.py [--runs 20] [--pdf sample.pdf]
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Standalone script module each subcommand stands in for
+LEGACY_MODULES = {
+    "triage": "pdfimage_analyzer",
+    "extract": "process_all_pdfs",
+    "batch": "triage_extract",
+}
+
+def run_python(args, runs):
+    # Median and minimum wall time in ms of python <args>, one new process per run
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + args, cwd=HERE, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times), min(times)
+
+def import_times(code):
+    # (depth, module, cumulative us) from python -X importtime, in report order
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=HERE,
+                            capture_output=True, text=True, check=True)
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nesting is shown as two more spaces of indentation per level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((depth, name.strip(), int(cumulative)))
+    return entries
+
+def heaviest_imports(code, top=5):
+    """Modules code imports beyond interpreter startup, at most one level deep, heaviest first."""
+    startup = {name for _, name, _ in import_times("pass")}
+    entries = [(cumulative, name) for depth, name, cumulative in import_times(code)
+               if depth <= 1 and name not in startup]
+    return sorted(entries, reverse=True)[:top]
+
+def print_row(label, timing, baseline):
+    median, best = timing
+    print(f"  {label:<28} median {median:7.1f} ms  min {best:7.1f} ms  (+{median - baseline:6.1f} ms)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start latency of the cli.py subcommands.")
+    parser.add_argument("--runs", type=int, default=20, help="Interpreter starts per measurement")
+    parser.add_argument("--pdf", help="PDF for an end-to-end single-file run of triage and extract")
+    args = parser.parse_args()
+
+    baseline = run_python(["-c", "pass"], args.runs)
+    print(f"Bare interpreter: median {baseline[0]:.1f} ms, min {baseline[1]:.1f} ms over {args.runs} runs")
+
+    for command, legacy_module in LEGACY_MODULES.items():
+        print(f"\n{command}")
+        print_row("parser (--help)", run_python(["cli.py", command, "--help"], args.runs), baseline[0])
+        load_code = f"import cli; cli.load({command!r})"
+        print_row("import handler", run_python(["-c", load_code], args.runs), baseline[0])
+        print_row(f"import {legacy_module}", run_python(["-c", f"import {legacy_module}"], args.runs), baseline[0])
+        if args.pdf and command != "batch":
+            run_args = ["cli.py", command, args.pdf, "--output", os.devnull, "--format", "csv"]
+            print_row("single-file run", run_python(run_args, args.runs), baseline[0])
+        for cumulative, name in heaviest_imports(load_code):
+            print(f"    {cumulative / 1000:7.1f} ms  {name}")
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,145 @@
+import argparse
+import importlib
+import logging
+import os
+
+# One entry point for the per-file and batch commands:
+#
+#   python cli.py triage PDF... [--output out.csv] [--append]
+#   python cli.py extract PDF... [--output out.csv] [--append]
+#   python cli.py batch DIRECTORY OUTPUT [--workers 4]
+#
+# A job scheduler that starts the interpreter once per PDF pays the import
+# cost on every call, and the standalone scripts load PDF libraries, pandas
+# and multiprocessing up front. This module imports only argparse and
+# logging; each subcommand imports the module that does its work when it
+# runs (see HANDLERS), and the PDF libraries load only when a backend is
+# opened. bench_startup.py measures the cold start of each subcommand.
+#
+# Output goes to standard output as CSV unless --output names a file.
+
+# Subcommand -> (module, function) that does its work, imported on first use
+HANDLERS = {
+    "triage": ("pdfimage_analyzer", "analyze_pdf"),
+    "extract": ("pdf_processing", "extract_reference_rows"),
+    "batch": ("triage_extract", "triage_extract_directory"),
+}
+
+# Kept in step with pdf_backends.BACKENDS, which is not imported to build the parser
+BACKEND_CHOICES = ["pdfminer", "pymupdf", "pypdf2"]
+CACHE_DIR_ENV = "REFPARSE_CACHE_DIR"
+
+def load(command):
+    """Import and return the function that runs a subcommand."""
+    module_name, function_name = HANDLERS[command]
+    return getattr(importlib.import_module(module_name), function_name)
+
+def configure_cache(args):
+    if args.cache_dir:
+        from extraction_cache import configure_cache
+        configure_cache(args.cache_dir)
+
+def run_triage(args):
+    analyze_pdf = load("triage")
+    from pdfimage_analyzer import RESULT_FIELDS
+    from output_sink import open_sink
+
+    fieldnames = RESULT_FIELDS + ["Method"] if args.mode == "structural" else RESULT_FIELDS
+    failed = 0
+    with open_sink(args.output, fieldnames, format=args.format, append=args.append) as sink:
+        for pdf_path in args.pdf_paths:
+            result = analyze_pdf(pdf_path, args.max_pages, args.backend, args.early_exit, args.mode)
+            failed += result.error is not None
+            sink.write(result.as_dict())
+    return 1 if failed else 0
+
+def run_extract(args):
+    extract_reference_rows = load("extract")
+    from pdf_processing import HEADER
+    from output_sink import open_sink
+
+    configure_cache(args)
+    failed = 0
+    with open_sink(args.output, HEADER, format=args.format, append=args.append) as sink:
+        for pdf_path in args.pdf_paths:
+            try:
+                sink.write_many(extract_reference_rows(pdf_path, args.backend, args.segmenter))
+            except Exception as e:
+                failed += 1
+                logging.error("Failed to process %s: %s: %s", os.path.basename(pdf_path), type(e).__name__, e)
+    return 1 if failed else 0
+
+def run_batch(args):
+    triage_extract_directory = load("batch")
+    from pdfimage_analyzer import generate_summary
+
+    configure_cache(args)
+    extract_types = ("Text-based", "Hybrid") if args.extract_hybrid else ("Text-based",)
+    summary = triage_extract_directory(args.directory_path, args.output_file_path, args.workers, args.chunksize,
+                                       args.max_pages, args.backend, args.early_exit, extract_types)
+    generate_summary(summary)
+    return 0
+
+def add_output_arguments(parser):
+    parser.add_argument("--output", default="-", help="Output file (.csv, .jsonl or .parquet); standard output if omitted")
+    parser.add_argument("--format", choices=["csv", "jsonl", "parquet"], help="Output format (default: from the file extension)")
+    parser.add_argument("--append", action="store_true", help="Append to the output file, for one call per PDF (CSV or JSON Lines only)")
+
+def check_output_arguments(parser, args):
+    """Reject --output/--format/--append combinations the sink cannot open, before any PDF is read."""
+    from output_sink import STDOUT, infer_format
+
+    try:
+        file_format = args.format or infer_format(args.output)
+    except ValueError as e:
+        parser.error(str(e))
+    if file_format == "parquet" and args.output == STDOUT:
+        parser.error("Parquet output needs a file: pass --output out.parquet")
+    if file_format == "parquet" and args.append:
+        parser.error("Parquet output cannot be appended to: use .csv or .jsonl with --append")
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Triage PDFs and extract their included-studies references.")
+    parser.add_argument("--log-level", default="WARNING", choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"], help="Set the logging level")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    triage = subparsers.add_parser("triage", help="Classify PDFs as Text-based, Image-based or Hybrid")
+    triage.add_argument("pdf_paths", nargs="+", help="PDF files")
+    triage.add_argument("--max-pages", type=int, default=5, help="Maximum number of pages to analyze per PDF")
+    triage.add_argument("--backend", default="pymupdf", choices=BACKEND_CHOICES, help="PDF text extraction library (default: pymupdf)")
+    triage.add_argument("--mode", default="full", choices=["full", "structural"], help="Classify from extracted text, or from content-stream structure")
+    triage.add_argument("--early-exit", action="store_true", help="Stop extracting page text once a PDF is settled as Text-based")
+    add_output_arguments(triage)
+    triage.set_defaults(run=run_triage)
+
+    extract = subparsers.add_parser("extract", help="Count references under each bold heading")
+    extract.add_argument("pdf_paths", nargs="+", help="PDF files")
+    extract.add_argument("--backend", default="pymupdf", choices=BACKEND_CHOICES, help="PDF text extraction library (default: pymupdf)")
+    extract.add_argument("--segmenter", default="regex", choices=["regex", "layout"], help="Count references by separator regex, or segment them from the page layout")
+    extract.add_argument("--cache-dir", default=os.environ.get(CACHE_DIR_ENV), help="Directory for the extraction cache (disabled if not set)")
+    add_output_arguments(extract)
+    extract.set_defaults(run=run_extract)
+
+    batch = subparsers.add_parser("batch", help="Triage a directory and extract the text-based PDFs in one pass")
+    batch.add_argument("directory_path", help="Directory containing PDF files")
+    batch.add_argument("output_file_path", help="Output file (.csv, .jsonl or .parquet)")
+    batch.add_argument("--workers", type=int, default=1, help="Number of worker processes (1 = serial)")
+    batch.add_argument("--chunksize", type=int, default=4, help="PDFs handed to a worker process at a time")
+    batch.add_argument("--max-pages", type=int, default=5, help="Maximum number of pages to classify from")
+    batch.add_argument("--backend", default="pymupdf", choices=BACKEND_CHOICES, help="PDF text extraction library (default: pymupdf)")
+    batch.add_argument("--early-exit", action="store_true", help="Stop extracting page text once a PDF is settled as Text-based")
+    batch.add_argument("--extract-hybrid", action="store_true", help="Also extract references from Hybrid PDFs")
+    batch.add_argument("--cache-dir", default=os.environ.get(CACHE_DIR_ENV), help="Directory for the extraction cache (disabled if not set)")
+    batch.set_defaults(run=run_batch)
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if hasattr(args, "append"):
+        check_output_arguments(parser, args)
+    logging.basicConfig(level=args.log_level, format='%(asctime)s - %(levelname)s - %(message)s')
+    return args.run(args)
+
+if __name__ == "__main__":
+    exit(main())
@@ -1,37 +1,39 @@
 import csv
-import re
+from matchers import WHITESPACE_RE, NUMBERED_SPLIT_RE
+from text_normalize import NormalizedText, split_span
+import argparse
 
 # Install the pdfminer.six library (if not already on computer)
 #   Copy and paste the line below into your computer's terminal:
 #       pip install pdfminer.six
 
-from pdfminer.high_level import extract_text
+from extraction_cache import section_pages
+from pdf_backends import add_backend_argument
 
-def extract_references_and_save_to_csv(pdf_path, csv_path):
-    # Extract the entire text from the PDF
-    full_text = extract_text(pdf_path)
+def extract_references_and_save_to_csv(pdf_path, csv_path, backend="pdfminer"):
+    # Extract the text of the pages holding the references section
+    full_text = "".join(section_pages(pdf_path, backend))
     
-    # Normalize spaces to handle situations like "Referencestostudiesincludedinthisreview"
-    normalized_text = re.sub(r'\s+', '', full_text)
+    # Find the section boundaries ignoring whitespace, to handle situations like
+    # "Referencestostudiesincludedinthisreview"; the offsets map back to full_text
+    normalized_text = NormalizedText(full_text)
     
     # Define the section boundaries
     start_term = "Referencestostudiesincludedinthisreview"
     end_term = "Referencestostudiesexcludedfromthisreview"
     
-    # Extract the text between the start and end terms
-    start_index = normalized_text.find(start_term)
-    end_index = normalized_text.find(end_term, start_index)
+    # Locate the text between the start and end terms
+    section = normalized_text.between(start_term, end_term)
     
-    if start_index == -1 or end_index == -1:
+    if section is None:
         print("Could not find the specified sections in the document.")
         return
     
-    # Extract references section
-    references_section = normalized_text[start_index + len(start_term):end_index]
-    
-    # Split the references based on a common pattern (e.g., '\d+.\s' for numbered references)
-    references = re.split(r'\d+\.\s', references_section)
-    references = [ref.strip() for ref in references if ref.strip()]  # Clean and remove empty entries
+    # Split the references section of the original text, word boundaries intact,
+    # based on a common pattern (e.g., '\d+.\s' for numbered references)
+    references = split_span(NUMBERED_SPLIT_RE, full_text, *section)
+    references = [WHITESPACE_RE.sub(' ', ref).strip() for ref in references]  # Collapse line breaks
+    references = [ref for ref in references if ref]  # Remove empty entries
     
     # Write the references to a CSV file
     with open(csv_path, mode='w', newline='', encoding='utf-8') as file:
@@ -47,7 +49,14 @@ def extract_references_and_save_to_csv(pdf_path, csv_path):
 #pdf_path- replace text in quotes with Cochrane pdf filepath
 pdf_path = r"cochrane_files\10.1002_14651858.CD001233.pub4.pdf" 
 csv_path = r"extracted_references.csv"
-extract_references_and_save_to_csv(pdf_path, csv_path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract the included-studies references from a Cochrane PDF.")
+    parser.add_argument("pdf_path", nargs="?", default=pdf_path, help="Path to the Cochrane PDF")
+    parser.add_argument("csv_path", nargs="?", default=csv_path, help="Output CSV file")
+    add_backend_argument(parser, default="pdfminer")
+    args = parser.parse_args()
+    extract_references_and_save_to_csv(args.pdf_path, args.csv_path, args.backend)
 
 #Sample Cochrane pdf filepaths
 
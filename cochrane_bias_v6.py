@@ -1,40 +1,37 @@
 import csv
-import re
-from pdfminer.high_level import extract_text
+from matchers import WHITESPACE_RE, BRACKETED_REFERENCE_RE
+from text_normalize import NormalizedText
+import argparse
+from extraction_cache import section_pages
+from pdf_backends import add_backend_argument
 
-def extract_references_and_save_to_csv(pdf_path, csv_path):
-    # Extract the entire text from the PDF
-    full_text = extract_text(pdf_path)
+def extract_references_and_save_to_csv(pdf_path, csv_path, backend="pdfminer"):
+    # Extract the text of the pages holding the references section
+    full_text = "".join(section_pages(pdf_path, backend))
     
     # Normalize spaces to handle tight text
-    # This line removes all whitespace characters (spaces, newlines, etc.) from the text, 
-    # which can help in finding sections and patterns that might be disrupted by spacing.
-
-    # Idea: We could split by newline between references, but newline is not recognized
-    #  in the Cochrane PDF itself.
-    #   How could we modify the line of code below to not remove all spaces?
-    normalized_text = re.sub(r'\s+', '', full_text)
+    # The section boundaries are found on a whitespace-free view of the text,
+    # which can help in finding sections that might be disrupted by spacing.
+    # The view maps its positions back to full_text, so the spaces themselves
+    # are kept for the reference pattern below.
+    normalized_text = NormalizedText(full_text)
     
     # Define the section boundaries
     start_term = "Referencestostudiesincludedinthisreview"
     end_term = "Referencestostudiesexcludedfromthisreview"
     
-    # Extract the text between the start and end terms
-    start_index = normalized_text.find(start_term)
-    end_index = normalized_text.find(end_term, start_index)
+    # Locate the text between the start and end terms
+    section = normalized_text.between(start_term, end_term)
     
-    if start_index == -1 or end_index == -1:
+    if section is None:
         print("Could not find the specified sections in the document.")
         return
     
-    # Extract the references section
-    references_section = normalized_text[start_index + len(start_term):end_index]
-    
     # Pattern to find references ending with [] or ()
-    pattern = r'.*?\[[A-Za-z0-9:]{10,}\](?!\.)|.*?\([A-Za-z0-9\s]{10,}\)\.'
+    pattern = BRACKETED_REFERENCE_RE
     
-    # Find all matches in the references section
-    references = re.findall(pattern, references_section)
+    # Find all matches in the references section of the original text
+    references = [WHITESPACE_RE.sub(' ', reference) for reference in pattern.findall(full_text, *section)]
     
     # Write the references to a CSV file
     with open(csv_path, mode='w', newline='', encoding='utf-8') as file:
@@ -47,10 +44,17 @@ def extract_references_and_save_to_csv(pdf_path, csv_path):
     
     #Checking the format - seems all the references are
     # put together without spaces in between them.
-    print(f"references_section: {references_section}.") 
+    print(f"references_section: {full_text[section[0]:section[1]]}.") 
 
 
 # Use the function
 pdf_path = r"cochrane_files\10.1002_14651858.CD001506.pub5.pdf"
 csv_path = r"extracted_references.csv"
-extract_references_and_save_to_csv(pdf_path, csv_path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract the included-studies references from a Cochrane PDF.")
+    parser.add_argument("pdf_path", nargs="?", default=pdf_path, help="Path to the Cochrane PDF")
+    parser.add_argument("csv_path", nargs="?", default=csv_path, help="Output CSV file")
+    add_backend_argument(parser, default="pdfminer")
+    args = parser.parse_args()
+    extract_references_and_save_to_csv(args.pdf_path, args.csv_path, args.backend)
@@ -0,0 +1,476 @@
+import argparse
+import gzip
+import hashlib
+import heapq
+import json
+import logging
+import mmap
+import os
+import re
+import shutil
+import struct
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from array import array
+from itertools import groupby
+from operator import itemgetter
+
+import numpy as np
+
+from reference_rows import (DOI_COLUMN, KEY_COLUMNS, NON_WORD_RE, PMID_COLUMN, TEXT_COLUMNS, YEAR_RE, first_column,
+                            fold, iter_input_rows, normalize_doi, parse_identifiers)
+from output_sink import open_sink
+
+# Offline DOI/PMID enrichment of extracted references.
+#
+# reference_extraction_v20 only records identifiers printed in [DOI: ...] and
+# [PMID: ...] brackets. This fills in the missing ones from a local metadata
+# dump, with no network calls:
+#
+#   build   streams a PubMed XML dump (PubmedArticle records) and/or a
+#           Crossref JSON Lines dump (one work per line; .gz is read as is)
+#           into a lookup index keyed on first-author surname + year +
+#           title, normalised (see match_key)
+#   enrich  splits each citation_chunk into its citations, parses surname,
+#           year and title out of every citation lacking a printed DOI or
+#           PMID, and looks them up in batches
+#
+# The index is one file, memory-mapped for lookups, so it is shared between
+# processes and costs no load time:
+#
+#   header    magic, record count
+#   keys      sorted uint64 hashes of the match keys
+#   offsets   uint64 start of each record's value in the blob, plus the end
+#   blob      "doi<TAB>pmid" per record, UTF-8
+#
+# A batch of citations is looked up with one numpy searchsorted over the
+# keys. The year is tried as printed and one either side, since print and
+# online publication years often differ. Records sharing a key, such as the
+# PubMed and Crossref entries of one article, are merged at build time.
+#
+# Usage:
+#   python enrich_identifiers.py build identifiers.idx pubmed*.xml.gz crossref.jsonl.gz
+#   python enrich_identifiers.py enrich identifiers.idx refs_references.csv --output refs_enriched.csv
+
+INDEX_MAGIC = b"REFIDX01"
+INDEX_HEADER = struct.Struct("<8sQ")
+
+RESOLVED_DOI_COLUMN = 'resolved_doi'
+RESOLVED_PMID_COLUMN = 'resolved_pmid'
+
+# A citation starts at the beginning of the chunk or after the ". " or "] "
+# ending the previous one, with a surname (lower-case particles allowed) and
+# initials: "Aduloju OP,", "van der Waals F.", "Chen W."
+CITATION_START_RE = re.compile(r"(?:^|(?<=[.\]]\s))(?=(?:[a-z]+\s)*[A-Z][^\s,.;:]*\s[A-Z]{1,4}(?:,|\.\s))")
+
+# First surname, the rest of the author list up to the initials (or "et al")
+# closing it, then the title up to its final punctuation
+CITATION_RE = re.compile(
+    r"(?P<surname>(?:[a-z]+\s)*[A-Z][^\s,.;:]*)\s(?:[A-Z]{1,4}|.*?(?:\b[A-Z]{1,4}|et al))\.\s+"
+    r"(?P<title>.+?[.?!])(?=\s|$)(?P<rest>.*)", re.S)
+
+BRACKET_RE = re.compile(r'\[[^\]]*\]')
+PRINTED_DOI_RE = re.compile(r'\[DOI:')
+PRINTED_PMID_RE = re.compile(r'\[PMID:')
+
+def normalize_title(title):
+    # Bracketed notes such as "[abstract]" are Cochrane's, not part of the title
+    return NON_WORD_RE.sub('', fold(BRACKET_RE.sub(' ', title)))
+
+def normalize_surname(surname):
+    return NON_WORD_RE.sub('', fold(surname))
+
+def hash_key(surname, year, title):
+    # Parts already normalised
+    digest = hashlib.blake2b(f"{surname}|{year}|{title}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+def match_key(surname, year, title):
+    """
+    64-bit hash of the normalised surname + year + title, or None if a part is missing.
+
+    Accents, case, spacing and punctuation are dropped, so "van der Waals" and
+    "Van der Waals", or a title with and without its closing full stop, agree.
+    """
+    surname = normalize_surname(surname or "")
+    title = normalize_title(title or "")
+    if not surname or not title or not year:
+        return None
+    return hash_key(surname, year, title)
+
+def open_dump(path):
+    return gzip.open(path, 'rb') if path.endswith('.gz') else open(path, 'rb')
+
+def element_text(element):
+    return "".join(element.itertext()).strip() if element is not None else ""
+
+def iter_pubmed(path):
+    """Yield (surname, year, title, doi, pmid) from a PubMed XML dump, one article at a time."""
+    with open_dump(path) as f:
+        for _, element in ET.iterparse(f, events=("end",)):
+            if element.tag != "PubmedArticle":
+                continue
+            citation = element.find("MedlineCitation")
+            article = citation.find("Article") if citation is not None else None
+            if article is not None:
+                surname = element_text(article.find("AuthorList/Author/LastName"))
+                date = article.find("Journal/JournalIssue/PubDate")
+                year = element_text(date.find("Year")) if date is not None else ""
+                if not year and date is not None:
+                    # "2016 Jan-Feb", "Winter 2015", "Dec 2015-Jan 2016" style dates
+                    year_match = YEAR_RE.search(element_text(date.find("MedlineDate")))
+                    year = year_match.group(1) if year_match else ""
+                doi = element_text(element.find("PubmedData/ArticleIdList/ArticleId[@IdType='doi']"))
+                if not doi:
+                    doi = element_text(article.find("ELocationID[@EIdType='doi']"))
+                yield surname, year, element_text(article.find("ArticleTitle")), doi, element_text(citation.find("PMID"))
+            # Drop the parsed article so memory stays flat over the whole dump
+            element.clear()
+
+def crossref_year(work):
+    for field in ("published-print", "published-online", "issued"):
+        parts = (work.get(field) or {}).get("date-parts") or [[None]]
+        if parts[0] and parts[0][0]:
+            return str(parts[0][0])
+    return ""
+
+def iter_crossref(path):
+    """Yield (surname, year, title, doi, pmid) from a Crossref JSON Lines dump; Crossref has no PMIDs."""
+    with open_dump(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            work = json.loads(line)
+            titles = work.get("title") or [""]
+            authors = work.get("author") or [{}]
+            yield authors[0].get("family", ""), crossref_year(work), titles[0], work.get("DOI", ""), ""
+
+def iter_dump(path):
+    name = path[:-3] if path.endswith('.gz') else path
+    return iter_pubmed(path) if name.endswith('.xml') else iter_crossref(path)
+
+RUN_RECORD = struct.Struct("<QI")  # key, value length; the "doi<TAB>pmid" value follows
+RUN_SIZE = 1_000_000  # Records sorted in memory before a run is written out
+WRITE_BATCH = 64 * 1024  # Keys and offsets buffered per write while merging
+
+def write_run(run_path, keys, blob, offsets):
+    # One sorted run: the records in key order, the dump's order kept among equal keys
+    order = np.argsort(np.frombuffer(keys, dtype=np.uint64), kind='stable')
+    with open(run_path, 'wb') as f:
+        for position in order.tolist():
+            value = blob[offsets[position]:offsets[position + 1]]
+            f.write(RUN_RECORD.pack(keys[position], len(value)))
+            f.write(value)
+
+def read_run(run_path):
+    # (key, value) records of a run file, in order
+    with open(run_path, 'rb', buffering=1024 * 1024) as f:
+        while True:
+            header = f.read(RUN_RECORD.size)
+            if not header:
+                return
+            key, length = RUN_RECORD.unpack(header)
+            yield key, f.read(length)
+
+def merge_runs(run_paths):
+    """
+    Merge sorted runs into one record per key, in key order.
+
+    Records sharing a key come out in dump order (heapq.merge keeps the order
+    of its inputs among equal keys), and a later record only fills identifiers
+    the first lacked.
+
+    Yields:
+    tuple: (key, "doi<TAB>pmid" bytes)
+    """
+    merged = heapq.merge(*(read_run(path) for path in run_paths), key=itemgetter(0))
+    for key, records in groupby(merged, key=itemgetter(0)):
+        doi = pmid = b""
+        for _, value in records:
+            record_doi, record_pmid = value.split(b'\t')
+            doi = doi or record_doi
+            pmid = pmid or record_pmid
+        yield key, doi + b'\t' + pmid
+
+def build_index(index_path, dump_paths, run_size=RUN_SIZE):
+    """
+    Build the lookup index from metadata dumps.
+
+    Records are sorted in memory run_size at a time and written to temporary
+    run files next to the index, which are then merged, so memory use does not
+    grow with the size of the dumps.
+
+    Args:
+    index_path (str): Index file to write
+    dump_paths (list): PubMed XML (.xml) and Crossref JSON Lines (.jsonl) dumps, optionally gzipped
+    run_size (int): Records per sorted run
+
+    Returns:
+    tuple: (records read, distinct keys written)
+    """
+    with tempfile.TemporaryDirectory(prefix=".build-", dir=os.path.dirname(os.path.abspath(index_path))) as work_dir:
+        run_paths = []
+        keys = array('Q')
+        blob = bytearray()
+        offsets = array('Q', [0])
+        read = 0
+
+        def flush_run():
+            nonlocal keys, blob, offsets
+            if keys:
+                run_paths.append(os.path.join(work_dir, f"run-{len(run_paths):05d}"))
+                write_run(run_paths[-1], keys, blob, offsets)
+                keys, blob, offsets = array('Q'), bytearray(), array('Q', [0])
+
+        for path in dump_paths:
+            for surname, year, title, doi, pmid in iter_dump(path):
+                key = match_key(surname, year, title)
+                if key is None or not (doi or pmid):
+                    continue
+                keys.append(key)
+                blob += f"{normalize_doi(doi) if doi else ''}\t{pmid.strip()}".encode()
+                offsets.append(len(blob))
+                read += 1
+                if len(keys) >= run_size:
+                    flush_run()
+            logging.info("Read %s (%d records so far)", path, read)
+        flush_run()
+
+        # Keys, offsets and values go to their own files, concatenated once the count is known
+        keys_path, offsets_path, blob_path = (os.path.join(work_dir, name) for name in ("keys", "offsets", "blob"))
+        written = 0
+        with open(keys_path, 'wb') as keys_file, open(offsets_path, 'wb') as offsets_file, \
+                open(blob_path, 'wb') as blob_file:
+            key_batch = array('Q')
+            offset_batch = array('Q', [0])
+            end = 0
+            for key, value in merge_runs(run_paths):
+                blob_file.write(value)
+                end += len(value)
+                key_batch.append(key)
+                offset_batch.append(end)
+                written += 1
+                if len(key_batch) >= WRITE_BATCH:
+                    key_batch.tofile(keys_file)
+                    offset_batch.tofile(offsets_file)
+                    key_batch, offset_batch = array('Q'), array('Q')
+            key_batch.tofile(keys_file)
+            offset_batch.tofile(offsets_file)
+
+        with open(index_path, 'wb') as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, written))
+            for part_path in (keys_path, offsets_path, blob_path):
+                with open(part_path, 'rb') as part:
+                    shutil.copyfileobj(part, f, 1024 * 1024)
+    return read, written
+
+class IdentifierIndex:
+    """
+    Read-only view of an index file, memory-mapped.
+
+    Args:
+    index_path (str): File written by build_index
+    """
+
+    def __init__(self, index_path):
+        with open(index_path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count = INDEX_HEADER.unpack_from(self.map)
+        if magic != INDEX_MAGIC:
+            self.map.close()
+            raise ValueError(f"{index_path} is not an identifier index")
+        self.keys = np.frombuffer(self.map, dtype='<u8', count=count, offset=INDEX_HEADER.size)
+        self.offsets = np.frombuffer(self.map, dtype='<u8', count=count + 1, offset=INDEX_HEADER.size + 8 * count)
+        self.blob_start = INDEX_HEADER.size + 8 * (2 * count + 1)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def lookup(self, keys):
+        """Positions of keys (uint64 array) in the index, -1 where absent."""
+        positions = np.searchsorted(self.keys, keys)
+        found = positions < len(self.keys)
+        found[found] = self.keys[positions[found]] == keys[found]
+        return np.where(found, positions, -1)
+
+    def identifiers(self, position):
+        """(doi, pmid) of the record at a position, "" where the dump had none."""
+        start = self.blob_start + int(self.offsets[position])
+        end = self.blob_start + int(self.offsets[position + 1])
+        doi, pmid = self.map[start:end].decode().split('\t')
+        return doi, pmid
+
+    def close(self):
+        # The numpy views hold exports of the map; drop them before closing it
+        self.keys = self.offsets = None
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def split_citations(chunk):
+    """Split a citation_chunk holding several references into one string per citation."""
+    starts = [match.start() for match in CITATION_START_RE.finditer(chunk)] or [0]
+    if starts[0] != 0:
+        starts.insert(0, 0)
+    return [chunk[start:end].strip() for start, end in zip(starts, starts[1:] + [len(chunk)]) if chunk[start:end].strip()]
+
+def citation_keys(citation, fallback_year=None):
+    """
+    Candidate match keys of one citation: its year as printed, then one year either side.
+
+    Args:
+    citation (str): One citation, e.g. "Aduloju OP, ... Title. Journal 2016;36(3):318-22."
+    fallback_year (str): Year to use if none follows the title, e.g. from the author_year heading
+
+    Returns:
+    tuple: Three match keys, most likely first, or None if the citation cannot be parsed
+    """
+    match = CITATION_RE.match(citation)
+    if not match:
+        return None
+    year_match = YEAR_RE.search(match.group('rest'))
+    year = year_match.group(1) if year_match else fallback_year
+    surname = normalize_surname(match.group('surname'))
+    title = normalize_title(match.group('title'))
+    if not year or not surname or not title:
+        return None
+    year = int(year)
+    return hash_key(surname, year, title), hash_key(surname, year - 1, title), hash_key(surname, year + 1, title)
+
+def resolve_batch(index, rows):
+    """
+    Look up the identifiers missing from a batch of reference rows.
+
+    Args:
+    index (IdentifierIndex): Lookup index
+    rows (list): Input rows (dicts with author_year/citation_chunk columns)
+
+    Returns:
+    list: ([resolved DOIs], [resolved PMIDs]) per row
+    """
+    # (row, wants DOI, wants PMID) and candidate keys for every citation lacking an identifier
+    queries = []
+    candidates = []
+    for row_index, row in enumerate(rows):
+        heading_year = YEAR_RE.search(first_column(row, KEY_COLUMNS))
+        fallback_year = heading_year.group(1) if heading_year else None
+        for citation in split_citations(first_column(row, TEXT_COLUMNS)):
+            wants_doi = not PRINTED_DOI_RE.search(citation)
+            wants_pmid = not PRINTED_PMID_RE.search(citation)
+            if wants_doi or wants_pmid:
+                keys = citation_keys(citation, fallback_year)
+                if keys is not None:
+                    queries.append((row_index, wants_doi, wants_pmid))
+                    candidates.append(keys)
+
+    # One vectorised lookup over every candidate of the batch; each citation
+    # takes its first candidate found (printed year, then year - 1, year + 1)
+    positions = np.full(len(queries), -1, dtype=np.int64)
+    if candidates:
+        found = index.lookup(np.array(candidates, dtype=np.uint64).ravel()).reshape(-1, 3)
+        for rank in (2, 1, 0):
+            positions = np.where(found[:, rank] >= 0, found[:, rank], positions)
+
+    resolved = [([], []) for _ in rows]
+    for (row_index, wants_doi, wants_pmid), position in zip(queries, positions.tolist()):
+        if position < 0:
+            continue
+        doi, pmid = index.identifiers(position)
+        found_dois, found_pmids = resolved[row_index]
+        if wants_doi and doi and doi not in found_dois:
+            found_dois.append(doi)
+        if wants_pmid and pmid and pmid not in found_pmids:
+            found_pmids.append(pmid)
+    return resolved
+
+def iter_batches(rows, batch_size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def enrich_file(index_path, input_path, output_path, batch_size=20000):
+    """
+    Write a reference file with missing DOIs and PMIDs filled in from the index.
+
+    Resolved identifiers are added to reference_doi/reference_pmid and also
+    listed on their own in resolved_doi/resolved_pmid, so printed and
+    looked-up identifiers can be told apart.
+
+    Args:
+    index_path (str): Index file written by build_index
+    input_path (str): reference_extraction_v20 output (.csv, .jsonl or .parquet)
+    output_path (str): Enriched output file
+    batch_size (int): References per lookup batch
+
+    Returns:
+    tuple: (rows written, DOIs resolved, PMIDs resolved)
+    """
+    rows = iter_input_rows(input_path)
+    first = next(rows, None)
+    if first is None:
+        raise ValueError(f"{input_path} has no references")
+    fieldnames = list(first) + [RESOLVED_DOI_COLUMN, RESOLVED_PMID_COLUMN]
+
+    def all_rows():
+        yield first
+        yield from rows
+
+    written = doi_count = pmid_count = 0
+    with IdentifierIndex(index_path) as index, open_sink(output_path, fieldnames) as sink:
+        for batch in iter_batches(all_rows(), batch_size):
+            for row, (dois, pmids) in zip(batch, resolve_batch(index, batch)):
+                row = dict(row)
+                row[DOI_COLUMN] = parse_identifiers(row.get(DOI_COLUMN)) + dois
+                row[PMID_COLUMN] = parse_identifiers(row.get(PMID_COLUMN)) + pmids
+                row[RESOLVED_DOI_COLUMN] = dois
+                row[RESOLVED_PMID_COLUMN] = pmids
+                sink.write(row)
+                doi_count += len(dois)
+                pmid_count += len(pmids)
+            written += len(batch)
+    return written, doi_count, pmid_count
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill in missing DOIs and PMIDs from a local PubMed/Crossref dump.")
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"], help="Set the logging level")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Build the lookup index from metadata dumps")
+    build.add_argument("index_path", help="Index file to write")
+    build.add_argument("dump_paths", nargs="+", help="PubMed XML (.xml) or Crossref JSON Lines (.jsonl) dumps, optionally .gz")
+
+    enrich = subparsers.add_parser("enrich", help="Resolve missing identifiers of extracted references")
+    enrich.add_argument("index_path", help="Index file from build")
+    enrich.add_argument("input_path", help="reference_extraction_v20 output (.csv, .jsonl or .parquet)")
+    enrich.add_argument("--output", help="Output file (default: <input>_enriched.<ext>)")
+    enrich.add_argument("--batch-size", type=int, default=20000, help="References per lookup batch")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level, format='%(asctime)s - %(levelname)s - %(message)s')
+    start = time.perf_counter()
+    if args.command == "build":
+        read, written = build_index(args.index_path, args.dump_paths)
+        logging.info("Indexed %d records as %d keys in %.1fs. Index saved to %s.", read, written,
+                     time.perf_counter() - start, args.index_path)
+        return 0
+
+    stem, dot, extension = args.input_path.rpartition('.')
+    output_path = args.output or (f"{stem}_enriched.{extension}" if dot else f"{args.input_path}_enriched")
+    written, dois, pmids = enrich_file(args.index_path, args.input_path, output_path, args.batch_size)
+    elapsed = time.perf_counter() - start
+    logging.info("Resolved %d DOIs and %d PMIDs for %d references in %.2fs (%.0f references/s). Results saved to %s.",
+                 dois, pmids, written, elapsed, written / elapsed if elapsed else 0, output_path)
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
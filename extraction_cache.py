@@ -0,0 +1,243 @@
+import hashlib
+import marshal
+import os
+import sys
+import threading
+import zlib
+
+# On-disk cache of extracted PDF text and span layouts.
+#
+# Entries are keyed by the SHA-256 of the PDF bytes, the backend that did the
+# extraction and the extraction mode ("text" for page text, "spans" for
+# get_text("dict") span records), so reruns over an unchanged corpus skip PDF
+# decoding and go straight to the regex heuristics. Values are page lists
+# serialised with marshal and compressed with zlib. Recency is tracked with
+# the entry file's mtime, which is bumped on every hit, and the least recently
+# used entries are removed once the directory grows past max_bytes.
+#
+# The directory is walked once when the cache is configured and a running
+# total kept from then on, so a put only stats its own entry. Entries written
+# by other processes are not counted until the total next crosses max_bytes,
+# when the directory is walked again and the total reset from what is there.
+#
+# The cache is off unless a directory is configured, either with
+# configure_cache() or the REFPARSE_CACHE_DIR environment variable.
+
+CACHE_DIR_ENV = "REFPARSE_CACHE_DIR"
+CACHE_MAX_MB_ENV = "REFPARSE_CACHE_MAX_MB"
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+# Eviction frees down to this fraction of max_bytes, so a full cache is not
+# walked again on the very next put
+EVICT_TO = 0.9
+
+MAGIC = b"RPC1"
+ENTRY_SUFFIX = ".bin"
+
+# Span records are stored as flat tuples in this field order
+SPAN_FIELDS = ("page", "block", "line", "text", "font", "flags", "size", "x0", "y0", "x1", "y1")
+
+_hash_memo = {}
+
+def file_digest(pdf_path, data=None):
+    """
+    Return the SHA-256 hex digest of a file, memoised on (path, size, mtime).
+
+    Pass data when the file's contents are already in memory, so they are
+    hashed instead of the file being read again.
+    """
+    stat = os.stat(pdf_path)
+    memo_key = (os.path.abspath(pdf_path), stat.st_size, stat.st_mtime_ns)
+    digest = _hash_memo.get(memo_key)
+    if digest is None:
+        if data is not None:
+            digest = hashlib.sha256(data).hexdigest()
+        else:
+            sha = hashlib.sha256()
+            with open(pdf_path, 'rb') as file:
+                for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                    sha.update(chunk)
+            digest = sha.hexdigest()
+        _hash_memo[memo_key] = digest
+    return digest
+
+class ExtractionCache:
+    """
+    Content-addressed, size-bounded cache of extraction results.
+
+    Args:
+    cache_dir (str): Directory holding the cache entries
+    max_bytes (int): Total size above which least recently used entries are evicted
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self.total_bytes = sum(size for path, size, mtime in self.entries())
+
+    def entry_path(self, pdf_path, backend, mode):
+        # marshal's format can change between Python versions, so the version
+        # is part of the key rather than risking an unreadable entry
+        version = f"py{sys.version_info[0]}{sys.version_info[1]}"
+        digest = file_digest(pdf_path)
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}-{backend}-{mode}-{version}{ENTRY_SUFFIX}")
+
+    def get(self, pdf_path, backend, mode):
+        """Return the cached value, or None on a miss or unreadable entry."""
+        path = self.entry_path(pdf_path, backend, mode)
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+        except OSError:
+            return None
+
+        if not data.startswith(MAGIC):
+            return None
+        try:
+            value = marshal.loads(zlib.decompress(data[len(MAGIC):]))
+        except (ValueError, EOFError, TypeError, zlib.error):
+            return None
+
+        # Mark the entry as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def put(self, pdf_path, backend, mode, value):
+        """Store a value built from lists, tuples, dicts, str, int, float and None."""
+        path = self.entry_path(pdf_path, backend, mode)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temporary name and rename, so concurrent workers never
+        # see a half-written entry; the name is per process and per thread
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as file:
+                file.write(MAGIC)
+                file.write(zlib.compress(marshal.dumps(value), 6))
+                size = file.tell()
+            try:
+                # An entry being replaced no longer counts
+                replaced = os.stat(path).st_size
+            except OSError:
+                replaced = 0
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        self.total_bytes += size - replaced
+
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def entries(self):
+        for dirpath, dirnames, filenames in os.walk(self.cache_dir):
+            for filename in filenames:
+                if filename.endswith(ENTRY_SUFFIX):
+                    path = os.path.join(dirpath, filename)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield path, stat.st_size, stat.st_mtime
+
+    def evict(self):
+        """Remove least recently used entries once the cache outgrows max_bytes, down to EVICT_TO of it."""
+        entries = list(self.entries())
+        total = sum(size for path, size, mtime in entries)
+        self.total_bytes = total
+        if total <= self.max_bytes:
+            return
+        target = self.max_bytes * EVICT_TO
+
+        for path, size, mtime in sorted(entries, key=lambda entry: entry[2]):
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.total_bytes = total
+            if total <= target:
+                break
+
+_cache = None
+_cache_loaded = False
+
+def configure_cache(cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+    """Set the process-wide cache; pass cache_dir=None to disable it."""
+    global _cache, _cache_loaded
+    _cache = ExtractionCache(cache_dir, max_bytes) if cache_dir else None
+    _cache_loaded = True
+
+def get_cache():
+    """Return the process-wide cache, configured from the environment on first use."""
+    if not _cache_loaded:
+        cache_dir = os.environ.get(CACHE_DIR_ENV)
+        max_mb = os.environ.get(CACHE_MAX_MB_ENV)
+        max_bytes = int(float(max_mb) * 1024 * 1024) if max_mb else DEFAULT_MAX_BYTES
+        configure_cache(cache_dir, max_bytes)
+    return _cache
+
+def cached(pdf_path, backend, mode, compute):
+    """
+    Return compute() for a PDF, going through the cache when one is configured.
+
+    Args:
+    pdf_path (str): Path of the PDF the value is extracted from
+    backend (str): Name of the extraction library
+    mode (str): "text" or "spans"
+    compute (callable): Builds the value on a cache miss
+
+    Returns:
+    The cached or freshly computed value
+    """
+    cache = get_cache()
+    if cache is None:
+        return compute()
+
+    value = cache.get(pdf_path, backend, mode)
+    if value is None:
+        value = compute()
+        cache.put(pdf_path, backend, mode, value)
+    return value
+
+def section_pages(pdf_path, backend, data=None):
+    """
+    Page texts of the included-studies section, from the cache when possible.
+
+    The file is memory-mapped once for both the cache key and the backend,
+    unless data (see open_backend) is given.
+    """
+    from pdf_backends import open_backend
+    from pdf_input import map_pdf
+    from section_locator import section_pages as locate_section_pages
+    from instrumentation import stage
+
+    if data is None:
+        with map_pdf(pdf_path) as data:
+            return section_pages(pdf_path, backend, data)
+
+    if get_cache() is not None:
+        # Key the cache from the bytes in hand rather than re-reading the file
+        file_digest(pdf_path, data)
+
+    def compute():
+        with stage("open"):
+            document = open_backend(pdf_path, backend, data)
+        with document:
+            return locate_section_pages(document)
+
+    return cached(pdf_path, backend, "text", compute)
+
+def add_cache_arguments(parser):
+    """Add --cache-dir/--cache-max-mb options to an argparse parser."""
+    parser.add_argument("--cache-dir", default=os.environ.get(CACHE_DIR_ENV), help="Directory for the extraction cache (disabled if not set)")
+    parser.add_argument("--cache-max-mb", type=float, default=float(os.environ.get(CACHE_MAX_MB_ENV, DEFAULT_MAX_BYTES / (1024 * 1024))), help="Maximum cache size in MB before LRU eviction")
+
+def configure_cache_from_args(args):
+    configure_cache(args.cache_dir, int(args.cache_max_mb * 1024 * 1024))
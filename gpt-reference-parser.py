@@ -1,7 +1,8 @@
 import csv
-import fitz  # PyMuPDF
-import re
-import sys
+import argparse
+from matchers import PUBLISHED_HEADING_RE, count_heading_blocks
+from extraction_cache import section_pages, add_cache_arguments, configure_cache_from_args
+from pdf_backends import add_backend_argument
 
 def extract_references_section(text):
     start_idx = text.find("References to studies included in this review")
@@ -13,31 +14,13 @@ def extract_references_section(text):
     return text
 
 def count_bold_headings_and_blocks_for_csv(text):
-    heading_pattern = r"([A-Za-z]+ \d{4} \{published data only\})"
-    headings = re.findall(heading_pattern, text)
-    
-    # Split text based on these headings to count the number of blocks under each heading
-    text_blocks = re.split(heading_pattern, text)[1:]  # Skip the first split as it will be empty
-    
-    # Final detailed regex pattern
-    block_pattern = r"(\n\s*\n|[•\d\)\(]+\s+|(?<=\n)[A-Z][a-z]+\s+\d{4}|\*{3,})"  # Including "***" as a potential block separator
-    
-    reference_blocks = []
-    for i in range(0, len(text_blocks), 2):
-        reference = text_blocks[i].strip()
-        
-        # Applying the final chunking regex to identify blocks more effectively
-        block_count = len(re.findall(block_pattern, text_blocks[i + 1].strip())) + 1
-        reference_blocks.append((reference, block_count))
-    
-    return reference_blocks
-
-def process_pdf(input_file, output_file):
-    # Read the PDF and extract text
-    doc = fitz.open(input_file)
-    text = ""
-    for page in doc:
-        text += page.get_text()
+    # Split on bold "Name 2000" headings and count the reference blocks under each
+    return count_heading_blocks(text, PUBLISHED_HEADING_RE)
+
+def process_pdf(input_file, output_file, backend="pymupdf"):
+    # Extract text from the pages of the references section only, reusing the
+    # extraction cache when one is configured
+    text = "".join(section_pages(input_file, backend))
 
     # Extract the references section
     references_text = extract_references_section(text)
@@ -53,9 +36,12 @@ def process_pdf(input_file, output_file):
             writer.writerow([input_file, reference, count])
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: python script.py <input_file_path> <output_file_path>")
-    else:
-        input_file_path = sys.argv[1]
-        output_file_path = sys.argv[2]
-        process_pdf(input_file_path, output_file_path)
+    parser = argparse.ArgumentParser(description="Count references under each bold heading in a PDF.")
+    parser.add_argument("input_file_path", help="Path to the PDF file")
+    parser.add_argument("output_file_path", help="Output CSV file")
+    add_backend_argument(parser)
+    add_cache_arguments(parser)
+    args = parser.parse_args()
+
+    configure_cache_from_args(args)
+    process_pdf(args.input_file_path, args.output_file_path, args.backend)
@@ -0,0 +1,301 @@
+import json
+import logging
+import math
+import os
+import time
+import tracemalloc
+from contextlib import nullcontext
+
+from output_sink import open_sink
+
+# Per-stage profiling hooks.
+#
+# Code that does a unit of work wraps it in stage(), and callers that loop
+# over PDFs wrap each file in document():
+#
+#   with document(pdf_path):
+#       with stage("open"):
+#           ...
+#
+# With profiling disabled (the default), stage() and document() return a
+# shared no-op context manager, so the hooks cost one global lookup. When
+# enabled, each (PDF, stage) pair accumulates wall time, CPU time, the
+# number of calls, memory and, with memory tracing on, the peak Python
+# allocation inside the stage. Worker processes drain() their records and
+# send them back to the parent, which merges them and writes a JSON or CSV
+# report with per-stage percentiles and the slowest PDFs.
+#
+# Memory is the process's resident set size (Linux only): on first entering
+# and last leaving the stage, from /proc/self/statm, and its high-water mark
+# while the stage ran, which also covers what PyMuPDF and pdfminer allocate
+# outside Python's view. ru_maxrss only gives the high-water mark of the
+# whole process, so the kernel's (VmHWM) is reset through
+# /proc/self/clear_refs as each stage starts and read as it ends. Where that
+# reset is refused, the peak falls back to the largest RSS sampled at stage
+# entry and exit. Both are per process, so stages running at once in
+# several threads share one figure.
+#
+# Stages used by the scripts:
+#
+#   open         open_backend
+#   locate       section_locator, finding the section's pages
+#   extract      page text or span extraction
+#   headings     splitting the section into headings and counting blocks
+#   identifiers  DOI/PMID extraction
+
+STAGE_FIELDS = ['pdf', 'stage', 'calls', 'wall_s', 'cpu_s', 'peak_alloc_kb', 'peak_rss_kb', 'rss_start_kb', 'rss_end_kb']
+PERCENTILES = (50, 90, 99)
+
+_NOOP = nullcontext()
+_profiler = None
+
+PAGE_KB = os.sysconf("SC_PAGE_SIZE") // 1024 if hasattr(os, "sysconf") else 4
+
+def current_rss_kb():
+    # Resident pages are the second field of statm; None where there is no /proc
+    try:
+        with open("/proc/self/statm", 'rb') as f:
+            return int(f.read().split()[1]) * PAGE_KB
+    except (OSError, IndexError, ValueError):
+        return None
+
+def peak_rss_kb():
+    # Resident set high-water mark since the last reset_peak_rss(), or None
+    try:
+        with open("/proc/self/status", 'rb') as f:
+            for line in f:
+                if line.startswith(b"VmHWM:"):
+                    return int(line.split()[1])
+    except (OSError, IndexError, ValueError):
+        pass
+    return None
+
+def reset_peak_rss():
+    # Writing 5 to clear_refs resets VmHWM to the current RSS (Linux 4.0+)
+    try:
+        with open("/proc/self/clear_refs", 'wb') as f:
+            f.write(b"5")
+        return True
+    except OSError:
+        return False
+
+class Profiler:
+    """
+    Accumulates per-(PDF, stage) timings for one process.
+
+    Args:
+    memory (bool): Trace Python allocations to report each stage's peak;
+        this slows allocation-heavy code down noticeably
+    """
+
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.records = {}
+        self.current_pdf = None
+        self.frames = []  # Open stages: [peak allocation seen while nested stages ran]
+        self.rss_frames = []  # Open stages: [peak RSS seen while nested stages ran]
+        self.resets_peak_rss = reset_peak_rss() and peak_rss_kb() is not None
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def record(self, stage, wall, cpu, peak_alloc, peak_rss, rss_start, rss_end):
+        key = (self.current_pdf, stage)
+        entry = self.records.get(key)
+        if entry is None:
+            entry = self.records[key] = {'pdf': self.current_pdf, 'stage': stage, 'calls': 0, 'wall_s': 0.0,
+                                         'cpu_s': 0.0, 'peak_alloc_kb': None, 'peak_rss_kb': None,
+                                         'rss_start_kb': rss_start}
+        entry['calls'] += 1
+        entry['wall_s'] += wall
+        entry['cpu_s'] += cpu
+        if peak_alloc is not None:
+            entry['peak_alloc_kb'] = max(entry['peak_alloc_kb'] or 0, peak_alloc // 1024)
+        if peak_rss is not None:
+            entry['peak_rss_kb'] = max(entry['peak_rss_kb'] or 0, peak_rss)
+        entry['rss_end_kb'] = rss_end
+
+    def drain(self):
+        """Return the records collected so far and start over."""
+        records = list(self.records.values())
+        self.records = {}
+        return records
+
+class _Stage:
+    __slots__ = ('profiler', 'name', 'wall', 'cpu', 'alloc_start', 'rss_start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        profiler = self.profiler
+        if profiler.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if profiler.frames:
+                # Keep the enclosing stage's peak before resetting it for this one
+                profiler.frames[-1] = max(profiler.frames[-1], peak)
+            tracemalloc.reset_peak()
+            self.alloc_start = current
+        profiler.frames.append(0)
+        self.rss_start = current_rss_kb()
+        if profiler.resets_peak_rss:
+            if profiler.rss_frames:
+                # As for allocations: keep the enclosing stage's peak before the reset
+                profiler.rss_frames[-1] = max(profiler.rss_frames[-1], peak_rss_kb() or 0)
+            reset_peak_rss()
+        profiler.rss_frames.append(self.rss_start or 0)
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        wall = time.perf_counter() - self.wall
+        cpu = time.process_time() - self.cpu
+        rss_end = current_rss_kb()
+        profiler = self.profiler
+        nested_peak = profiler.frames.pop()
+        peak_rss = max(profiler.rss_frames.pop(), rss_end or 0)
+        if profiler.resets_peak_rss:
+            peak_rss = max(peak_rss, peak_rss_kb() or 0)
+        if profiler.rss_frames:
+            profiler.rss_frames[-1] = max(profiler.rss_frames[-1], peak_rss)
+        peak_alloc = None
+        if profiler.memory:
+            peak = max(nested_peak, tracemalloc.get_traced_memory()[1])
+            peak_alloc = max(0, peak - self.alloc_start)
+            if profiler.frames:
+                profiler.frames[-1] = max(profiler.frames[-1], peak)
+        profiler.record(self.name, wall, cpu, peak_alloc, peak_rss if rss_end is not None else None,
+                        self.rss_start, rss_end)
+        return False
+
+class _Document:
+    __slots__ = ('profiler', 'pdf', 'previous')
+
+    def __init__(self, profiler, pdf):
+        self.profiler = profiler
+        self.pdf = pdf
+
+    def __enter__(self):
+        self.previous = self.profiler.current_pdf
+        self.profiler.current_pdf = self.pdf
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profiler.current_pdf = self.previous
+        return False
+
+def enable(memory=False):
+    """Turn profiling on for this process."""
+    global _profiler
+    _profiler = Profiler(memory)
+
+def enabled():
+    return _profiler is not None
+
+def stage(name):
+    """Context manager timing one stage of the current PDF; a no-op when profiling is off."""
+    if _profiler is None:
+        return _NOOP
+    return _Stage(_profiler, name)
+
+def document(pdf_path):
+    """Context manager attributing the stages inside it to a PDF; a no-op when profiling is off."""
+    if _profiler is None:
+        return _NOOP
+    return _Document(_profiler, os.path.basename(pdf_path))
+
+def drain():
+    """Return and clear this process's records ([] when profiling is off)."""
+    return _profiler.drain() if _profiler is not None else []
+
+def init_worker(memory):
+    # ProcessPoolExecutor initializer: profile in the worker as in the parent
+    if memory is not None:
+        enable(memory)
+
+def worker_args():
+    """The init_worker argument that reproduces this process's profiling setup."""
+    return _profiler.memory if _profiler is not None else None
+
+def percentile(sorted_values, q):
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return None
+    rank = math.ceil(q / 100 * len(sorted_values))
+    return sorted_values[max(rank, 1) - 1]
+
+def summarize(records, slowest_share=0.01):
+    """
+    Summarize stage records.
+
+    Args:
+    records (list): Record dicts from drain()
+    slowest_share (float): Share of PDFs, by total wall time, listed as slowest
+
+    Returns:
+    dict: "stages" with count, total and p50/p90/p99/max of wall, CPU and
+    peak allocation and peak RSS per stage, and "slowest" with the slowest PDFs, their
+    total wall time and the stage that took longest in each
+    """
+    by_stage = {}
+    by_pdf = {}
+    for entry in records:
+        by_stage.setdefault(entry['stage'], []).append(entry)
+        by_pdf.setdefault(entry['pdf'], []).append(entry)
+
+    stages = {}
+    for name, entries in by_stage.items():
+        summary = {'pdfs': len(entries), 'calls': sum(entry['calls'] for entry in entries)}
+        for field in ('wall_s', 'cpu_s', 'peak_alloc_kb', 'peak_rss_kb'):
+            values = sorted(entry[field] for entry in entries if entry[field] is not None)
+            if not values:
+                continue
+            summary[f'{field}_total'] = sum(values)
+            for q in PERCENTILES:
+                summary[f'{field}_p{q}'] = percentile(values, q)
+            summary[f'{field}_max'] = values[-1]
+        stages[name] = summary
+
+    totals = sorted(((sum(entry['wall_s'] for entry in entries), pdf, entries)
+                     for pdf, entries in by_pdf.items() if pdf is not None), key=lambda item: item[0], reverse=True)
+    slowest = []
+    for wall, pdf, entries in totals[:math.ceil(len(totals) * slowest_share)]:
+        worst = max(entries, key=lambda entry: entry['wall_s'])
+        slowest.append({'pdf': pdf, 'wall_s': wall, 'slowest_stage': worst['stage'], 'slowest_stage_wall_s': worst['wall_s']})
+    return {'pdfs': len(totals), 'stages': stages, 'slowest': slowest}
+
+def write_report(path, records):
+    """
+    Write a run report.
+
+    A .json report holds the summary and every record; any other extension
+    the output sink supports gets the per-(PDF, stage) records, with the
+    summary logged instead.
+    """
+    summary = summarize(records)
+    if path.lower().endswith('.json'):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'summary': summary, 'records': records}, f, indent=2)
+    else:
+        with open_sink(path, STAGE_FIELDS) as sink:
+            sink.write_many(records)
+    for name, stats in summary['stages'].items():
+        logging.info("stage %-11s pdfs=%d wall p50=%.4fs p99=%.4fs max=%.4fs peak rss p99=%sKB", name, stats['pdfs'],
+                     stats.get('wall_s_p50', 0), stats.get('wall_s_p99', 0), stats.get('wall_s_max', 0),
+                     stats.get('peak_rss_kb_p99', '-'))
+    for entry in summary['slowest']:
+        logging.info("slowest %s %.3fs (mostly %s)", entry['pdf'], entry['wall_s'], entry['slowest_stage'])
+    logging.info("Run report saved to %s", path)
+    return summary
+
+def add_profile_arguments(parser):
+    """Add --profile/--profile-memory/--log-level options to an argparse parser."""
+    parser.add_argument("--profile", metavar="REPORT", help="Record per-stage timings and write a run report (.json, or .csv/.jsonl/.parquet records)")
+    parser.add_argument("--profile-memory", action="store_true", help="Also trace peak Python allocations per stage (slower)")
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"], help="Set the logging level")
+
+def configure_from_args(args):
+    logging.basicConfig(level=args.log_level, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.profile:
+        enable(args.profile_memory)
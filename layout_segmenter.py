@@ -0,0 +1,251 @@
+import argparse
+import os
+from collections import namedtuple
+
+from matchers import V20_HEADING_RE
+from section_locator import locate_backend_section
+from pdf_backends import open_backend
+from extraction_cache import get_cache, add_cache_arguments, configure_cache_from_args, file_digest
+from pdf_input import map_pdf
+from output_sink import open_sink
+from instrumentation import stage
+
+# Reference segmentation from PyMuPDF span geometry.
+#
+# Instead of splitting flattened text with separator regexes, the spans of
+# the included-studies section are walked once, in page, block and line
+# order, and grouped into lines. A bold line matching the author_year
+# heading pattern opens a study. Under a study, a line starts a new
+# reference when
+#
+#   - the vertical gap to the previous line is larger than gap_ratio times
+#     the previous line's height, or
+#   - the study's references use a hanging indent (continuation lines sit
+#     further right than first lines) and the line is back at the column's
+#     left margin.
+#
+# A page or column break alone never starts a reference. After a page break
+# the margin carries over when the layout does; otherwise the line after the
+# break is taken to continue the reference and sets the new column's margin
+# from it (less the hanging indent). Every line is looked at once, so the work is
+# linear in the number of spans, and the counts are the number of references
+# found rather than an estimate from separator matches.
+
+# PyMuPDF span flag for bold text
+BOLD_FLAG = 16
+
+Line = namedtuple('Line', ['page', 'x0', 'y0', 'x1', 'y1', 'spans'])
+Study = namedtuple('Study', ['heading', 'label', 'page', 'references'])
+
+def first_references_page(document):
+    # Light probe: search_for looks for the phrase inside MuPDF without
+    # building the span dictionaries, so pages before the references section
+    # are skipped cheaply. Fall back to the first page if it is not found.
+    bounds = locate_backend_section(document)
+    return bounds[0] if bounds is not None else 0
+
+def is_references_heading(text, font):
+    return "References to" in text and 'bold' in font.lower()
+
+def iter_span_records(pdf_path):
+    # Span records from the first references page up to the page holding the
+    # second bold "References to" heading, from the extraction cache if possible
+    with map_pdf(pdf_path) as data:
+        yield from iter_mapped_span_records(pdf_path, data)
+
+def iter_mapped_span_records(pdf_path, data):
+    cache = get_cache()
+    if cache is not None:
+        # The cache key and, on a miss, the document come from the one map
+        file_digest(pdf_path, data)
+        records = cache.get(pdf_path, "pymupdf", "spans")
+        if records is not None:
+            yield from records
+            return
+
+    # Span layout (font names, bboxes) only comes from PyMuPDF's get_text("dict")
+    with stage("open"):
+        document = open_backend(pdf_path, "pymupdf", data)
+    with document:
+        records = []
+        section_counter = 0
+        with stage("locate"):
+            first_page = first_references_page(document)
+        for page_num in range(first_page, document.page_count):
+            with stage("extract"):
+                page_records = document.page_spans(page_num)
+            records.extend(page_records)
+            section_counter += sum(1 for record in page_records if is_references_heading(record[3], record[4]))
+
+            # Store before handing out the last page: the consumer stops on the
+            # second heading and closes this generator part way through it
+            last_page = section_counter >= 2 or page_num == document.page_count - 1
+            if last_page and cache is not None:
+                cache.put(pdf_path, "pymupdf", "spans", records)
+
+            yield from page_records
+            if last_page:
+                return
+
+def is_bold(record):
+    return bool(record[5] & BOLD_FLAG) or 'bold' in record[4].lower()
+
+def iter_lines(span_records, tolerance=2.0):
+    """
+    Group span records into Lines.
+
+    Spans of one PyMuPDF line arrive consecutively. A span from another block
+    that continues the same baseline to the right (a heading's non-bold
+    "{published data only}", say) is joined to the line as well.
+    """
+    key = None
+    spans = []
+    for record in span_records:
+        record_key = record[:3]
+        if record_key != key and spans:
+            last = spans[-1]
+            same_baseline = (record[0] == last[0] and abs(record[10] - last[10]) <= tolerance
+                             and record[7] >= last[9] - tolerance)
+            if not same_baseline:
+                yield make_line(spans)
+                spans = []
+        key = record_key
+        spans.append(record)
+    if spans:
+        yield make_line(spans)
+
+def make_line(spans):
+    return Line(spans[0][0], min(span[7] for span in spans), min(span[8] for span in spans),
+                max(span[9] for span in spans), max(span[10] for span in spans), spans)
+
+def line_text(line):
+    return "".join(span[3] for span in line.spans).strip()
+
+def study_heading(line):
+    """Split a study heading line into (heading, label), or return None if it is not one."""
+    bold_text = "".join(span[3] for span in line.spans if is_bold(span)).strip()
+    if not bold_text or not is_bold(line.spans[0]):
+        return None
+    match = V20_HEADING_RE.match(bold_text)
+    if not match:
+        return None
+    # The rest of the line, e.g. "{published data only}", labels the study
+    label = line_text(line)[match.end():].strip()
+    return match.group(), label
+
+def segment_lines(lines, gap_ratio=0.5, tolerance=2.0):
+    """
+    Segment the lines of a references section into studies and references.
+
+    Args:
+    lines (iterable): Lines in reading order, starting anywhere before the
+        first "References to" heading
+    gap_ratio (float): Vertical gap, relative to the previous line's height,
+        that separates two references
+    tolerance (float): Horizontal slack in points when comparing indents
+
+    Yields:
+    Study: Heading, label, page and list of reference texts of each study
+    """
+    sections_seen = 0
+    study = None
+    reference = None  # Lines of the reference being collected
+    margin = None  # Left edge of the current column
+    indent = None  # Hanging indent of continuation lines, once one is seen
+    previous = None
+
+    def close_reference():
+        if reference:
+            study.references.append(" ".join(line_text(line) for line in reference))
+
+    for line in lines:
+        text = line_text(line)
+        if any(is_references_heading(span[3], span[4]) for span in line.spans):
+            sections_seen += 1
+            if sections_seen == 2:
+                break
+            previous = line
+            continue
+        if not sections_seen or not text:
+            continue
+
+        heading = study_heading(line)
+        if heading is not None:
+            if study is not None:
+                close_reference()
+                yield study
+            study = Study(heading[0], heading[1], line.page, [])
+            reference = None
+            margin = line.x0
+            previous = line
+            continue
+        if study is None:
+            previous = line
+            continue
+
+        page_break = line.page != previous.page
+        column_break = page_break or line.y0 < previous.y0 - tolerance
+        same_layout = page_break and margin - tolerance <= line.x0 <= margin + (indent or 0) + tolerance
+        if column_break and not same_layout:
+            # The reference flows on into the new column
+            margin = line.x0 - indent if indent and reference else line.x0
+            starts = reference is None
+        else:
+            at_margin = line.x0 <= margin + tolerance
+            gap = 0 if column_break else line.y0 - previous.y1
+            starts = (reference is None or gap > gap_ratio * (previous.y1 - previous.y0)
+                      or (indent is not None and at_margin) or line.x0 < margin - tolerance)
+            if not starts and not at_margin and reference[0].x0 <= margin + tolerance:
+                # A continuation indented past the reference's first line
+                indent = line.x0 - margin
+            margin = min(margin, line.x0)
+
+        if starts:
+            close_reference()
+            reference = [line]
+        else:
+            reference.append(line)
+        previous = line
+
+    if study is not None:
+        close_reference()
+        yield study
+
+def segment_references(pdf_path, gap_ratio=0.5, tolerance=2.0):
+    """
+    Segment the included-studies section of a PDF into studies and references.
+
+    Args:
+    pdf_path (str): Path to the PDF file
+    gap_ratio (float): See segment_lines
+    tolerance (float): See segment_lines
+
+    Returns:
+    list: Study tuples in document order
+    """
+    return list(segment_lines(iter_lines(iter_span_records(pdf_path)), gap_ratio, tolerance))
+
+def main():
+    parser = argparse.ArgumentParser(description="Segment the included-studies references of PDFs from their layout.")
+    parser.add_argument("pdf_paths", nargs="+", help="PDF files")
+    parser.add_argument("--output", default="segmented_references.csv", help="Output file (.csv, .jsonl or .parquet)")
+    parser.add_argument("--gap-ratio", type=float, default=0.5, help="Line gap, relative to line height, that separates references")
+    parser.add_argument("--tolerance", type=float, default=2.0, help="Horizontal slack in points when comparing indents")
+    add_cache_arguments(parser)
+    args = parser.parse_args()
+
+    configure_cache_from_args(args)
+    fieldnames = ['File Name', 'Heading', 'Label', 'Page', 'Reference Number', 'Reference']
+    with open_sink(args.output, fieldnames) as sink:
+        for pdf_path in args.pdf_paths:
+            studies = segment_references(pdf_path, args.gap_ratio, args.tolerance)
+            for study in studies:
+                for number, reference in enumerate(study.references, start=1):
+                    sink.write((os.path.basename(pdf_path), study.heading, study.label, study.page + 1, number, reference))
+            print(f"{os.path.basename(pdf_path)}: {len(studies)} studies, "
+                  f"{sum(len(study.references) for study in studies)} references")
+    print(f"References saved to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
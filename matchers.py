@@ -0,0 +1,136 @@
+import re
+from collections import namedtuple
+
+# Precompiled patterns shared by all the parsers.
+#
+# Each pattern is compiled once at import instead of being re-specified as a
+# raw string at every call site (and looked up in re's internal cache on
+# every call). The comments record which script a pattern came from; the
+# expressions themselves are unchanged, so results are identical.
+
+# pdf_processing: any "Name 2000" heading
+HEADING_RE = re.compile(r"([A-Za-z]+ \d{4})")
+
+# gpt-reference-parser: headings carrying the Cochrane "{published data only}" tag
+PUBLISHED_HEADING_RE = re.compile(r"([A-Za-z]+ \d{4} \{published data only\})")
+
+# pdf_processing/gpt-reference-parser: separators between reference blocks,
+# including "***" as a potential block separator
+BLOCK_RE = re.compile(r"(\n\s*\n|[•\d\)\(]+\s+|(?<=\n)[A-Z][a-z]+\s+\d{4}|\*{3,})")
+
+# reference_extraction_v18: bold author_year headings (Smith 2000, Smith 2000a, Smith 2000 (MIT))
+V18_HEADING_RE = re.compile(r'\b[A-Za-z]+ \d{4}[a-z]?\b(?: \([A-Z\s]+\))?')
+
+# reference_extraction_v20: as v18, plus hyphenated and multi-word surnames
+# (Jones-Smith 2000, van der Waals 2000)
+V20_HEADING_RE = re.compile(r'\b[A-Za-z-]+(?: [A-Za-z-]+)* \d{4}[a-z]?\b(?: \([A-Z\s]+\))?')
+
+# reference_extraction_v18/v20: bracketed identifiers inside a citation chunk
+DOI_RE = re.compile(r'\[DOI:(.*?)\]')
+PMID_RE = re.compile(r'\[PMID:(.*?)\]')
+IDENTIFIER_RE = re.compile(r'\[(DOI|PMID):(.*?)\]')
+
+# reference-parser: all-caps section headings and the author-year splitter
+CAPS_HEADING_SPLIT_RE = re.compile(r'\n([A-Z][A-Z\s]+(?:\d{4})?)\n')
+AUTHOR_YEAR_SPLIT_RE = re.compile(r'([A-Z][a-z]+(?:\s[A-Z][a-z]+)?\s+(?:et\s+al\.?\s+)?(?:\d{4}[a-z]?))')
+
+# reference-parser: analyze_references columns (year of the reference key,
+# DOI/PMID present anywhere in the reference)
+YEAR_RE = re.compile(r'(\d{4})')
+DOI_PRESENCE_RE = re.compile(r'10\.\d{4,9}/\S+')
+PMID_PRESENCE_RE = re.compile(r'PMID:?\s*\d+', re.I)
+
+# reference-parser: clean_text normalisation
+WHITESPACE_RE = re.compile(r'\s+')
+PERIOD_SPACING_RE = re.compile(r'([a-z])\.([A-Z])')
+
+# cochrane_bias_v3: numbered references; cochrane_bias_v6: references ending with [...] or (...).
+# Both run on the original text, so the brackets may hold spaces ("[PMID: 123]")
+# and a reference may run across line breaks
+NUMBERED_SPLIT_RE = re.compile(r'\d+\.\s')
+BRACKETED_REFERENCE_RE = re.compile(r'.*?\[[A-Za-z0-9:\s]{10,}\](?!\.)|.*?\([A-Za-z0-9\s]{10,}\)\.', re.S)
+
+# reference_extraction_v18/v20: Cochrane DOI from a cochrane_files\<doi>.pdf path
+COCHRANE_DOI_PATH_RE = re.compile(r'cochrane_files\\(.+?)\.pdf')
+
+# One-pass chunk scanner, giving the same results as separate IDENTIFIER_RE,
+# AUTHOR_YEAR_SPLIT_RE and BLOCK_RE scans. Block separators are matched with
+# BLOCK_RE's own alternatives and consumed as BLOCK_RE consumes them. The
+# other fields only consume what no block separator can start inside: the
+# "[" opening a bracketed identifier, and the first word of an author-year
+# key, whose year is left for the block alternatives ("Souza 2011 " ends in a
+# separator for BLOCK_RE). The identifier and author-year themselves are
+# captured in lookaheads, and scan_chunk drops any that overlap the previous
+# one of their kind, as a separate findall would never see them.
+# The leading lookahead lists every character a match can start with, which
+# lets the engine reject most positions before trying the alternatives.
+CHUNK_SCAN_RE = re.compile(
+    r'(?=[\[A-Z\n•\d)(*])'
+    r'(?=(?P<author_year>[A-Z][a-z]+(?:\s[A-Z][a-z]+)?\s+(?:et\s+al\.?\s+)?\d{4}[a-z]?))?'
+    r'(?:'
+    r'\[(?=(?P<id_kind>DOI|PMID):(?P<id_value>.*?)\])'
+    r'|(?P<block>\n\s*\n|[•\d\)\(]+\s+|(?<=\n)[A-Z][a-z]+\s+\d{4}|\*{3,})'
+    r'|(?(author_year)[A-Z][a-z]+|(?!))'
+    r')'
+)
+
+ChunkScan = namedtuple('ChunkScan', ['dois', 'pmids', 'author_years', 'block_separators'])
+
+def scan_chunk(text):
+    """
+    Pull DOIs, PMIDs, author-year keys and block separators from a chunk in one pass.
+
+    Args:
+    text (str): A citation chunk or a stretch of the references section
+
+    Returns:
+    ChunkScan: DOI values, PMID values and author-year keys (lists, in order
+    of appearance, as IDENTIFIER_RE and AUTHOR_YEAR_SPLIT_RE find them) and
+    the number of block separators (as len(BLOCK_RE.findall(text)))
+    """
+    dois = []
+    pmids = []
+    author_years = []
+    block_separators = 0
+    identifier_end = author_year_end = 0
+    for match in CHUNK_SCAN_RE.finditer(text):
+        start = match.start()
+        if match.group('block') is not None:
+            block_separators += 1
+        elif match.group('id_kind') is not None and start >= identifier_end:
+            (dois if match.group('id_kind') == 'DOI' else pmids).append(match.group('id_value'))
+            identifier_end = match.end('id_value') + 1
+        author_year = match.group('author_year')
+        if author_year is not None and start >= author_year_end:
+            author_years.append(author_year)
+            author_year_end = start + len(author_year)
+    return ChunkScan(dois, pmids, author_years, block_separators)
+
+def scan_identifiers(text):
+    """Return (dois, pmids) from one pass over the chunk's bracketed identifiers."""
+    dois = []
+    pmids = []
+    for kind, value in IDENTIFIER_RE.findall(text):
+        (dois if kind == 'DOI' else pmids).append(value)
+    return dois, pmids
+
+def count_heading_blocks(text, heading_re=HEADING_RE):
+    """
+    Split a references section on bold-heading matches and count the blocks under each.
+
+    Args:
+    text (str): References section text
+    heading_re (re.Pattern): Heading pattern with one capturing group
+
+    Returns:
+    list: (heading, block_count) tuples in document order
+    """
+    # Split text based on the headings; skip the first split as it will be empty
+    text_blocks = heading_re.split(text)[1:]
+
+    reference_blocks = []
+    for i in range(0, len(text_blocks), 2):
+        reference = text_blocks[i].strip()
+        block_count = len(BLOCK_RE.findall(text_blocks[i + 1].strip())) + 1
+        reference_blocks.append((reference, block_count))
+    return reference_blocks
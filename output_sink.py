@@ -0,0 +1,182 @@
+import csv
+import json
+import os
+import sys
+
+# Streaming output sinks shared by the scripts.
+#
+# Rows are written as they are produced and counted in memory, so nothing is
+# collected in a DataFrame first and no file is re-read to count its rows.
+# The format follows the file extension:
+#
+#   .csv             csv.writer, one row per write
+#   .jsonl/.ndjson   one JSON object per line
+#   .parquet         pyarrow, buffered into row groups of batch_size rows
+#
+# pyarrow is only imported when a Parquet sink is opened. A path of "-"
+# writes CSV or JSON Lines to standard output.
+
+FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".parquet": "parquet"}
+
+STDOUT = "-"
+
+def infer_format(path):
+    if path == STDOUT:
+        return "csv"
+    extension = os.path.splitext(path)[1].lower()
+    try:
+        return FORMATS[extension]
+    except KeyError:
+        raise ValueError(f"Cannot infer output format from {path!r}; use one of {', '.join(FORMATS)}") from None
+
+class OutputSink:
+    """
+    Base class for a streaming row sink.
+
+    Args:
+    path (str): Output file
+    fieldnames (list): Column names, in output order
+    """
+
+    def __init__(self, path, fieldnames):
+        self.path = path
+        self.fieldnames = list(fieldnames)
+        self.rows_written = 0
+
+    def write(self, row):
+        """Write one row, given as a dict keyed by fieldname or a sequence in fieldname order."""
+        if not isinstance(row, dict):
+            row = dict(zip(self.fieldnames, row))
+        self.write_dict(row)
+        self.rows_written += 1
+
+    def write_many(self, rows):
+        for row in rows:
+            self.write(row)
+
+    def write_dict(self, row):
+        raise NotImplementedError
+
+    def open_file(self, append, **kwargs):
+        if self.path == STDOUT:
+            return sys.stdout
+        return open(self.path, 'a' if append else 'w', encoding='utf-8', **kwargs)
+
+    def close_file(self):
+        if self.file is not sys.stdout:
+            self.file.close()
+        else:
+            self.file.flush()
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class CsvSink(OutputSink):
+    def __init__(self, path, fieldnames, append=False):
+        super().__init__(path, fieldnames)
+        write_header = not append or path == STDOUT or not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = self.open_file(append, newline='')
+        self.writer = csv.writer(self.file)
+        if write_header:
+            self.writer.writerow(self.fieldnames)
+
+    def write_dict(self, row):
+        self.writer.writerow([row.get(name, "") for name in self.fieldnames])
+
+    def close(self):
+        self.close_file()
+
+class JsonLinesSink(OutputSink):
+    def __init__(self, path, fieldnames, append=False):
+        super().__init__(path, fieldnames)
+        self.file = self.open_file(append)
+
+    def write_dict(self, row):
+        self.file.write(json.dumps({name: row.get(name) for name in self.fieldnames}, ensure_ascii=False) + "\n")
+
+    def close(self):
+        self.close_file()
+
+class ParquetSink(OutputSink):
+    def __init__(self, path, fieldnames, batch_size=50000):
+        super().__init__(path, fieldnames)
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("Parquet output needs pyarrow: pip install pyarrow") from None
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.batch_size = batch_size
+        self.columns = {name: [] for name in self.fieldnames}
+        self.buffered = 0
+        self.schema = None
+        self.writer = None
+
+    def write_dict(self, row):
+        for name in self.fieldnames:
+            self.columns[name].append(row.get(name))
+        self.buffered += 1
+        if self.buffered >= self.batch_size:
+            self.flush()
+
+    def resolve_null_type(self, data_type):
+        if self.pa.types.is_null(data_type):
+            return self.pa.string()
+        if self.pa.types.is_list(data_type) and self.pa.types.is_null(data_type.value_type):
+            return self.pa.list_(self.pa.string())
+        return data_type
+
+    def flush(self):
+        """Write the buffered rows out as one row group."""
+        if not self.buffered:
+            return
+        table = self.pa.table(self.columns)
+        if self.schema is None:
+            # Columns that were all empty in the first batch have no type yet; store them as strings
+            self.schema = self.pa.schema([field.with_type(self.resolve_null_type(field.type)) for field in table.schema])
+            self.writer = self.pq.ParquetWriter(self.path, self.schema)
+        self.writer.write_table(table.cast(self.schema))
+        self.columns = {name: [] for name in self.fieldnames}
+        self.buffered = 0
+
+    def close(self):
+        self.flush()
+        if self.writer is None:
+            # No rows at all: still leave a valid, empty file with string columns
+            self.schema = self.pa.schema([(name, self.pa.string()) for name in self.fieldnames])
+            self.writer = self.pq.ParquetWriter(self.path, self.schema)
+        self.writer.close()
+
+def open_sink(path, fieldnames, format=None, append=False, batch_size=50000):
+    """
+    Open a streaming sink for path.
+
+    Args:
+    path (str): Output file, or "-" for standard output (CSV unless format says otherwise)
+    fieldnames (list): Column names, in output order
+    format (str): "csv", "jsonl" or "parquet"; inferred from the extension if omitted
+    append (bool): Append to an existing CSV/JSON Lines file instead of replacing it
+    batch_size (int): Rows per Parquet row group
+
+    Returns:
+    OutputSink: Use it as a context manager; rows_written holds the row count
+    """
+    format = format or infer_format(path)
+    if format == "csv":
+        return CsvSink(path, fieldnames, append=append)
+    if format == "jsonl":
+        return JsonLinesSink(path, fieldnames, append=append)
+    if format == "parquet":
+        if append:
+            raise ValueError("Parquet output cannot be appended to")
+        if path == STDOUT:
+            raise ValueError("Parquet output needs a file, not standard output")
+        return ParquetSink(path, fieldnames, batch_size=batch_size)
+    raise ValueError(f"Unknown output format: {format}")
@@ -0,0 +1,345 @@
+from pdf_input import BufferStream
+
+# One interface over the three PDF libraries used in this repo:
+#
+#   pymupdf   fitz (PyMuPDF)                 fast, C-based, has span layout
+#   pypdf2    PyPDF2.PdfReader               pure Python, slowest on big files
+#   pdfminer  pdfminer.six                   pure Python, best on tight text
+#
+# Every script that reads PDFs goes through open_backend() and exposes a
+# --backend switch, so the library can be chosen per run (see
+# bench_backends.py for speed/memory/recall numbers). Each library is only
+# imported when its backend is opened.
+#
+# A backend opens the file by path, or works off data the caller already
+# has: bytes, or a memory map from pdf_input.map_pdf(), shared without
+# copying between the backends and the extraction cache's hashing.
+
+class PdfBackend:
+    """
+    Base class for a PDF opened with one text extraction library.
+
+    Args:
+    pdf_path (str): Path to the PDF file
+    data (bytes-like): The file's contents, read or mapped (see pdf_input); the file is then not opened
+    """
+
+    name = None
+    modules = ()  # Library modules the backend imports when it opens a file
+
+    def __init__(self, pdf_path, data=None):
+        self.pdf_path = pdf_path
+        self.texts = {}
+        self.probe_texts = {}
+
+    @property
+    def page_count(self):
+        raise NotImplementedError
+
+    def extract_page_text(self, page_index):
+        raise NotImplementedError
+
+    def page_text(self, page_index):
+        """Return the text of one page, extracting it at most once."""
+        if page_index not in self.texts:
+            self.texts[page_index] = self.extract_page_text(page_index) or ""
+        return self.texts[page_index]
+
+    def probe_text(self, page_index):
+        # Text used only for phrase probing; backends with a cheaper mode override this
+        return self.page_text(page_index)
+
+    def contains(self, page_index, phrase):
+        """Return True if the phrase occurs on the page, ignoring whitespace."""
+        if page_index not in self.probe_texts:
+            self.probe_texts[page_index] = "".join(self.probe_text(page_index).split())
+        return "".join(phrase.split()) in self.probe_texts[page_index]
+
+    def toc(self):
+        """Return the outline as (level, title, page_index) entries, page_index 0-based."""
+        return []
+
+    def page_image_count(self, page_index):
+        """Return the number of image XObjects on a page."""
+        raise NotImplementedError
+
+    def page_content_stream(self, page_index):
+        """Return the page's decompressed content stream, without interpreting it."""
+        raise NotImplementedError
+
+    def page_font_types(self, page_index):
+        """Return the Subtype names (Type0, Type1, TrueType, ...) of the page's fonts."""
+        raise NotImplementedError
+
+    def page_form_count(self, page_index):
+        """Return the number of Form XObjects the page uses (0: everything it draws is in its own content stream)."""
+        raise NotImplementedError
+
+    def page_spans(self, page_index):
+        """Return (page, block, line, text, font, flags, size, x0, y0, x1, y1) span records."""
+        raise NotImplementedError(f"Span layout is not available from the {self.name} backend")
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class PyMuPDFBackend(PdfBackend):
+    name = "pymupdf"
+    modules = ("fitz",)
+
+    def __init__(self, pdf_path, data=None):
+        super().__init__(pdf_path, data)
+        import fitz  # PyMuPDF
+        self.view = None
+        if data is None:
+            self.doc = fitz.open(pdf_path)
+        else:
+            # fitz reads bytes and memoryviews in place, but not an mmap object itself
+            self.view = memoryview(data)
+            self.doc = fitz.open(stream=self.view, filetype="pdf")
+
+    @property
+    def page_count(self):
+        return len(self.doc)
+
+    def extract_page_text(self, page_index):
+        return self.doc[page_index].get_text()
+
+    def contains(self, page_index, phrase):
+        # search_for runs inside MuPDF and never builds the page text in
+        # Python, so probing a page is much cheaper than get_text()
+        return bool(self.doc[page_index].search_for(phrase))
+
+    def toc(self):
+        # get_toc() reports 1-based page numbers
+        return [(level, title, page - 1) for level, title, page in self.doc.get_toc(simple=True)]
+
+    def page_image_count(self, page_index):
+        return len(self.doc[page_index].get_images())
+
+    def page_content_stream(self, page_index):
+        return self.doc[page_index].read_contents()
+
+    def page_font_types(self, page_index):
+        # get_fonts() entries are (xref, ext, type, basefont, name, encoding, ...)
+        return [font[2] for font in self.doc[page_index].get_fonts()]
+
+    def page_form_count(self, page_index):
+        # get_xobjects() also lists the forms nested inside the page's forms
+        return len(self.doc[page_index].get_xobjects())
+
+    def page_spans(self, page_index):
+        records = []
+        page = self.doc.load_page(page_index)
+        for block_num, block in enumerate(page.get_text("dict")["blocks"]):
+            for line_num, line in enumerate(block.get("lines", [])):
+                for span in line.get("spans", []):
+                    x0, y0, x1, y1 = span["bbox"]
+                    records.append((page_index, block_num, line_num, span["text"], span["font"], span["flags"], span["size"], x0, y0, x1, y1))
+        return records
+
+    def close(self):
+        self.doc.close()
+        if self.view is not None:
+            self.view.release()
+
+class PyPDF2Backend(PdfBackend):
+    name = "pypdf2"
+    modules = ("PyPDF2",)
+
+    def __init__(self, pdf_path, data=None):
+        super().__init__(pdf_path, data)
+        import PyPDF2
+        self.file = open(pdf_path, 'rb') if data is None else BufferStream(data)
+        try:
+            self.reader = PyPDF2.PdfReader(self.file)
+        except Exception:
+            self.file.close()
+            raise
+
+    @property
+    def page_count(self):
+        return len(self.reader.pages)
+
+    def extract_page_text(self, page_index):
+        return self.reader.pages[page_index].extract_text()
+
+    def toc(self):
+        # Flatten PyPDF2's nested outline into (level, title, page_index) entries
+        toc = []
+
+        def walk(entries, level):
+            for entry in entries:
+                if isinstance(entry, list):
+                    walk(entry, level + 1)
+                    continue
+                try:
+                    page_index = self.reader.get_destination_page_number(entry)
+                except Exception:
+                    page_index = None
+                toc.append((level, str(entry.title), page_index))
+
+        try:
+            walk(self.reader.outline, 1)
+        except Exception:
+            return []
+        return toc
+
+    def page_image_count(self, page_index):
+        page = self.reader.pages[page_index]
+        if '/XObject' not in page['/Resources']:
+            return 0
+        xObject = page['/Resources']['/XObject'].get_object()
+        if not xObject:
+            return 0
+        return sum(1 for obj in xObject if xObject[obj]['/Subtype'] == '/Image')
+
+    def page_content_stream(self, page_index):
+        contents = self.reader.pages[page_index].get_contents()
+        if contents is None:
+            return b""
+        # Some PyPDF2 versions hand back the raw /Contents array for multi-stream pages
+        if isinstance(contents, list):
+            return b"\n".join(stream.get_object().get_data() for stream in contents)
+        return contents.get_data()
+
+    def page_font_types(self, page_index):
+        resources = self.reader.pages[page_index].get('/Resources')
+        if resources is None:
+            return []
+        fonts = resources.get_object().get('/Font')
+        if fonts is None:
+            return []
+        fonts = fonts.get_object()
+        return [str(fonts[name].get_object().get('/Subtype', '')).lstrip('/') for name in fonts]
+
+    def page_form_count(self, page_index):
+        page = self.reader.pages[page_index]
+        if '/XObject' not in page['/Resources']:
+            return 0
+        xObject = page['/Resources']['/XObject'].get_object()
+        if not xObject:
+            return 0
+        return sum(1 for obj in xObject if xObject[obj]['/Subtype'] == '/Form')
+
+    def close(self):
+        self.file.close()
+
+class PdfMinerBackend(PdfBackend):
+    name = "pdfminer"
+    modules = ("pdfminer.pdfinterp", "pdfminer.pdfpage", "pdfminer.converter", "pdfminer.layout", "pdfminer.pdftypes")
+
+    def __init__(self, pdf_path, data=None):
+        super().__init__(pdf_path, data)
+        from pdfminer.pdfinterp import PDFResourceManager
+        from pdfminer.pdfpage import PDFPage
+        self.file = open(pdf_path, 'rb') if data is None else BufferStream(data)
+        try:
+            self.pages = list(PDFPage.get_pages(self.file))
+        except Exception:
+            self.file.close()
+            raise
+        self.rsrcmgr = PDFResourceManager(caching=True)
+
+    @property
+    def page_count(self):
+        return len(self.pages)
+
+    def render_text(self, page_index, laparams):
+        from io import StringIO
+        from pdfminer.converter import TextConverter
+        from pdfminer.pdfinterp import PDFPageInterpreter
+
+        output = StringIO()
+        device = TextConverter(self.rsrcmgr, output, laparams=laparams)
+        PDFPageInterpreter(self.rsrcmgr, device).process_page(self.pages[page_index])
+        device.close()
+        return output.getvalue()
+
+    def extract_page_text(self, page_index):
+        # Same layout analysis as pdfminer.high_level.extract_text
+        from pdfminer.layout import LAParams
+        return self.render_text(page_index, LAParams())
+
+    def probe_text(self, page_index):
+        # Probe without layout analysis, which is where pdfminer spends most
+        # of its time; only the pages that are kept get the full treatment
+        if page_index in self.texts:
+            return self.texts[page_index]
+        return self.render_text(page_index, None)
+
+    def page_image_count(self, page_index):
+        from pdfminer.pdfinterp import LITERAL_IMAGE
+        from pdfminer.pdftypes import PDFStream, resolve1
+        resources = resolve1(self.pages[page_index].resources) or {}
+        xobjects = resolve1(resources.get('XObject')) or {}
+        count = 0
+        for xobj in xobjects.values():
+            xobj = resolve1(xobj)
+            if isinstance(xobj, PDFStream) and xobj.get('Subtype') is LITERAL_IMAGE:
+                count += 1
+        return count
+
+    def page_content_stream(self, page_index):
+        from pdfminer.pdftypes import resolve1
+        return b"".join(resolve1(stream).get_data() for stream in self.pages[page_index].contents)
+
+    def page_font_types(self, page_index):
+        from pdfminer.pdftypes import resolve1
+        resources = resolve1(self.pages[page_index].resources) or {}
+        fonts = resolve1(resources.get('Font')) or {}
+        return [getattr(resolve1(font).get('Subtype'), 'name', '') for font in fonts.values()]
+
+    def page_form_count(self, page_index):
+        from pdfminer.pdfinterp import LITERAL_FORM
+        from pdfminer.pdftypes import PDFStream, resolve1
+        resources = resolve1(self.pages[page_index].resources) or {}
+        xobjects = resolve1(resources.get('XObject')) or {}
+        count = 0
+        for xobj in xobjects.values():
+            xobj = resolve1(xobj)
+            if isinstance(xobj, PDFStream) and xobj.get('Subtype') is LITERAL_FORM:
+                count += 1
+        return count
+
+    def close(self):
+        self.file.close()
+
+BACKENDS = {
+    PyMuPDFBackend.name: PyMuPDFBackend,
+    PyPDF2Backend.name: PyPDF2Backend,
+    PdfMinerBackend.name: PdfMinerBackend,
+}
+
+def open_backend(pdf_path, backend="pymupdf", data=None):
+    """
+    Open a PDF with the named backend.
+
+    Args:
+    pdf_path (str): Path to the PDF file
+    backend (str): One of BACKENDS
+    data (bytes-like): The file's contents, if the caller has already read or mapped them
+
+    Returns:
+    PdfBackend: The opened document; use it as a context manager to close it
+    """
+    try:
+        backend_class = BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {', '.join(BACKENDS)}") from None
+    return backend_class(pdf_path, data)
+
+def preload_backend(backend="pymupdf"):
+    """Import a backend's library ahead of the first file, e.g. when warming up a worker process."""
+    import importlib
+    for module in BACKENDS[backend].modules:
+        importlib.import_module(module)
+
+def add_backend_argument(parser, default="pymupdf"):
+    """Add a --backend option to an argparse parser."""
+    parser.add_argument("--backend", default=default, choices=sorted(BACKENDS), help=f"PDF text extraction library (default: {default})")
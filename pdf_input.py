@@ -0,0 +1,121 @@
+import io
+import mmap
+import os
+
+# Shared, memory-mapped input for PDF files.
+#
+# A PDF that is triaged, hashed for the extraction cache and then parsed
+# used to be read from disk once per step, each time into a fresh bytes
+# object. map_pdf() maps the file once instead; every consumer works off the
+# same pages of the OS page cache:
+#
+#   with map_pdf(pdf_path) as data:
+#       file_digest(pdf_path, data=data)
+#       with open_backend(pdf_path, "pymupdf", data=data) as document:
+#           ...
+#
+# PyMuPDF reads a memoryview of the map in place (fitz.open(stream=...)).
+# PyPDF2 and pdfminer want a seekable file object, so they get a
+# BufferStream: a read-only file over the buffer with its own position,
+# which only copies the bytes each read() asks for. Any bytes-like object
+# works as data, so bytes read by a caller (async_pipeline) go the same way.
+
+class BufferStream(io.RawIOBase):
+    """
+    Read-only, seekable file object over a bytes-like buffer, without copying it.
+
+    Args:
+    data (bytes-like): Buffer to read; several streams can share one buffer
+    """
+
+    def __init__(self, data):
+        self.view = memoryview(data)
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += len(self.view)
+        if offset < 0:
+            raise ValueError(f"negative seek position {offset}")
+        self.position = offset
+        return offset
+
+    def read(self, size=-1):
+        start = self.position
+        end = len(self.view) if size is None or size < 0 else min(start + size, len(self.view))
+        if end <= start:
+            return b""
+        self.position = end
+        return self.view[start:end].tobytes()
+
+    def readall(self):
+        return self.read()
+
+    def readinto(self, buffer):
+        chunk = self.read(len(buffer))
+        buffer[:len(chunk)] = chunk
+        return len(chunk)
+
+    def close(self):
+        # Release the view so the map underneath can be closed
+        if not self.closed:
+            self.view.release()
+        super().close()
+
+class MappedPdf:
+    """
+    A PDF file mapped into memory read-only.
+
+    Use it as a context manager; data is the buffer to hand to file_digest
+    and open_backend. Empty files cannot be mapped, so their data is b"".
+
+    Args:
+    pdf_path (str): Path to the PDF file
+    """
+
+    def __init__(self, pdf_path):
+        self.pdf_path = pdf_path
+        with open(pdf_path, 'rb') as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                self.data = b""
+            else:
+                # The map stays valid after the file is closed
+                self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            try:
+                self.data.close()
+            except BufferError:
+                # A consumer still holds a view of the map; it is unmapped
+                # once that view is garbage collected
+                pass
+
+    def __enter__(self):
+        return self.data
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def map_pdf(pdf_path):
+    """
+    Memory-map a PDF for reading.
+
+    Args:
+    pdf_path (str): Path to the PDF file
+
+    Returns:
+    MappedPdf: Context manager yielding the mapped bytes
+    """
+    return MappedPdf(pdf_path)
@@ -1,6 +1,10 @@
-import fitz  # PyMuPDF
-import re
 import os
+from matchers import HEADING_RE, count_heading_blocks
+from extraction_cache import section_pages
+from instrumentation import stage
+
+# Columns of the per-heading reference counts
+HEADER = ['File Name', 'Bold Text', 'Number of References']
 
 def extract_references_section(text):
     start_idx = text.find("References to studies included in this review")
@@ -12,42 +16,40 @@ def extract_references_section(text):
     return text
 
 def count_bold_headings_and_blocks_for_csv(text):
-    # Pattern to match any bold heading with a study name and year
-    heading_pattern = r"([A-Za-z]+ \d{4})"
-    headings = re.findall(heading_pattern, text)
-    
-    # Split text based on these headings to count the number of blocks under each heading
-    text_blocks = re.split(heading_pattern, text)[1:]  # Skip the first split as it will be empty
-    
-    # Regex pattern to identify text blocks
-    block_pattern = r"(\n\s*\n|[•\d\)\(]+\s+|(?<=\n)[A-Z][a-z]+\s+\d{4}|\*{3,})"  # Including "***" as a potential block separator
-    
-    reference_blocks = []
-    for i in range(0, len(text_blocks), 2):
-        reference = text_blocks[i].strip()
-        
-        # Apply the regex to count blocks more effectively
-        block_count = len(re.findall(block_pattern, text_blocks[i + 1].strip())) + 1
-        reference_blocks.append((reference, block_count))
-    
-    return reference_blocks
-
-def process_pdf(input_file, writer):
-    # Read the PDF and extract text
-    doc = fitz.open(input_file)
-    text = ""
-    for page in doc:
-        text += page.get_text()
-
-    # Extract the references section
-    references_text = extract_references_section(text)
-
-    # Get the reference blocks with their counts
-    reference_blocks = count_bold_headings_and_blocks_for_csv(references_text)
+    # Split on bold "Name 2000" headings and count the reference blocks under each
+    return count_heading_blocks(text, HEADING_RE)
+
+def layout_reference_rows(input_file):
+    # Exact counts: references are segmented from span layout (PyMuPDF only)
+    from layout_segmenter import segment_references
+    file_name = os.path.basename(input_file)
+    return [(file_name, study.heading, len(study.references)) for study in segment_references(input_file)]
+
+def extract_reference_rows(input_file, backend="pymupdf", segmenter="regex"):
+    if segmenter == "layout":
+        return layout_reference_rows(input_file)
+
+    # Extract text from the pages of the references section only, reusing the
+    # extraction cache when one is configured
+    return reference_rows_from_pages(input_file, section_pages(input_file, backend))
+
+def reference_rows_from_pages(input_file, pages):
+    with stage("headings"):
+        text = "".join(pages)
+
+        # Extract the references section
+        references_text = extract_references_section(text)
+
+        # Get the reference blocks with their counts
+        reference_blocks = count_bold_headings_and_blocks_for_csv(references_text)
 
     # Get just the file name without the directory path
     file_name = os.path.basename(input_file)
 
+    # One (file_name, heading, count) row per bold heading
+    return [(file_name, reference, count) for reference, count in reference_blocks]
+
+def process_pdf(input_file, writer, backend="pymupdf", segmenter="regex"):
     # Write to CSV
-    for reference, count in reference_blocks:
-        writer.writerow([file_name, reference, count])
+    for row in extract_reference_rows(input_file, backend, segmenter):
+        writer.writerow(row)
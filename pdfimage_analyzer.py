@@ -1,133 +1,246 @@
 import os
-import PyPDF2
-from PyPDF2.errors import PdfReadError
-import pandas as pd
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from tqdm import tqdm
+import sys
+from collections import Counter
+from contextlib import nullcontext
 import argparse
 import logging
 from functools import partial
+from pdf_backends import open_backend, add_backend_argument
+from pdf_input import map_pdf
+from structural_triage import classify_structural
+from output_sink import open_sink
+from records import PdfProfile
 
+# PyPDF2, tqdm, pandas and the executors are imported where they are used, so
+# that importing this module (or triaging one file through cli.py) does not
+# pay for them.
+
+def is_pdf_read_error(error):
+    # A PdfReadError can only come from PyPDF2 once it has been imported
+    errors = sys.modules.get("PyPDF2.errors")
+    return errors is not None and isinstance(error, errors.PdfReadError)
 
 def setup_logging(log_level):
     """Set up logging configuration."""
     logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def analyze_pdf(pdf_path, max_pages=5):
+def classify_document(document, pdf_path, max_pages=5, early_exit=False, mode="full"):
+    """
+    Classify an open PDF as Text-based, Image-based or Hybrid (see analyze_pdf).
+    
+    Page texts extracted here stay in the document's page text memo, so a
+    caller that goes on to extract from the same document reuses them.
+    
+    Args:
+    document (PdfBackend): Open document
+    pdf_path (str): Path to the PDF file, for the name and size columns
+    max_pages (int): Maximum number of pages to analyze
+    early_exit (bool): See analyze_pdf
+    mode (str): See analyze_pdf
+    
+    Returns:
+    PdfProfile: The analysis result
+    """
+    if mode == "structural":
+        profile = classify_structural(document, max_pages)
+        if profile is not None:
+            return PdfProfile.from_dict({
+                "File Name": os.path.basename(pdf_path),
+                **profile,
+                "File Size (KB)": round(os.path.getsize(pdf_path) / 1024, 2),
+                "Method": "structural"
+            })
+        logging.debug(f"Ambiguous structure, falling back to full extraction: {pdf_path}")
+    
+    num_pages = document.page_count
+    
+    total_text = 0
+    total_images = 0
+    has_text_content = False
+    
+    for page_num in range(min(num_pages, max_pages)):
+        # total_text only grows, so once it clears the 100 chars/page
+        # threshold with text content seen the type can no longer change;
+        # the remaining pages only need their (cheap) image count
+        text_settled = early_exit and has_text_content and total_text > 100 * num_pages
+        if not text_settled:
+            text = document.page_text(page_num)
+            total_text += len(text.strip())
+            
+            if len(text.strip()) > 10:
+                has_text_content = True
+        
+        total_images += document.page_image_count(page_num)
+    
+    text_to_page_ratio = total_text / num_pages
+    
+    pdf_type = "Text-based" if text_to_page_ratio > 100 and has_text_content else \
+               "Image-based" if total_images > 0 and text_to_page_ratio < 50 else "Hybrid"
+    
+    return PdfProfile(
+        file_name=os.path.basename(pdf_path),
+        pages=num_pages,
+        type=pdf_type,
+        avg_text_per_page=round(text_to_page_ratio, 2),
+        images=total_images,
+        searchable="Yes" if has_text_content else "No",
+        size_kb=round(os.path.getsize(pdf_path) / 1024, 2),
+        method="full" if mode == "structural" else None
+    )
+
+def analyze_pdf(pdf_path, max_pages=5, backend="pypdf2", early_exit=False, mode="full", data=None):
     """
     Analyze a single PDF file and return its characteristics.
     
     Args:
     pdf_path (str): Path to the PDF file
     max_pages (int): Maximum number of pages to analyze per PDF
+    backend (str): PDF library to read the file with (see pdf_backends)
+    early_exit (bool): Stop extracting page text once the file is certain to be
+        Text-based; "Avg Text/Page" is then a lower bound
+    mode (str): "full" extracts page text; "structural" estimates text density
+        from content streams and font resources and only falls back to full
+        extraction for ambiguous files (the result's "Method" says which)
+    data (bytes-like): The file's bytes or memory map (see pdf_input), to share
+        one read of the file with other steps; the file is mapped if not given
     
     Returns:
-    dict: A dictionary containing the analysis results
+    PdfProfile: The analysis results (as_dict() gives the output columns)
     """
     try:
-        with open(pdf_path, 'rb') as file:
-            reader = PyPDF2.PdfReader(file)
-            num_pages = len(reader.pages)
-            
-            total_text = 0
-            total_images = 0
-            has_text_content = False
-            
-            for page_num in range(min(num_pages, max_pages)):
-                page = reader.pages[page_num]
-                text = page.extract_text()
-                total_text += len(text.strip())
-                
-                if len(text.strip()) > 10:
-                    has_text_content = True
-                
-                if '/XObject' in page['/Resources']:
-                    xObject = page['/Resources']['/XObject'].get_object()
-                    if xObject:
-                        total_images += sum(1 for obj in xObject if xObject[obj]['/Subtype'] == '/Image')
-            
-            text_to_page_ratio = total_text / num_pages
-            
-            pdf_type = "Text-based" if text_to_page_ratio > 100 and has_text_content else \
-                       "Image-based" if total_images > 0 and text_to_page_ratio < 50 else "Hybrid"
-            
-            return {
-                "File Name": os.path.basename(pdf_path),
-                "Pages": num_pages,
-                "Type": pdf_type,
-                "Avg Text/Page": round(text_to_page_ratio, 2),
-                "Images": total_images,
-                "Searchable": "Yes" if has_text_content else "No",
-                "File Size (KB)": round(os.path.getsize(pdf_path) / 1024, 2)
-            }
-    
-    except PdfReadError:
-        logging.error(f"Failed to read PDF: {pdf_path}")
-        return {"File Name": os.path.basename(pdf_path), "Error": "Failed to read PDF"}
+        with (map_pdf(pdf_path) if data is None else nullcontext(data)) as data, \
+                open_backend(pdf_path, backend, data) as document:
+            return classify_document(document, pdf_path, max_pages, early_exit, mode)
+    
     except Exception as e:
+        if is_pdf_read_error(e):
+            logging.error(f"Failed to read PDF: {pdf_path}")
+            return PdfProfile(os.path.basename(pdf_path), error="Failed to read PDF")
         logging.error(f"Error processing {pdf_path}: {str(e)}")
-        return {"File Name": os.path.basename(pdf_path), "Error": str(e)}
+        return PdfProfile(os.path.basename(pdf_path), error=str(e))
+
+RESULT_FIELDS = ["File Name", "Pages", "Type", "Avg Text/Page", "Images", "Searchable", "File Size (KB)", "Error"]
 
-def analyze_directory(directory_path, max_pages=5):
+def iter_analyze_directory(directory_path, max_pages=5, backend="pypdf2", executor="process", workers=None,
+                           chunksize=None, early_exit=False, mode="full"):
     """
-    Analyze all PDF files in a directory using multi-threading.
+    Analyze all PDF files in a directory using a pool of worker processes or threads,
+    yielding each result as soon as it is available.
     
     Args:
     directory_path (str): Path to the directory containing PDF files
     max_pages (int): Maximum number of pages to analyze per PDF
+    backend (str): PDF library to read the files with (see pdf_backends)
+    executor (str): "process" to use every core, or "thread"; text extraction
+        is CPU-bound Python, so threads serialize on the GIL
+    workers (int): Number of workers, defaults to os.cpu_count()
+    chunksize (int): PDFs handed to a worker process at a time, defaults to
+        spreading the files over about four chunks per worker
+    early_exit (bool): Stop page text extraction once a file is settled as Text-based
+    mode (str): "full" or "structural" classification (see analyze_pdf)
     
-    Returns:
-    pd.DataFrame: A DataFrame containing the analysis results for all PDFs
+    Yields:
+    PdfProfile: Analysis result for one PDF, in file name order
     """
-    pdf_files = [f for f in os.listdir(directory_path) if f.lower().endswith('.pdf')]
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+    from tqdm import tqdm
+
+    # Sorted up front so the results stream out in the order the report is read in
+    pdf_files = sorted(f for f in os.listdir(directory_path) if f.lower().endswith('.pdf'))
+    pdf_paths = [os.path.join(directory_path, pdf) for pdf in pdf_files]
+    workers = workers or os.cpu_count()
     
-    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
-        analyze_pdf_partial = partial(analyze_pdf, max_pages=max_pages)
-        future_to_pdf = {executor.submit(analyze_pdf_partial, os.path.join(directory_path, pdf)): pdf for pdf in pdf_files}
-        
-        results = []
-        for future in tqdm(as_completed(future_to_pdf), total=len(pdf_files), desc="Analyzing PDFs"):
-            results.append(future.result())
+    analyze_pdf_partial = partial(analyze_pdf, max_pages=max_pages, backend=backend, early_exit=early_exit, mode=mode)
+    if executor == "process":
+        # Chunked submission keeps the per-task pickling overhead down on large archives
+        chunksize = chunksize or max(1, len(pdf_paths) // (workers * 4))
+        pool = ProcessPoolExecutor(max_workers=workers)
+        map_kwargs = {"chunksize": chunksize}
+    else:
+        pool = ThreadPoolExecutor(max_workers=workers)
+        map_kwargs = {}
     
-    return pd.DataFrame(results)
+    with pool:
+        yield from tqdm(pool.map(analyze_pdf_partial, pdf_paths, **map_kwargs), total=len(pdf_paths), desc="Analyzing PDFs")
 
-def generate_summary(df):
-    """Generate and print summary statistics."""
-    print("\nAnalysis Summary:")
-    print(df.to_string(index=False))
+def analyze_directory(directory_path, max_pages=5, backend="pypdf2", executor="process", workers=None,
+                      chunksize=None, early_exit=False, mode="full"):
+    """
+    Analyze all PDF files in a directory (see iter_analyze_directory).
     
+    Returns:
+    pd.DataFrame: A DataFrame containing the analysis results for all PDFs
+    """
+    import pandas as pd
+    profiles = list(iter_analyze_directory(directory_path, max_pages, backend, executor, workers,
+                                           chunksize, early_exit, mode))
+    # Built column by column from the profiles' slots, without a dict per file
+    columns = {column: [getattr(profile, name) for profile in profiles] for name, column in PdfProfile.COLUMNS.items()}
+    if all(profile.method is None for profile in profiles):
+        del columns["Method"]
+    return pd.DataFrame(columns)
+
+class SummaryCounter:
+    """Running totals for the summary, updated one result at a time."""
+
+    def __init__(self):
+        self.total = 0
+        self.types = Counter()
+        self.searchable = Counter()
+        self.size_total = 0.0
+        self.sized = 0
+        self.errors = 0
+
+    def add(self, profile):
+        self.total += 1
+        self.types[profile.type] += 1
+        self.searchable[profile.searchable] += 1
+        if profile.size_kb is not None:
+            self.size_total += profile.size_kb
+            self.sized += 1
+        if profile.error is not None:
+            self.errors += 1
+
+def generate_summary(summary):
+    """Print summary statistics."""
     print("\nOverall Statistics:")
-    print(f"Total PDFs analyzed: {len(df)}")
-    print(f"Text-based PDFs: {df['Type'].value_counts().get('Text-based', 0)}")
-    print(f"Image-based PDFs: {df['Type'].value_counts().get('Image-based', 0)}")
-    print(f"Hybrid PDFs: {df['Type'].value_counts().get('Hybrid', 0)}")
-    print(f"Searchable PDFs: {df['Searchable'].value_counts().get('Yes', 0)}")
-    print(f"Non-searchable PDFs: {df['Searchable'].value_counts().get('No', 0)}")
-    print(f"Average file size: {df['File Size (KB)'].mean():.2f} KB")
-    
-    # Check if 'Error' column exists before trying to access it
-    if 'Error' in df.columns:
-        print(f"PDFs with errors: {df['Error'].notna().sum()}")
-    else:
-        print("PDFs with errors: 0")
+    print(f"Total PDFs analyzed: {summary.total}")
+    print(f"Text-based PDFs: {summary.types['Text-based']}")
+    print(f"Image-based PDFs: {summary.types['Image-based']}")
+    print(f"Hybrid PDFs: {summary.types['Hybrid']}")
+    print(f"Searchable PDFs: {summary.searchable['Yes']}")
+    print(f"Non-searchable PDFs: {summary.searchable['No']}")
+    average_size = summary.size_total / summary.sized if summary.sized else float("nan")
+    print(f"Average file size: {average_size:.2f} KB")
+    print(f"PDFs with errors: {summary.errors}")
 
 def main():
     parser = argparse.ArgumentParser(description="Analyze PDF files in a directory.")
     parser.add_argument("directory", help="Directory containing PDF files")
-    parser.add_argument("--output", default="pdf_imageanalysis_summary.csv", help="Output CSV file name")
+    parser.add_argument("--output", default="pdf_imageanalysis_summary.csv", help="Output file (.csv, .jsonl or .parquet)")
     parser.add_argument("--max-pages", type=int, default=5, help="Maximum number of pages to analyze per PDF")
+    add_backend_argument(parser, default="pypdf2")
+    parser.add_argument("--executor", default="process", choices=["process", "thread"], help="Run the analysis in worker processes or threads")
+    parser.add_argument("--workers", type=int, default=None, help="Number of workers (default: number of CPUs)")
+    parser.add_argument("--chunksize", type=int, default=None, help="PDFs handed to a worker process at a time")
+    parser.add_argument("--mode", default="full", choices=["full", "structural"], help="Classify from extracted text, or from content-stream structure with full extraction only for ambiguous files")
+    parser.add_argument("--early-exit", action="store_true", help="Stop extracting page text once a PDF is settled as Text-based")
     parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"], help="Set the logging level")
     args = parser.parse_args()
 
     setup_logging(args.log_level)
 
     logging.info(f"Analyzing PDFs in directory: {args.directory}")
-    df = analyze_directory(args.directory, args.max_pages)
-    
-    df_sorted = df.sort_values('File Name')
-    generate_summary(df_sorted)
+    fieldnames = RESULT_FIELDS + ["Method"] if args.mode == "structural" else RESULT_FIELDS
+    summary = SummaryCounter()
+    # Each result is written as soon as it arrives rather than collected first
+    with open_sink(args.output, fieldnames) as sink:
+        for result in iter_analyze_directory(args.directory, args.max_pages, args.backend, args.executor, args.workers,
+                                             args.chunksize, args.early_exit, args.mode):
+            sink.write(result.as_dict())
+            summary.add(result)
     
-    df_sorted.to_csv(args.output, index=False)
+    generate_summary(summary)
     logging.info(f"Detailed analysis saved to '{args.output}'")
 
     return 0
@@ -1,32 +1,141 @@
 import os
 import csv
-from pdf_processing import process_pdf
+import argparse
+import logging
+from functools import partial
+from pdf_processing import HEADER, extract_reference_rows
+from extraction_cache import add_cache_arguments, configure_cache_from_args, get_cache, configure_cache
+from pdf_backends import add_backend_argument
+from run_manifest import (STATUS_DONE, STATUS_FAILED, ManifestWriter, default_manifest_path, drop_output_rows,
+                          fingerprint, load_manifest, select_pending)
+import instrumentation
+from instrumentation import add_profile_arguments, configure_from_args, document
 
-def process_directory(directory_path, output_file):
-    # Get the total number of PDF files in the directory
-    pdf_files = [filename for filename in os.listdir(directory_path) if filename.endswith('.pdf')]
-    total_files = len(pdf_files)
+def init_worker(cache_args, profile_memory):
+    configure_cache(*cache_args)
+    instrumentation.init_worker(profile_memory)
 
-    with open(output_file, 'w', newline='') as csvfile:
+def process_file(file_path, backend="pymupdf", segmenter="regex"):
+    # Runs in a worker process: return the rows instead of writing them, so a
+    # single writer in the parent owns the CSV. Failures are reported back
+    # rather than raised, so one bad PDF cannot abort the whole run.
+    # The fingerprint is taken before extraction so the manifest describes
+    # the file contents the rows came from. Stage timings, if profiling is
+    # on, travel back with the result.
+    with document(file_path):
+        try:
+            file_fingerprint = fingerprint(file_path)
+            result = extract_reference_rows(file_path, backend, segmenter), None, file_fingerprint
+        except Exception as e:
+            result = [], f"{type(e).__name__}: {e}", None
+    return result + (instrumentation.drain(),)
+
+def process_directory(directory_path, output_file, workers=1, chunksize=4, backend="pymupdf",
+                      mode="fresh", manifest_file=None, segmenter="regex", profile_report=None):
+    """
+    Count references under each bold heading for every PDF in a directory.
+
+    Args:
+    directory_path (str): Directory containing PDF files
+    output_file (str): Output CSV file
+    workers (int): Number of worker processes (1 = serial)
+    chunksize (int): PDFs handed to a worker process at a time
+    backend (str): PDF library to extract text with (see pdf_backends)
+    mode (str): "fresh" starts over, "resume" skips PDFs the manifest records
+        as done, "incremental" also reprocesses done PDFs that changed since
+    manifest_file (str): Run manifest path, defaults to <output_file>.manifest.jsonl
+    segmenter (str): "regex" counts separator matches in the section text;
+        "layout" segments the references from span geometry (PyMuPDF only)
+    profile_report (str): Run report path; needs profiling enabled (see instrumentation)
+
+    Returns:
+    list: File names that failed
+    """
+    manifest_file = manifest_file or default_manifest_path(output_file)
+
+    # Get the PDF files in the directory, sorted so the output order is deterministic
+    pdf_files = sorted(filename for filename in os.listdir(directory_path) if filename.endswith('.pdf'))
+    file_paths = [os.path.abspath(os.path.join(directory_path, filename)) for filename in pdf_files]
+
+    if mode == "fresh":
+        output_mode = 'w'
+    else:
+        file_paths = select_pending(file_paths, load_manifest(manifest_file), incremental=(mode == "incremental"))
+        # Rows of files about to be redone are stale, or were left behind by a
+        # crash between writing the rows and recording the file as done
+        drop_output_rows(output_file, [os.path.basename(path) for path in file_paths])
+        output_mode = 'a'
+        logging.info("Skipping %d finished files; %d to process.", len(pdf_files) - len(file_paths), len(file_paths))
+
+    total_files = len(file_paths)
+    failed_files = []
+    profile_records = []
+    process_one = partial(process_file, backend=backend, segmenter=segmenter)
+    write_header = output_mode == 'w' or not os.path.exists(output_file) or os.path.getsize(output_file) == 0
+
+    with open(output_file, output_mode, newline='') as csvfile, \
+            ManifestWriter(manifest_file, truncate=(mode == "fresh")) as manifest:
         writer = csv.writer(csvfile)
-        writer.writerow(['File Name', 'Bold Text', 'Number of References'])
+        if write_header:
+            writer.writerow(HEADER)
+
+        if workers > 1:
+            from concurrent.futures import ProcessPoolExecutor  # Serial runs skip loading multiprocessing
 
-        # Loop through each file and process it
-        for idx, filename in enumerate(pdf_files, start=1):
-            file_path = os.path.join(directory_path, filename)
-            print(f"Processing file {idx}/{total_files}: {filename}...")  # Status update
+            # Workers use the same extraction cache as the parent
+            cache = get_cache()
+            cache_args = (cache.cache_dir, cache.max_bytes) if cache is not None else (None,)
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                           initargs=(cache_args, instrumentation.worker_args()))
+            # executor.map yields results in submission order, so rows come out
+            # in the same order as a serial run regardless of which worker finishes first
+            results = executor.map(process_one, file_paths, chunksize=chunksize)
+        else:
+            executor = None
+            results = map(process_one, file_paths)
 
-            process_pdf(file_path, writer)
-            
-            print(f"Finished processing {filename} ({idx}/{total_files}).")  # Status update
+        try:
+            # Loop through each result and write it out
+            for idx, (file_path, (rows, error, file_fingerprint, records)) in enumerate(zip(file_paths, results), start=1):
+                filename = os.path.basename(file_path)
+                profile_records.extend(records)
+                if error is not None:
+                    failed_files.append(filename)
+                    manifest.record(file_path, file_fingerprint, STATUS_FAILED, error=error)
+                    logging.warning("Failed to process %s (%d/%d): %s", filename, idx, total_files, error)
+                    continue
 
-    print(f"All {total_files} files processed. Results saved to {output_file}.")
+                # Rows reach the file before the manifest marks the PDF as done
+                writer.writerows(rows)
+                csvfile.flush()
+                manifest.record(file_path, file_fingerprint, STATUS_DONE, rows=len(rows))
+                logging.info("Finished processing %s (%d/%d).", filename, idx, total_files)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+    logging.info("All %d files processed (%d failed). Results saved to %s.", total_files, len(failed_files), output_file)
+    if profile_report:
+        instrumentation.write_report(profile_report, profile_records)
+    return failed_files
 
 if __name__ == "__main__":
-    import sys
-    if len(sys.argv) != 3:
-        print("Usage: python process_all_pdfs.py <directory_path> <output_file_path>")
-    else:
-        directory_path = sys.argv[1]
-        output_file_path = sys.argv[2]
-        process_directory(directory_path, output_file_path)
+    parser = argparse.ArgumentParser(description="Count references under each bold heading for every PDF in a directory.")
+    parser.add_argument("directory_path", help="Directory containing PDF files")
+    parser.add_argument("output_file_path", help="Output CSV file")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes (1 = serial)")
+    parser.add_argument("--chunksize", type=int, default=4, help="PDFs handed to a worker process at a time")
+    parser.add_argument("--manifest", help="Run manifest path (default: <output_file_path>.manifest.jsonl)")
+    run_mode = parser.add_mutually_exclusive_group()
+    run_mode.add_argument("--resume", dest="mode", action="store_const", const="resume", help="Skip PDFs already finished and append to the output")
+    run_mode.add_argument("--incremental", dest="mode", action="store_const", const="incremental", help="Only process PDFs added or changed since the last run")
+    parser.add_argument("--segmenter", default="regex", choices=["regex", "layout"], help="Count references by separator regex, or segment them from the page layout")
+    add_backend_argument(parser)
+    add_cache_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    configure_from_args(args)
+    configure_cache_from_args(args)
+    process_directory(args.directory_path, args.output_file_path, args.workers, args.chunksize, args.backend,
+                      args.mode or "fresh", args.manifest, args.segmenter, args.profile)
@@ -0,0 +1,176 @@
+import sys
+from array import array
+from dataclasses import dataclass
+
+# Compact record types shared by the extractors and corpus-scale tools.
+#
+# Every field of a dict-based record costs a hash table slot and the record
+# its own dict, and strings like the review name or an author_year heading
+# are repeated thousands of times across a corpus. The types here are
+# slotted dataclasses, with no per-instance __dict__, and the strings that
+# repeat are interned so every record shares one copy.
+#
+# ReferenceBatch goes further for the millions of references a corpus run
+# holds (reference_dedupe, reference-parser's analysis): it stores them as
+# columns, with repeated strings replaced by 4-byte ids into a StringTable
+# and identifier lists as tuples, shared when empty. A Reference object is
+# only built when a row is read back.
+
+NO_IDENTIFIERS = ()
+
+def intern_string(value):
+    """Interned copy of a string, so equal strings share one object."""
+    return sys.intern(value) if value else ""
+
+def identifier_tuple(values):
+    # Most references carry no identifiers; they all share one empty tuple
+    return tuple(values) if values else NO_IDENTIFIERS
+
+@dataclass(slots=True)
+class Reference:
+    """
+    One reference under a study heading of a review.
+
+    heading is the study heading the reference sits under, and key the
+    reference's own author_year key; the two are the same for the v20
+    extractor, whose headings are author_year keys.
+    """
+
+    review: str
+    heading: str
+    key: str
+    text: str
+    dois: tuple = NO_IDENTIFIERS
+    pmids: tuple = NO_IDENTIFIERS
+
+    def __post_init__(self):
+        self.review = intern_string(self.review)
+        self.heading = intern_string(self.heading)
+        self.key = intern_string(self.key)
+        self.dois = identifier_tuple(self.dois)
+        self.pmids = identifier_tuple(self.pmids)
+
+@dataclass(slots=True)
+class StudyHeading:
+    """A bold study heading and the text of the references under it."""
+
+    heading: str
+    text: str
+
+    def __post_init__(self):
+        self.heading = intern_string(self.heading)
+
+@dataclass(slots=True)
+class PdfProfile:
+    """Triage result for one PDF (see pdfimage_analyzer); None marks a value that was not measured."""
+
+    file_name: str
+    pages: int = None
+    type: str = None
+    avg_text_per_page: float = None
+    images: int = None
+    searchable: str = None
+    size_kb: float = None
+    error: str = None
+    method: str = None
+
+    # Output column of each field, in RESULT_FIELDS order (unannotated, so not a field)
+    COLUMNS = {
+        'file_name': "File Name", 'pages': "Pages", 'type': "Type", 'avg_text_per_page': "Avg Text/Page",
+        'images': "Images", 'searchable': "Searchable", 'size_kb': "File Size (KB)", 'error': "Error",
+        'method': "Method",
+    }
+
+    def __post_init__(self):
+        # Only a handful of distinct values, repeated for every file
+        self.type = intern_string(self.type) or None
+        self.searchable = intern_string(self.searchable) or None
+        self.method = intern_string(self.method) or None
+
+    @classmethod
+    def from_dict(cls, row):
+        """Build a profile from a dict keyed by output column."""
+        return cls(**{name: row[column] for name, column in cls.COLUMNS.items() if column in row})
+
+    def as_dict(self):
+        """The profile keyed by output column; Method only when it was recorded."""
+        row = {column: getattr(self, name) for name, column in self.COLUMNS.items()}
+        if self.method is None:
+            del row["Method"]
+        return row
+
+class StringTable:
+    """Distinct strings, each stored once and addressed by a small integer id."""
+
+    __slots__ = ('strings', 'ids')
+
+    def __init__(self):
+        self.strings = []
+        self.ids = {}
+
+    def add(self, value):
+        """Return the id of a string, adding it if it is new."""
+        string_id = self.ids.get(value)
+        if string_id is None:
+            string_id = self.ids[value] = len(self.strings)
+            self.strings.append(value)
+        return string_id
+
+    def __getitem__(self, string_id):
+        return self.strings[string_id]
+
+    def __len__(self):
+        return len(self.strings)
+
+class ReferenceBatch:
+    """
+    Column store of references.
+
+    Reviews, and headings and keys, are held once each in a StringTable and
+    referenced from array('I') columns; reference texts are a list, and
+    identifiers tuples. Indexing or iterating returns Reference objects built
+    on the fly.
+    """
+
+    __slots__ = ('reviews', 'names', 'review_ids', 'heading_ids', 'key_ids', 'texts', 'dois', 'pmids')
+
+    def __init__(self):
+        self.reviews = StringTable()
+        self.names = StringTable()  # Headings and keys, which overlap
+        self.review_ids = array('I')
+        self.heading_ids = array('I')
+        self.key_ids = array('I')
+        self.texts = []
+        self.dois = []
+        self.pmids = []
+
+    def append(self, review, heading, key, text, dois=NO_IDENTIFIERS, pmids=NO_IDENTIFIERS):
+        self.review_ids.append(self.reviews.add(review))
+        self.heading_ids.append(self.names.add(heading))
+        self.key_ids.append(self.names.add(key))
+        self.texts.append(text)
+        self.dois.append(identifier_tuple(dois))
+        self.pmids.append(identifier_tuple(pmids))
+
+    def add(self, reference):
+        self.append(reference.review, reference.heading, reference.key, reference.text, reference.dois, reference.pmids)
+
+    def review(self, index):
+        return self.reviews[self.review_ids[index]]
+
+    def heading(self, index):
+        return self.names[self.heading_ids[index]]
+
+    def key(self, index):
+        return self.names[self.key_ids[index]]
+
+    def __len__(self):
+        return len(self.texts)
+
+    def __getitem__(self, index):
+        return Reference(self.review(index), self.heading(index), self.key(index), self.texts[index],
+                         self.dois[index], self.pmids[index])
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
@@ -1,28 +1,33 @@
-import PyPDF2
+import os
 import re
-from collections import defaultdict
 import argparse
 import logging
-from tqdm import tqdm
-import pandas as pd
-from fuzzywuzzy import fuzz
+from matchers import (WHITESPACE_RE, PERIOD_SPACING_RE, CAPS_HEADING_SPLIT_RE, AUTHOR_YEAR_SPLIT_RE,
+                      YEAR_RE, DOI_PRESENCE_RE, PMID_PRESENCE_RE)
+from extraction_cache import section_pages, add_cache_arguments, configure_cache_from_args
+from pdf_backends import add_backend_argument
+from output_sink import infer_format, open_sink
+from records import ReferenceBatch
 
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 
+REFERENCE_FIELDS = ['Heading', 'Reference Key', 'Reference']
+ANALYSIS_FIELDS = REFERENCE_FIELDS + ['Year', 'Has DOI', 'Has PMID', 'Length']
+
 def clean_text(text):
     """Clean and normalize text."""
-    text = re.sub(r'\s+', ' ', text)
-    text = re.sub(r'([a-z])\.([A-Z])', r'\1. \2', text)  # Fix spacing after periods
+    text = WHITESPACE_RE.sub(' ', text)
+    text = PERIOD_SPACING_RE.sub(r'\1. \2', text)  # Fix spacing after periods
     return text.strip()
 
-def extract_references(pdf_path, start_pattern, end_pattern):
-    """Extract references from PDF."""
+def extract_references(pdf_path, start_pattern, end_pattern, backend="pypdf2", data=None):
+    """Extract references from PDF (data: the file's bytes or map, see pdf_input)."""
     logging.info(f"Processing PDF: {pdf_path}")
     
     try:
-        with open(pdf_path, 'rb') as file:
-            reader = PyPDF2.PdfReader(file)
-            text = ' '.join(page.extract_text() for page in tqdm(reader.pages, desc="Extracting text"))
+        # Only the pages spanning the included-studies section are extracted,
+        # and a configured extraction cache is checked first
+        text = ' '.join(section_pages(pdf_path, backend, data))
     except Exception as e:
         logging.error(f"Error reading PDF: {e}")
         return None
@@ -56,12 +61,21 @@ def extract_references(pdf_path, start_pattern, end_pattern):
     logging.debug(f"First 500 characters of references text: {references_text[:500]}")
     return references_text
 
-def parse_references(references_text):
-    """Parse references into structured format."""
-    ref_dict = defaultdict(list)
+def parse_references(references_text, review=""):
+    """
+    Parse references into structured format.
+
+    Args:
+    references_text (str): Text of the references section
+    review (str): Name of the review the references come from
+
+    Returns:
+    ReferenceBatch: One reference per author_year key, under its caps heading
+    """
+    batch = ReferenceBatch()
     
     # Split by potential headings (all caps followed by year)
-    sections = re.split(r'\n([A-Z][A-Z\s]+(?:\d{4})?)\n', references_text)
+    sections = CAPS_HEADING_SPLIT_RE.split(references_text)
     
     if len(sections) < 2:
         logging.warning("No clear headings found. Treating entire text as one section.")
@@ -72,44 +86,168 @@ def parse_references(references_text):
         content = clean_text(sections[i+1] if i+1 < len(sections) else sections[i])
         
         # Parse individual references
-        individual_refs = re.split(r'([A-Z][a-z]+(?:\s[A-Z][a-z]+)?\s+(?:et\s+al\.?\s+)?(?:\d{4}[a-z]?))', content)
+        individual_refs = AUTHOR_YEAR_SPLIT_RE.split(content)
         for j in range(1, len(individual_refs), 2):
             ref_key = individual_refs[j].strip()
             ref_content = clean_text(individual_refs[j+1] if j+1 < len(individual_refs) else "")
             if ref_content:  # Only add if there's content
-                ref_dict[heading].append((ref_key, ref_content))
+                batch.append(review, heading, ref_key, ref_content)
     
-    return ref_dict
+    return batch
+
+def analyze_reference_frame(df):
+    """
+    Add per-reference analysis columns to a frame of parsed references.
+
+    Every column is computed with vectorized string operations over the
+    whole frame, so this scales to a corpus run of millions of references.
+
+    Args:
+    df (pd.DataFrame): Frame with the REFERENCE_FIELDS columns
+
+    Returns:
+    pd.DataFrame: The frame with Year (nullable), Has DOI, Has PMID and Length added
+    """
+    import pandas as pd  # Imported here so the script starts without it
+    df = df[REFERENCE_FIELDS].copy()
+    df['Heading'] = df['Heading'].astype('category')
+    references = df['Reference'].fillna('').astype(str)
+    df['Year'] = pd.to_numeric(df['Reference Key'].astype(str).str.extract(YEAR_RE, expand=False)).astype('Int16')
+    df['Has DOI'] = references.str.contains(DOI_PRESENCE_RE)
+    df['Has PMID'] = references.str.contains(PMID_PRESENCE_RE)
+    df['Length'] = references.str.len()
+    return df
+
+def analyze_references(batch):
+    """
+    Turn parse_references output into an analysis frame.
+
+    Args:
+    batch (ReferenceBatch): Parsed references
+
+    Returns:
+    pd.DataFrame: One row per reference, grouped by heading in order of first
+    appearance (see analyze_reference_frame)
+    """
+    import numpy as np
+    import pandas as pd
+
+    # Columns are taken straight from the batch: the id arrays index the
+    # batch's table of distinct (interned) heading and key strings
+    names = np.array(batch.names.strings, dtype=object)
+    heading_ids = np.frombuffer(batch.heading_ids, dtype=np.uint32)
+    # Keep each heading's references together, headings in the order they first appear
+    _, first_index, heading_rank = np.unique(heading_ids, return_index=True, return_inverse=True)
+    order = np.argsort(first_index[heading_rank], kind='stable')
+    df = pd.DataFrame({'Heading': names[heading_ids[order]],
+                       'Reference Key': names[np.frombuffer(batch.key_ids, dtype=np.uint32)[order]],
+                       'Reference': np.array(batch.texts, dtype=object)[order]},
+                      columns=REFERENCE_FIELDS)
+    return analyze_reference_frame(df)
 
-# ... [rest of the script remains the same] ...
+def summarize_references(df):
+    """
+    Summarize an analysis frame per heading.
 
-def main(pdf_path, output_file):
+    Args:
+    df (pd.DataFrame): Output of analyze_references
+
+    Returns:
+    pd.DataFrame: References, DOI/PMID counts and shares, year range and
+    chunk length statistics for each heading, in document order
+    """
+    summary = df.groupby('Heading', sort=False, observed=True).agg(**{
+        'References': ('Reference', 'size'),
+        'With DOI': ('Has DOI', 'sum'),
+        'With PMID': ('Has PMID', 'sum'),
+        'Earliest Year': ('Year', 'min'),
+        'Latest Year': ('Year', 'max'),
+        'Median Year': ('Year', 'median'),
+        'Mean Length': ('Length', 'mean'),
+        'Median Length': ('Length', 'median'),
+        'Max Length': ('Length', 'max'),
+    }).reset_index()
+    summary['DOI Share'] = (summary['With DOI'] / summary['References']).round(3)
+    summary['PMID Share'] = (summary['With PMID'] / summary['References']).round(3)
+    summary['Mean Length'] = summary['Mean Length'].round(1)
+    return summary
+
+def year_distribution(df):
+    """Number of references per publication year, oldest first."""
+    return df['Year'].value_counts().sort_index()
+
+def read_reference_frame(paths):
+    """Load earlier reference-parser outputs (.csv, .jsonl or .parquet) into one frame."""
+    import pandas as pd
+    readers = {
+        'csv': lambda path: pd.read_csv(path, usecols=REFERENCE_FIELDS, dtype=str, keep_default_na=False),
+        'jsonl': lambda path: pd.read_json(path, lines=True, dtype=False)[REFERENCE_FIELDS],
+        'parquet': lambda path: pd.read_parquet(path, columns=REFERENCE_FIELDS),
+    }
+    frames = [readers[infer_format(path)](path) for path in paths]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=REFERENCE_FIELDS)
+
+def default_summary_path(output_file):
+    root, extension = os.path.splitext(output_file)
+    return f"{root}_summary{extension}"
+
+def write_frame(df, output_file, fieldnames):
+    """Write the fieldnames columns of a frame through an output sink, in the format its extension names."""
+    # Missing values (NaN, pd.NA) become None, which every sink writes as empty
+    frame = df[fieldnames].astype(object)
+    frame = frame.where(frame.notna(), None)
+    with open_sink(output_file, fieldnames) as sink:
+        sink.write_many(frame.itertuples(index=False, name=None))
+    return sink.rows_written
+
+def save_analysis(df, output_file, summary_file=None):
+    """Write the per-reference analysis and the per-heading summary to separate outputs."""
+    summary_file = summary_file or default_summary_path(output_file)
+    rows = write_frame(df, output_file, ANALYSIS_FIELDS)
+    logging.info(f"{rows} references saved to {output_file}")
+
+    summary = summarize_references(df)
+    write_frame(summary, summary_file, list(summary.columns))
+    logging.info(f"Summary of {len(summary)} headings saved to {summary_file}")
+
+    distribution = year_distribution(df)
+    if not distribution.empty:
+        logging.info("References per year: " + ", ".join(f"{year}: {count}" for year, count in distribution.items()))
+
+def main(pdf_path, output_file, backend="pypdf2", summary_file=None):
     start_pattern = r"References to studies included in this review"
     end_pattern = r"References to studies excluded from this review"
     
-    references_text = extract_references(pdf_path, start_pattern, end_pattern)
+    references_text = extract_references(pdf_path, start_pattern, end_pattern, backend)
     if references_text is None:
         return
     
-    ref_dict = parse_references(references_text)
+    references = parse_references(references_text, os.path.splitext(os.path.basename(pdf_path))[0])
     
-    if not ref_dict:
+    if not len(references):
         logging.warning("No references parsed. Check the extracted text for manual processing.")
         with open("extracted_text.txt", "w", encoding="utf-8") as f:
             f.write(references_text)
         logging.info("Extracted text saved to 'extracted_text.txt' for manual inspection.")
         return
 
-    df = analyze_references(ref_dict)
-    
-    # Save to CSV
-    df.to_csv(output_file, index=False)
-    logging.info(f"References saved to {output_file}")
+    df = analyze_references(references)
+    save_analysis(df, output_file, summary_file)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Extract and analyze references from a PDF.")
-    parser.add_argument("pdf_path", help="Path to the PDF file")
-    parser.add_argument("--output", default="references.csv", help="Output CSV file name")
+    parser.add_argument("pdf_path", nargs="?", help="Path to the PDF file")
+    parser.add_argument("--output", default="references.csv", help="Output file (.csv, .jsonl or .parquet)")
+    parser.add_argument("--summary", help="Per-heading summary file (default: <output>_summary.<ext>)")
+    parser.add_argument("--from-references", nargs="+", metavar="FILE", help="Analyze earlier outputs of this script (e.g. a whole corpus run) instead of a PDF")
+    add_backend_argument(parser, default="pypdf2")
+    add_cache_arguments(parser)
     args = parser.parse_args()
 
-    main(args.pdf_path, args.output)
\ No newline at end of file
+    if args.from_references:
+        save_analysis(analyze_reference_frame(read_reference_frame(args.from_references)), args.output, args.summary)
+    elif args.pdf_path:
+        configure_cache_from_args(args)
+        main(args.pdf_path, args.output, args.backend, args.summary)
+    else:
+        parser.error("give a PDF path or --from-references")
\ No newline at end of file
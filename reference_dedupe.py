@@ -0,0 +1,343 @@
+import argparse
+import re
+import zlib
+import sys
+from array import array
+from collections import defaultdict
+from difflib import SequenceMatcher
+
+import numpy as np
+
+from output_sink import open_sink
+from records import NO_IDENTIFIERS, ReferenceBatch, StringTable, identifier_tuple
+from reference_rows import (DOI_COLUMN, KEY_COLUMNS, NON_WORD_RE, PMID_COLUMN, TEXT_COLUMNS, block_key, first_column,
+                            fold, iter_input_rows, normalize_doi, parse_identifiers, review_name)
+
+try:
+    from fuzzywuzzy import fuzz
+except ImportError:  # difflib gives the same 0-100 scale, only slower
+    fuzz = None
+
+# Cross-review deduplication of extracted references.
+#
+# Comparing every citation with every other one is quadratic, so records are
+# linked in stages that each stay close to linear:
+#
+#   1. Records sharing a normalised DOI or PMID, or identical normalised
+#      citation text, are joined outright.
+#   2. The remaining candidates come from blocks: records with the same
+#      surname + year key, and records whose MinHash signatures over word
+#      shingles of the citation agree on a whole LSH band.
+#   3. The fuzzy scorer only runs on pairs inside a block that are not already
+#      in the same cluster and whose signatures estimate enough overlap, since
+#      a surname + year block mostly holds different studies; pairs whose
+#      signatures nearly agree are joined without scoring. Oversized blocks
+#      fall back to a sorted neighbourhood window, so one very common key
+#      cannot blow up the run.
+#
+# Clusters are kept in a union-find, so each link is near constant time.
+# References are held column-wise (records.ReferenceBatch plus the matching
+# columns in ReferenceRecords), so a corpus of millions of citations does not
+# cost a dict and a set or two per reference.
+#
+# Usage: python reference_dedupe.py 10.1002_*_references.csv --output clusters.csv
+
+CLUSTER_FIELDS = ['cluster_id', 'cluster_size', 'linked_by', 'review', 'author_year', 'citation_chunk',
+                  'reference_doi', 'reference_pmid']
+
+IDENTIFIER_TAG_RE = re.compile(r'\[(?:DOI|PMID):[^\]]*\]|\{[^}]*\}')
+
+# Smallest prime above 2**32: shingle hashes are 32-bit, so (a * x + b) mod
+# this prime is a universal hash, and a, b < 2**32 keep a * x + b inside uint64
+MINHASH_PRIME = 4294967311
+
+class UnionFind:
+    """Disjoint sets over record indexes, with path halving and union by size."""
+
+    def __init__(self, size):
+        self.parent = list(range(size))
+        self.size = [1] * size
+
+    def find(self, item):
+        parent = self.parent
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    def union(self, a, b):
+        """Join the sets holding a and b; returns the new root, or None if they were already joined."""
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return None
+        if self.size[root_a] < self.size[root_b]:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.size[root_a] += self.size[root_b]
+        return root_a
+
+def normalize_citation(text):
+    """Lower-case, accent-free citation text with identifiers, tags and punctuation removed."""
+    return NON_WORD_RE.sub(' ', fold(IDENTIFIER_TAG_RE.sub(' ', text))).strip()
+
+class ReferenceRecords:
+    """
+    The references of a run and the normalised columns matching works on.
+
+    Args:
+    references (ReferenceBatch): Source rows: review, author_year (as heading
+        and key), citation text and identifiers
+    """
+
+    __slots__ = ('references', 'texts', 'block_keys', 'block_ids', 'dois', 'pmids')
+
+    def __init__(self, references=None):
+        self.references = references if references is not None else ReferenceBatch()
+        self.texts = []  # Normalised citations, interned: repeat citations share one string
+        self.block_keys = StringTable()
+        self.block_ids = array('i')  # -1 when the author_year has no surname + year key
+        self.dois = []
+        self.pmids = []
+
+    def append(self, review, author_year, citation, dois, pmids):
+        self.references.append(review, author_year, author_year, citation, dois, pmids)
+        self.texts.append(sys.intern(normalize_citation(citation)))
+        key = block_key(author_year)
+        self.block_ids.append(self.block_keys.add(key) if key else -1)
+        self.dois.append(identifier_tuple(sorted({normalize_doi(doi) for doi in dois})))
+        self.pmids.append(identifier_tuple(sorted({pmid.lstrip('0') for pmid in pmids})))
+
+    def block_key(self, index):
+        block_id = self.block_ids[index]
+        return self.block_keys[block_id] if block_id >= 0 else None
+
+    def __len__(self):
+        return len(self.texts)
+
+def load_records(paths):
+    """
+    Read reference rows from per-review output files.
+
+    Args:
+    paths (list): reference_extraction_v20 or reference-parser output files
+
+    Returns:
+    ReferenceRecords: The review name and source columns of every row, and the
+    normalised DOIs, PMIDs, block key and citation text used for matching
+    """
+    records = ReferenceRecords()
+    for path in paths:
+        review = review_name(path)
+        for row in iter_input_rows(path):
+            author_year = first_column(row, KEY_COLUMNS).strip()
+            citation = first_column(row, TEXT_COLUMNS)
+            records.append(review, author_year, citation, parse_identifiers(row.get(DOI_COLUMN)),
+                           parse_identifiers(row.get(PMID_COLUMN)))
+    return records
+
+def shingle_hashes(text, size=3):
+    """32-bit hashes of the word n-grams of a normalised citation."""
+    words = text.split()
+    if len(words) < size:
+        grams = [text] if text else []
+    else:
+        grams = [' '.join(words[i:i + size]) for i in range(len(words) - size + 1)]
+    return np.fromiter((zlib.crc32(gram.encode()) for gram in set(grams)), dtype=np.uint64)
+
+def minhash_signature(hashes, coefficients):
+    """MinHash signature of a set of shingle hashes under num_perm affine permutations."""
+    a, b = coefficients
+    # All permutations at once: (num_perm, shingles) matrix, minimum per row
+    return ((a[:, None] * hashes[None, :] + b[:, None]) % MINHASH_PRIME).min(axis=1)
+
+def minhash_coefficients(num_perm, seed=0):
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 1 << 32, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+    return a, b
+
+def build_blocks(records, num_perm=32, bands=8):
+    """
+    Group record indexes into candidate blocks.
+
+    Args:
+    records (ReferenceRecords): Records from load_records
+    num_perm (int): MinHash permutations per signature
+    bands (int): LSH bands; num_perm must divide evenly into them
+
+    Returns:
+    tuple: (blocks, signatures) where blocks are lists of record indexes with
+    at least two members, and signatures is a (records, num_perm) array with
+    all-zero rows for records without any citation text
+    """
+    if num_perm % bands:
+        raise ValueError("num_perm must be a multiple of bands")
+    rows_per_band = num_perm // bands
+    coefficients = minhash_coefficients(num_perm)
+    blocks = defaultdict(list)
+    signatures = np.zeros((len(records), num_perm), dtype=np.uint64)
+
+    for index, text in enumerate(records.texts):
+        block_id = records.block_ids[index]
+        if block_id >= 0:
+            blocks[('key', block_id)].append(index)
+        hashes = shingle_hashes(text)
+        if not len(hashes):
+            continue
+        signature = signatures[index] = minhash_signature(hashes, coefficients)
+        for band in range(bands):
+            band_values = signature[band * rows_per_band:(band + 1) * rows_per_band]
+            blocks[('lsh', band, band_values.tobytes())].append(index)
+
+    return [members for members in blocks.values() if len(members) > 1], signatures
+
+def candidate_pairs(block, records, max_block=200, window=20):
+    """Pairs to score inside one block; blocks over max_block only compare sorted neighbours."""
+    if len(block) <= max_block:
+        for i in range(len(block)):
+            for j in range(i + 1, len(block)):
+                yield block[i], block[j]
+    else:
+        ordered = sorted(block, key=lambda index: records.texts[index])
+        for i in range(len(ordered)):
+            for j in range(i + 1, min(i + 1 + window, len(ordered))):
+                yield ordered[i], ordered[j]
+
+def similarity(a, b):
+    """Fuzzy 0-100 similarity of two normalised citations."""
+    if fuzz is not None:
+        return fuzz.token_set_ratio(a, b)
+    return round(100 * SequenceMatcher(None, a, b, autojunk=False).ratio())
+
+def disjoint(a, b):
+    # Both non-empty and sharing no value; the tuples hold one or two values at most
+    return a and b and not any(value in b for value in a)
+
+def conflicting_identifiers(records, a, b):
+    # Two records carrying different DOIs (or PMIDs) are different studies, however similar the text
+    return disjoint(records.dois[a], records.dois[b]) or disjoint(records.pmids[a], records.pmids[b])
+
+def cluster_references(records, threshold=90, num_perm=32, bands=8, max_block=200, window=20, min_jaccard=0.3,
+                       accept_jaccard=0.8):
+    """
+    Cluster records that cite the same primary study.
+
+    Args:
+    records (ReferenceRecords): Records from load_records
+    threshold (int): Minimum fuzzy score (0-100) for a blocked pair to be joined
+    num_perm (int): MinHash permutations per signature
+    bands (int): LSH bands
+    max_block (int): Largest block compared pairwise
+    window (int): Sorted-neighbourhood window for larger blocks
+    min_jaccard (float): Minimum signature-estimated shingle overlap for a pair to be scored
+    accept_jaccard (float): Estimated overlap at which a pair is joined without scoring
+
+    Returns:
+    tuple: (UnionFind over the record indexes, dict of root -> set of link methods,
+    dict of statistics)
+    """
+    union_find = UnionFind(len(records))
+    methods = defaultdict(set)
+    stats = defaultdict(int)
+
+    def link(a, b, method):
+        root_a, root_b = union_find.find(a), union_find.find(b)
+        root = union_find.union(a, b)
+        if root is None:
+            return
+        merged = methods.pop(root_a, set()) | methods.pop(root_b, set())
+        merged.add(method)
+        methods[root] = merged
+        stats[f'{method} links'] += 1
+
+    # Stage 1: exact identifiers and exact text; most repeat citations of a
+    # study are identical once normalised, which keeps them out of the scorer
+    first_seen = {}
+    for index, text in enumerate(records.texts):
+        exact_text = (text,) if text else NO_IDENTIFIERS
+        for kind, values in (('doi', records.dois[index]), ('pmid', records.pmids[index]), ('exact', exact_text)):
+            for value in values:
+                other = first_seen.setdefault((kind, value), index)
+                if other != index and not (kind == 'exact' and conflicting_identifiers(records, other, index)):
+                    link(other, index, kind)
+
+    # Stages 2 and 3: blocked fuzzy matching
+    blocks, signatures = build_blocks(records, num_perm, bands)
+    stats['blocks'] = len(blocks)
+    scored = set()
+    for block in blocks:
+        for a, b in candidate_pairs(block, records, max_block, window):
+            pair = (a, b) if a < b else (b, a)
+            # The same pair turns up in several LSH bands; score it once
+            if pair in scored or union_find.find(a) == union_find.find(b):
+                continue
+            scored.add(pair)
+            if conflicting_identifiers(records, a, b):
+                continue
+            # The fraction of agreeing MinHash values estimates the shingle Jaccard
+            # similarity, and is far cheaper than the fuzzy scorer
+            agreement = np.count_nonzero(signatures[a] == signatures[b]) / num_perm
+            if agreement < min_jaccard:
+                continue
+            if agreement >= accept_jaccard:
+                link(a, b, 'minhash')
+                continue
+            stats['pairs scored'] += 1
+            if similarity(records.texts[a], records.texts[b]) >= threshold:
+                link(a, b, 'fuzzy')
+
+    return union_find, methods, dict(stats)
+
+def write_clusters(records, union_find, methods, output_file):
+    """Write every record with its cluster id, largest clusters first; returns the number of clusters."""
+    clusters = defaultdict(list)
+    for index in range(len(records)):
+        clusters[union_find.find(index)].append(index)
+    ordered = sorted(clusters.items(), key=lambda item: (-len(item[1]), item[1][0]))
+
+    with open_sink(output_file, CLUSTER_FIELDS) as sink:
+        for cluster_id, (root, members) in enumerate(ordered, start=1):
+            linked_by = ';'.join(sorted(methods.get(root, ())))
+            for index in members:
+                reference = records.references[index]
+                sink.write({
+                    'cluster_id': cluster_id,
+                    'cluster_size': len(members),
+                    'linked_by': linked_by,
+                    'review': reference.review,
+                    'author_year': reference.key,
+                    'citation_chunk': reference.text,
+                    'reference_doi': ';'.join(reference.dois),
+                    'reference_pmid': ';'.join(reference.pmids),
+                })
+    return len(ordered)
+
+def main():
+    parser = argparse.ArgumentParser(description="Cluster references that cite the same study across reviews.")
+    parser.add_argument("inputs", nargs="+", help="Per-review reference files (.csv, .jsonl or .parquet)")
+    parser.add_argument("--output", default="reference_clusters.csv", help="Output file (.csv, .jsonl or .parquet)")
+    parser.add_argument("--threshold", type=int, default=90, help="Minimum fuzzy score (0-100) to join two references")
+    parser.add_argument("--num-perm", type=int, default=32, help="MinHash permutations per citation")
+    parser.add_argument("--bands", type=int, default=8, help="LSH bands (must divide --num-perm)")
+    parser.add_argument("--max-block", type=int, default=200, help="Largest block compared pairwise")
+    parser.add_argument("--window", type=int, default=20, help="Sorted-neighbourhood window for larger blocks")
+    parser.add_argument("--min-jaccard", type=float, default=0.3, help="Estimated shingle overlap below which a pair is not scored")
+    parser.add_argument("--accept-jaccard", type=float, default=0.8, help="Estimated shingle overlap at which a pair is joined unscored")
+    args = parser.parse_args()
+
+    records = load_records(args.inputs)
+    union_find, methods, stats = cluster_references(records, args.threshold, args.num_perm, args.bands,
+                                                    args.max_block, args.window, args.min_jaccard,
+                                                    args.accept_jaccard)
+    cluster_count = write_clusters(records, union_find, methods, args.output)
+
+    print(f"{len(records)} references from {len(args.inputs)} files -> {cluster_count} clusters")
+    for name, value in sorted(stats.items()):
+        print(f"  {name}: {value}")
+    if fuzz is None:
+        print("  (fuzzywuzzy not installed; scored with difflib)")
+    print(f"Clusters saved to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
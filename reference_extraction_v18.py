@@ -1,6 +1,6 @@
 import fitz  # PyMuPDF
 import csv
-import re
+from matchers import V18_HEADING_RE, DOI_RE, COCHRANE_DOI_PATH_RE
 
 print("*DEBUG PRINTING BEGINS*")
 
@@ -21,7 +21,7 @@ def extract_bold_sections_and_text(pdf_path):
     # Undesired pattern:
     #   3-character string + 8-digit number (e.g., NCT01234567) 
     #   because these headings refer to clinical trials, which do not have a DOI or PMID. 
-    pattern = re.compile(r'\b[A-Za-z]+ \d{4}[a-z]?\b(?: \([A-Z\s]+\))?')
+    pattern = V18_HEADING_RE
     
     for page_num in range(len(doc)):
         page = doc.load_page(page_num)
@@ -73,7 +73,7 @@ def save_to_csv(bold_subsections, output_csv):
         writer.writeheader()
         for subsection, text in bold_subsections:
             print(f"Writing to CSV: {subsection}, {text[:30]}...")  # Debug print
-            doi_matches = re.findall(r'\[DOI:(.*?)\]', text)
+            doi_matches = DOI_RE.findall(text)
             writer.writerow({'author_year': subsection, 'citation_chunk': text, 'reference_doi': doi_matches})
    
     # Count the number of rows in the output CSV (excluding the header)
@@ -90,7 +90,7 @@ def save_to_csv(bold_subsections, output_csv):
 pdf_path = r"cochrane_files\10.1002_14651858.CD001506.pub5.pdf"
 
 # Extract the Cochrane DOI from pdf_path using regex
-cochrane_doi = re.search(r'cochrane_files\\(.+?)\.pdf', pdf_path).group(1)
+cochrane_doi = COCHRANE_DOI_PATH_RE.search(pdf_path).group(1)
 
 output_csv = f"{cochrane_doi}_references.csv"
 
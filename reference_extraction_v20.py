@@ -1,15 +1,15 @@
-import fitz  # PyMuPDF
-import csv
-import re
+import argparse
+import logging
+import os
+from output_sink import open_sink
+from matchers import V20_HEADING_RE, COCHRANE_DOI_PATH_RE, scan_identifiers
+from layout_segmenter import is_references_heading, iter_span_records
+from instrumentation import add_profile_arguments, configure_from_args, document, drain, enabled, stage, write_report
+from records import StudyHeading
 
-print("*DEBUG PRINTING BEGINS*")
-
-def extract_bold_sections_and_text(pdf_path):
-    doc = fitz.open(pdf_path)
-    bold_subsections = []
+def iter_bold_sections(pdf_path):
     current_subsection = None
-    current_text = ""
-    stop_extraction = False
+    current_spans = []  # Span texts of the current subsection, joined once when it closes
     section_counter = 0  # Counter for tracking "References to" section occurrences
 
     # Regular expression to match the desired bold author_year heading patterns
@@ -23,80 +23,91 @@ def extract_bold_sections_and_text(pdf_path):
     # Undesired pattern:
     #   3-character string + 8-digit number (e.g., NCT01234567) 
     #   because these headings refer to clinical trials, which do not have a DOI or PMID. 
-    pattern = re.compile(r'\b[A-Za-z-]+(?: [A-Za-z-]+)* \d{4}[a-z]?\b(?: \([A-Z\s]+\))?')
+    pattern = V20_HEADING_RE
     
-    for page_num in range(len(doc)):
-        page = doc.load_page(page_num)
-        blocks = page.get_text("dict")["blocks"]
-
-        for block in blocks:
-            for line in block.get("lines", []):
-                if stop_extraction:
-                    break  # Stop extraction if the condition is met
-                    
-                for span in line.get("spans", []):
-                    text = span["text"].strip()
-                    
-                    
-                    # Count occurrences of "References to"
-                    if "References to" in text and 'bold' in span["font"].lower():
-                        section_counter += 1
-                        print(f"\nEncountered section: {text}, \'References to\' Count: {section_counter}\n")  # Debug print
-                        if section_counter == 2:
-                            stop_extraction = True
-                            break
-                    
-                    # Check if the text is bold by analyzing font properties
-                    if 'bold' in span["font"].lower() and pattern.match(text) and section_counter < 2:
-                        print(f"Found bold subsection: {text}")  # Debug print
-                        # If there's an ongoing subsection, store it
-                        if current_subsection and current_text.strip():
-                            print(f"Appending subsection: {current_subsection}")  # Debug print
-                            bold_subsections.append((current_subsection, current_text.strip()))
-                        # Start a new subsection
-                        current_subsection = text
-                        current_text = ""
-                    elif current_subsection and section_counter < 2:
-                        # Append the text to the current subsection
-                        current_text += span["text"] + " "
+    # Spans arrive in page, block, line order, loaded lazily page by page
+    for record in iter_span_records(pdf_path):
+        span_text, font = record[3], record[4]
+        text = span_text.strip()
+        
+        
+        # Count occurrences of "References to"
+        if is_references_heading(text, font):
+            section_counter += 1
+            logging.debug("Encountered section: %s, 'References to' Count: %d", text, section_counter)
+            if section_counter == 2:
+                # The second heading ends the section: close the last
+                # subsection and stop without loading any more pages
+                current_text = " ".join(current_spans).strip()
+                if current_subsection and current_text:
+                    logging.debug("Appending last subsection: %s", current_subsection)
+                    yield StudyHeading(current_subsection, current_text)
+                return
+        
+        # Check if the text is bold by analyzing font properties
+        if 'bold' in font.lower() and pattern.match(text):
+            logging.debug("Found bold subsection: %s", text)
+            # If there's an ongoing subsection, yield it
+            current_text = " ".join(current_spans).strip()
+            if current_subsection and current_text:
+                logging.debug("Appending subsection: %s", current_subsection)
+                yield StudyHeading(current_subsection, current_text)
+            # Start a new subsection
+            current_subsection = text
+            current_spans = []
+        elif current_subsection:
+            # Append the text to the current subsection
+            current_spans.append(span_text)
 
-    # Add the last subsection and text if applicable
-    if current_subsection and current_text.strip():
-        print(f"Appending last subsection: {current_subsection}")  # Debug print
-        bold_subsections.append((current_subsection, current_text.strip()))
+    # Yield the last subsection and text if applicable
+    current_text = " ".join(current_spans).strip()
+    if current_subsection and current_text:
+        logging.debug("Appending last subsection: %s", current_subsection)
+        yield StudyHeading(current_subsection, current_text)
 
-    return bold_subsections
+def extract_bold_sections_and_text(pdf_path):
+    return list(iter_bold_sections(pdf_path))
 
-def save_to_csv(bold_subsections, output_csv):
-    with open(output_csv, 'w', newline='', encoding='utf-8') as csvfile:
-        fieldnames = ['author_year', 'citation_chunk', 'reference_doi', 'reference_pmid']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        
-        writer.writeheader()
-        for subsection, text in bold_subsections:
-            print(f"Writing to CSV: {subsection}, {text[:30]}...")  # Debug print
-            doi_matches = re.findall(r'\[DOI:(.*?)\]', text)
-            pmid_matches = re.findall(r'\[PMID:(.*?)\]', text)
-            writer.writerow({'author_year': subsection, 'citation_chunk': text, 'reference_doi': doi_matches, 'reference_pmid': pmid_matches})
+def save_to_csv(bold_subsections, output_csv, cochrane_doi=None):
+    # The sink picks CSV, JSON Lines or Parquet from the file extension and
+    # counts rows as they are written, so the output is never re-read
+    fieldnames = ['author_year', 'citation_chunk', 'reference_doi', 'reference_pmid']
+    with open_sink(output_csv, fieldnames) as sink:
+        for study in bold_subsections:
+            logging.debug("Writing to CSV: %s, %.30s...", study.heading, study.text)
+            # DOIs and PMIDs come out of a single pass over the chunk
+            with stage("identifiers"):
+                doi_matches, pmid_matches = scan_identifiers(study.text)
+            sink.write({'author_year': study.heading, 'citation_chunk': study.text, 'reference_doi': doi_matches, 'reference_pmid': pmid_matches})
   
-    # Count the number of rows in the output CSV (excluding the header)
-    with open(output_csv, 'r', encoding='utf-8') as csvfile:
-        num_of_references = sum(1 for row in csvfile) - 1
+    num_of_references = sink.rows_written
     
-    print("\n*DEBUG PRINTING ENDS*\n")
-    print("*REFERENCE INFORMATION*\n")
-    print(f"References saved to {output_csv}")
-    print(f"There are {num_of_references} references in {cochrane_doi}.\n")
+    logging.info("References saved to %s", output_csv)
+    logging.info("There are %d references in %s.", num_of_references, cochrane_doi)
+
+if __name__ == "__main__":
+    # Replace the filepath below with the filepath to the Cochrane file of interest
+    # Repeat for each Cochrane file of interest
+    pdf_path = r"cochrane_files\10.1002_14651858.CD001211.pub4.pdf"
 
-# Replace the filepath below with the filepath to the Cochrane file of interest
-# Repeat for each Cochrane file of interest
-pdf_path = r"cochrane_files\10.1002_14651858.CD001211.pub4.pdf"
+    parser = argparse.ArgumentParser(description="Extract the references under each bold study heading of a Cochrane PDF.")
+    parser.add_argument("pdf_path", nargs="?", default=pdf_path, help="Path to the Cochrane PDF")
+    parser.add_argument("--output", help="Output file (default: <cochrane doi>_references.csv)")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
 
+    # Per-span debug output only appears with --log-level DEBUG
+    configure_from_args(args)
 
-# Extract the Cochrane DOI from pdf_path using regex
-cochrane_doi = re.search(r'cochrane_files\\(.+?)\.pdf', pdf_path).group(1)
+    # Extract the Cochrane DOI from pdf_path using regex, falling back to the file name
+    match = COCHRANE_DOI_PATH_RE.search(args.pdf_path)
+    cochrane_doi = match.group(1) if match else os.path.splitext(os.path.basename(args.pdf_path))[0]
 
-output_csv = f"{cochrane_doi}_references.csv"
+    output_csv = args.output or f"{cochrane_doi}_references.csv"
 
-bold_subsections = extract_bold_sections_and_text(pdf_path)
-save_to_csv(bold_subsections, output_csv)
\ No newline at end of file
+    # Stream records into the CSV as each heading closes
+    with document(args.pdf_path):
+        bold_subsections = iter_bold_sections(args.pdf_path)
+        save_to_csv(bold_subsections, output_csv, cochrane_doi)
+    if enabled():
+        write_report(args.profile, drain())
\ No newline at end of file
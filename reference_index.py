@@ -0,0 +1,316 @@
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+import time
+
+from reference_rows import (DOI_COLUMN, KEY_COLUMNS, PMID_COLUMN, TEXT_COLUMNS, block_key, first_column,
+                            iter_input_rows, normalize_doi, parse_identifiers, review_name)
+
+# Corpus-wide reference index in SQLite.
+#
+# The per-review reference files (reference_extraction_v20 or
+# reference-parser output, in any sink format) are loaded into one database:
+#
+#   reviews     one row per loaded file, with its size and mtime, so an
+#               unchanged file is skipped when the index is rebuilt
+#   refs        author_year, its surname + year key and the citation text
+#   ref_dois    normalised DOIs, many per reference
+#   ref_pmids   PMIDs without leading zeros, many per reference
+#   refs_fts    FTS5 index over author_year and citation text, stored
+#               against refs (external content) rather than as a copy
+#
+# DOI, PMID and author key lookups go through B-tree indexes and full-text
+# queries through FTS5, so each answer comes back in milliseconds however many
+# reviews are indexed. Every file is loaded in one transaction with
+# executemany, and on a new database the secondary indexes are built once
+# after the bulk load rather than updated row by row.
+#
+# Usage:
+#   python reference_index.py build references.db *_references.csv
+#   python reference_index.py query references.db --author "Aduloju 2016"
+#   python reference_index.py query references.db --doi 10.1000/xyz --format json
+#   python reference_index.py query references.db --text "randomised AND aspirin"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reviews (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    source TEXT NOT NULL,
+    size INTEGER,
+    mtime REAL,
+    refs INTEGER
+);
+CREATE TABLE IF NOT EXISTS refs (
+    id INTEGER PRIMARY KEY,
+    review_id INTEGER NOT NULL REFERENCES reviews(id),
+    author_year TEXT NOT NULL,
+    author_key TEXT,
+    citation TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ref_dois (ref_id INTEGER NOT NULL, doi TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS ref_pmids (ref_id INTEGER NOT NULL, pmid TEXT NOT NULL);
+CREATE VIRTUAL TABLE IF NOT EXISTS refs_fts USING fts5(
+    author_year, citation, content='refs', content_rowid='id'
+);
+"""
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS refs_review ON refs(review_id);
+CREATE INDEX IF NOT EXISTS refs_author_key ON refs(author_key);
+CREATE INDEX IF NOT EXISTS refs_author_year ON refs(author_year COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS ref_dois_doi ON ref_dois(doi);
+CREATE INDEX IF NOT EXISTS ref_dois_ref ON ref_dois(ref_id);
+CREATE INDEX IF NOT EXISTS ref_pmids_pmid ON ref_pmids(pmid);
+CREATE INDEX IF NOT EXISTS ref_pmids_ref ON ref_pmids(ref_id);
+"""
+
+RESULT_FIELDS = ['review', 'author_year', 'citation_chunk', 'reference_doi', 'reference_pmid']
+
+def connect(db_path):
+    connection = sqlite3.connect(db_path)
+    # WAL lets queries run while a build is loading; NORMAL sync is safe under WAL
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.execute("PRAGMA temp_store=MEMORY")
+    return connection
+
+def remove_review(connection, review_id):
+    # External-content FTS rows are removed by replaying the indexed values
+    connection.execute("INSERT INTO refs_fts(refs_fts, rowid, author_year, citation) "
+                       "SELECT 'delete', id, author_year, citation FROM refs WHERE review_id = ?", (review_id,))
+    for table in ("ref_dois", "ref_pmids"):
+        connection.execute(f"DELETE FROM {table} WHERE ref_id IN (SELECT id FROM refs WHERE review_id = ?)", (review_id,))
+    connection.execute("DELETE FROM refs WHERE review_id = ?", (review_id,))
+    connection.execute("DELETE FROM reviews WHERE id = ?", (review_id,))
+
+def load_file(connection, path, force=False):
+    """
+    Load one reference file, replacing any earlier load of the same review.
+
+    Args:
+    connection (sqlite3.Connection): Index database
+    path (str): reference_extraction_v20 or reference-parser output file
+    force (bool): Reload even if the file is unchanged since it was indexed
+
+    Returns:
+    int or None: References loaded, or None if the file was skipped as unchanged
+    """
+    review = review_name(path)
+    stat = os.stat(path)
+    existing = connection.execute("SELECT id, size, mtime FROM reviews WHERE name = ?", (review,)).fetchone()
+    if existing is not None and not force and existing[1:] == (stat.st_size, stat.st_mtime):
+        return None
+
+    # One transaction per file: a failed load leaves the previous version in place
+    with connection:
+        if existing is not None:
+            remove_review(connection, existing[0])
+        review_id = connection.execute("INSERT INTO reviews (name, source, size, mtime) VALUES (?, ?, ?, ?)",
+                                     (review, os.path.abspath(path), stat.st_size, stat.st_mtime)).lastrowid
+        # Ids are assigned here so the identifier rows can be batched alongside
+        next_id = connection.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM refs").fetchone()[0]
+        refs, dois, pmids = [], [], []
+        for row in iter_input_rows(path):
+            author_year = first_column(row, KEY_COLUMNS).strip()
+            citation = first_column(row, TEXT_COLUMNS)
+            ref_id = next_id + len(refs)
+            refs.append((ref_id, review_id, author_year, block_key(author_year), citation))
+            dois.extend((ref_id, doi) for doi in {normalize_doi(doi) for doi in parse_identifiers(row.get(DOI_COLUMN))})
+            pmids.extend((ref_id, pmid) for pmid in {pmid.lstrip('0') for pmid in parse_identifiers(row.get(PMID_COLUMN))})
+
+        connection.executemany("INSERT INTO refs (id, review_id, author_year, author_key, citation) VALUES (?, ?, ?, ?, ?)", refs)
+        connection.executemany("INSERT INTO ref_dois (ref_id, doi) VALUES (?, ?)", dois)
+        connection.executemany("INSERT INTO ref_pmids (ref_id, pmid) VALUES (?, ?)", pmids)
+        connection.executemany("INSERT INTO refs_fts (rowid, author_year, citation) VALUES (?, ?, ?)",
+                             ((ref[0], ref[2], ref[4]) for ref in refs))
+        connection.execute("UPDATE reviews SET refs = ? WHERE id = ?", (len(refs), review_id))
+    return len(refs)
+
+def build_index(db_path, paths, force=False):
+    """
+    Load reference files into the index, creating it if needed.
+
+    Args:
+    db_path (str): SQLite database file
+    paths (list): Per-review reference files (.csv, .jsonl or .parquet)
+    force (bool): Reload files that are unchanged since they were indexed
+
+    Returns:
+    tuple: (files loaded, files skipped, references loaded)
+    """
+    connection = connect(db_path)
+    try:
+        connection.executescript(SCHEMA)
+        has_indexes = connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'refs_author_key'").fetchone()
+        loaded = skipped = total = 0
+        for path in paths:
+            count = load_file(connection, path, force)
+            if count is None:
+                skipped += 1
+                continue
+            loaded += 1
+            total += count
+            print(f"Indexed {count} references from {os.path.basename(path)}")
+        # On a new index the B-trees are built once over the loaded rows; an
+        # existing index kept them up to date during the inserts
+        connection.executescript(INDEXES)
+        if loaded and not has_indexes:
+            connection.execute("ANALYZE")
+        # Merge the FTS segments written file by file
+        connection.execute("INSERT INTO refs_fts(refs_fts) VALUES ('optimize')")
+        connection.commit()
+    finally:
+        connection.close()
+    return loaded, skipped, total
+
+def fts_phrase(text):
+    # Quote free text as one FTS5 phrase so punctuation is not read as query syntax
+    return '"' + text.replace('"', '""') + '"'
+
+def filter_conditions(author=None, doi=None, pmid=None, text=None, review=None):
+    # WHERE clauses over refs r joined to reviews v, and their parameters
+    conditions, params = [], []
+    if author:
+        key = block_key(author)
+        if key:
+            conditions.append("r.author_key = ?")
+            params.append(key)
+        else:
+            conditions.append("r.author_year = ? COLLATE NOCASE")
+            params.append(author.strip())
+    if doi:
+        conditions.append("r.id IN (SELECT ref_id FROM ref_dois WHERE doi = ?)")
+        params.append(normalize_doi(doi))
+    if pmid:
+        conditions.append("r.id IN (SELECT ref_id FROM ref_pmids WHERE pmid = ?)")
+        params.append(pmid.strip().lstrip('0'))
+    if text:
+        conditions.append("r.id IN (SELECT rowid FROM refs_fts WHERE refs_fts MATCH ?)")
+        params.append(text)
+    if review:
+        conditions.append("v.name = ?")
+        params.append(review)
+    if not conditions:
+        raise ValueError("give at least one of author, doi, pmid, text or review")
+    return ' AND '.join(conditions), params
+
+def run_query(db_path, sql, params):
+    # Read-only, so a query never blocks or alters a build in progress
+    connection = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        return connection.execute(sql, params).fetchall()
+    finally:
+        connection.close()
+
+def query_index(db_path, author=None, doi=None, pmid=None, text=None, review=None, limit=100):
+    """
+    Look references up in the index.
+
+    Args:
+    db_path (str): SQLite database file
+    author (str): author_year such as "Aduloju 2016"; matches any suffix
+        letter ("Aduloju 2016a") and accents or case in the surname
+    doi (str): DOI, in any of the forms normalize_doi accepts
+    pmid (str): PubMed id
+    text (str): FTS5 query over author_year and citation text (e.g.
+        'aspirin AND "pre-eclampsia"')
+    review (str): Restrict to one review
+    limit (int): Maximum number of references returned
+
+    Returns:
+    list: Dicts with RESULT_FIELDS keys, identifiers as lists
+    """
+    where, params = filter_conditions(author, doi, pmid, text, review)
+    rows = run_query(db_path, f"""
+        SELECT v.name, r.author_year, r.citation,
+               (SELECT json_group_array(doi) FROM ref_dois WHERE ref_id = r.id),
+               (SELECT json_group_array(pmid) FROM ref_pmids WHERE ref_id = r.id)
+        FROM refs r JOIN reviews v ON v.id = r.review_id
+        WHERE {where}
+        ORDER BY v.name, r.id
+        LIMIT ?""", params + [limit])
+    # Identifier lists come back as JSON arrays: DOIs may themselves contain ';'
+    return [dict(zip(RESULT_FIELDS, (name, author_year, citation, json.loads(dois), json.loads(pmids))))
+            for name, author_year, citation, dois, pmids in rows]
+
+def query_reviews(db_path, author=None, doi=None, pmid=None, text=None):
+    """Names of the reviews with at least one matching reference, with the match counts (see query_index)."""
+    where, params = filter_conditions(author, doi, pmid, text)
+    return run_query(db_path, f"""
+        SELECT v.name, COUNT(*) FROM refs r JOIN reviews v ON v.id = r.review_id
+        WHERE {where}
+        GROUP BY v.name ORDER BY v.name""", params)
+
+def print_results(results, output_format):
+    if output_format == "json":
+        for result in results:
+            print(json.dumps(result, ensure_ascii=False))
+    elif output_format == "csv":
+        writer = csv.writer(sys.stdout)
+        writer.writerow(RESULT_FIELDS)
+        for result in results:
+            # Lists as v20 writes them (parse_identifiers reads them back); DOIs may contain ';'
+            writer.writerow(result.values())
+    else:
+        for result in results:
+            identifiers = ' '.join([f"doi:{doi}" for doi in result['reference_doi']] +
+                                 [f"pmid:{pmid}" for pmid in result['reference_pmid']])
+            print(f"{result['review']}  {result['author_year']}  {identifiers}")
+            print(f"    {result['citation_chunk'][:160]}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and query a SQLite index of extracted references.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Load per-review reference files into the index")
+    build.add_argument("db_path", help="SQLite database file")
+    build.add_argument("inputs", nargs="+", help="Per-review reference files (.csv, .jsonl or .parquet)")
+    build.add_argument("--force", action="store_true", help="Reload files that have not changed since they were indexed")
+
+    query = subparsers.add_parser("query", help="Look references up by author_year, DOI, PMID or full text")
+    query.add_argument("db_path", help="SQLite database file")
+    query.add_argument("--author", help='author_year, e.g. "Aduloju 2016" (also matches 2016a, 2016b, ...)')
+    query.add_argument("--doi", help="DOI")
+    query.add_argument("--pmid", help="PubMed id")
+    query.add_argument("--text", help="FTS5 full-text query over author_year and citation")
+    query.add_argument("--phrase", help="Free text searched as one exact phrase")
+    query.add_argument("--review", help="Only references from this review")
+    query.add_argument("--limit", type=int, default=100, help="Maximum number of references (default: 100)")
+    query.add_argument("--format", default="text", choices=["text", "csv", "json"], help="Output format")
+    query.add_argument("--reviews", action="store_true", help="List the matching reviews and their match counts instead of the references")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start = time.perf_counter()
+        loaded, skipped, total = build_index(args.db_path, args.inputs, args.force)
+        print(f"{total} references from {loaded} files indexed in {time.perf_counter() - start:.1f}s "
+              f"({skipped} unchanged files skipped). Index saved to {args.db_path}")
+        return 0
+
+    if not os.path.exists(args.db_path):
+        parser.error(f"no index at {args.db_path}; run build first")
+    text = args.text or (fts_phrase(args.phrase) if args.phrase else None)
+    start = time.perf_counter()
+    try:
+        if args.reviews:
+            results = query_reviews(args.db_path, args.author, args.doi, args.pmid, text)
+        else:
+            results = query_index(args.db_path, args.author, args.doi, args.pmid, text, args.review, args.limit)
+    except (ValueError, sqlite3.OperationalError) as e:
+        parser.error(str(e))
+    elapsed = (time.perf_counter() - start) * 1000
+
+    if args.reviews:
+        for name, count in results:
+            print(f"{name}\t{count}")
+    else:
+        print_results(results, args.format)
+    # Timing goes to stderr so it never mixes with CSV or JSON output
+    print(f"{len(results)} {'reviews' if args.reviews else 'references'} in {elapsed:.1f} ms", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
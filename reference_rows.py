@@ -0,0 +1,81 @@
+import ast
+import csv
+import json
+import os
+import re
+import unicodedata
+
+from output_sink import infer_format
+
+# Reading extracted reference files, and the keys the corpus tools match them
+# on. Kept apart from reference_dedupe so lookups (reference_index query,
+# enrich_identifiers) do not pay for numpy and fuzzywuzzy at import.
+
+# Input columns: reference_extraction_v20 output, or reference-parser output
+KEY_COLUMNS = ('author_year', 'Reference Key')
+TEXT_COLUMNS = ('citation_chunk', 'Reference')
+DOI_COLUMN = 'reference_doi'
+PMID_COLUMN = 'reference_pmid'
+
+NON_WORD_RE = re.compile(r'[^a-z0-9]+')
+YEAR_RE = re.compile(r'\b(\d{4})[a-z]?\b')
+DOI_PREFIX_RE = re.compile(r'^(?:https?://(?:dx\.)?doi\.org/|doi:\s*)', re.I)
+
+def parse_identifiers(value):
+    # v20 writes the identifier lists as Python list literals in CSV, and as
+    # real lists in JSON Lines and Parquet
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.strip()
+        if not value or value == '[]':
+            return []
+        if value.startswith('['):
+            try:
+                value = ast.literal_eval(value)
+            except (ValueError, SyntaxError):
+                value = [value.strip('[]')]
+        else:
+            value = [value]
+    return [str(item).strip() for item in value if str(item).strip()]
+
+def normalize_doi(doi):
+    return DOI_PREFIX_RE.sub('', doi.strip()).lower()
+
+def fold(text):
+    # Strip accents so "Müller" and "Muller" share a key
+    return unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii').lower()
+
+def block_key(author_year):
+    """Surname + year key for an author_year heading ("van der Waals 2000a" -> "vanderwaals|2000")."""
+    match = YEAR_RE.search(author_year)
+    if not match:
+        return None
+    surname = NON_WORD_RE.sub('', fold(author_year[:match.start()]))
+    return f"{surname}|{match.group(1)}" if surname else None
+
+def review_name(path):
+    name = os.path.splitext(os.path.basename(path))[0]
+    return name[:-len('_references')] if name.endswith('_references') else name
+
+def first_column(row, names):
+    for name in names:
+        if name in row:
+            return row[name] or ""
+    return ""
+
+def iter_input_rows(path):
+    """Yield rows as dicts from a CSV, JSON Lines or Parquet reference file."""
+    file_format = infer_format(path)
+    if file_format == "csv":
+        with open(path, newline='', encoding='utf-8') as f:
+            yield from csv.DictReader(f)
+    elif file_format == "jsonl":
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches():
+            yield from batch.to_pylist()
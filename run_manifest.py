@@ -0,0 +1,121 @@
+import csv
+import json
+import os
+
+from extraction_cache import file_digest
+
+# Run manifest for corpus runs.
+#
+# One JSON line is appended per PDF as soon as it finishes, and flushed to
+# disk straight away, so a crashed run can be picked up where it stopped:
+#
+#   {"path": ..., "size": ..., "mtime": ..., "sha256": ..., "status": "done", "rows": 12}
+#
+# Later lines win over earlier ones for the same path, so the manifest can be
+# appended to across runs without being rewritten.
+
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+def default_manifest_path(output_file):
+    return f"{output_file}.manifest.jsonl"
+
+def fingerprint(pdf_path):
+    """Return (size, mtime, sha256) for a PDF."""
+    stat = os.stat(pdf_path)
+    return stat.st_size, stat.st_mtime, file_digest(pdf_path)
+
+def load_manifest(manifest_path):
+    """Return the latest manifest record for each path, or {} if there is no manifest."""
+    records = {}
+    if not os.path.exists(manifest_path):
+        return records
+    with open(manifest_path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by a crash; the file it describes is simply redone
+                continue
+            records[record["path"]] = record
+    return records
+
+def is_unchanged(record, pdf_path):
+    # Size and mtime settle most files without reading them; the hash only
+    # decides when the file was touched but may not have changed
+    stat = os.stat(pdf_path)
+    if stat.st_size != record.get("size"):
+        return False
+    if stat.st_mtime == record.get("mtime"):
+        return True
+    return file_digest(pdf_path) == record.get("sha256")
+
+def select_pending(pdf_paths, manifest, incremental=False):
+    """
+    Pick the PDFs a resumed run still has to process.
+
+    Args:
+    pdf_paths (list): PDFs found in the corpus directory
+    manifest (dict): Records from load_manifest
+    incremental (bool): Also reprocess finished files that changed since they were recorded
+
+    Returns:
+    list: Paths that are new, unfinished, failed or (incremental only) changed
+    """
+    pending = []
+    for pdf_path in pdf_paths:
+        record = manifest.get(pdf_path)
+        if record is None or record.get("status") != STATUS_DONE:
+            pending.append(pdf_path)
+        elif incremental and not is_unchanged(record, pdf_path):
+            pending.append(pdf_path)
+    return pending
+
+def drop_output_rows(output_file, file_names, file_name_column='File Name'):
+    """Rewrite a CSV output without the rows belonging to the given file names."""
+    if not file_names or not os.path.exists(output_file):
+        return
+    file_names = set(file_names)
+    tmp_path = f"{output_file}.tmp"
+    with open(output_file, newline='') as src, open(tmp_path, 'w', newline='') as dst:
+        reader = csv.reader(src)
+        writer = csv.writer(dst)
+        header = next(reader, None)
+        if header is not None:
+            writer.writerow(header)
+            column = header.index(file_name_column)
+            writer.writerows(row for row in reader if row[column] not in file_names)
+    os.replace(tmp_path, output_file)
+
+class ManifestWriter:
+    """
+    Appends one record per finished PDF and flushes it to disk immediately.
+
+    Args:
+    manifest_path (str): Path of the JSON Lines manifest
+    truncate (bool): Start a new manifest instead of appending to an existing one
+    """
+
+    def __init__(self, manifest_path, truncate=False):
+        self.file = open(manifest_path, 'w' if truncate else 'a', encoding='utf-8')
+
+    def record(self, pdf_path, file_fingerprint, status, rows=0, error=None):
+        size, mtime, sha256 = file_fingerprint if file_fingerprint else (None, None, None)
+        entry = {"path": pdf_path, "size": size, "mtime": mtime, "sha256": sha256, "status": status, "rows": rows}
+        if error is not None:
+            entry["error"] = error
+        self.file.write(json.dumps(entry) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,87 @@
+# Only the "References to studies included in this review" section matters to
+# the extractors, and in a long review it sits on a handful of pages near the
+# end. This module finds the first and last page of that section so callers
+# can extract text from those pages only instead of the whole document.
+#
+# Documents come in as pdf_backends objects, which supply the page-level
+# probe (contains), the outline (toc) and the page text.
+
+from instrumentation import stage
+
+START_PHRASE = "References to studies included in this review"
+END_PHRASE = "References to studies excluded from this review"
+
+def toc_hint(toc):
+    """
+    Pick a starting page from a PDF outline.
+
+    Args:
+    toc (list): (level, title, page_index) entries, page_index 0-based
+
+    Returns:
+    int or None: page index of the first outline entry mentioning references
+    """
+    for level, title, page_index in toc:
+        if page_index is not None and page_index >= 0 and 'references' in title.lower():
+            return page_index
+    return None
+
+def locate_section_pages(page_count, contains, toc=(), start_phrase=START_PHRASE, end_phrase=END_PHRASE):
+    """
+    Find the pages spanning the included-studies references section.
+
+    Args:
+    page_count (int): Number of pages in the document
+    contains (callable): contains(page_index, phrase) -> bool, the page-level probe
+    toc (list): Optional (level, title, page_index) outline entries used to skip ahead
+    start_phrase (str): Heading that opens the section
+    end_phrase (str): Heading that closes the section
+
+    Returns:
+    tuple or None: (first_page, last_page), 0-based and inclusive, or None if
+    the start heading was not found on any page
+    """
+    first_page = None
+
+    # Jump straight to the references chapter when the outline has one,
+    # otherwise (or if the outline was wrong) probe from the first page
+    hint = toc_hint(toc)
+    search_starts = [hint, 0] if hint is not None and hint < page_count else [0]
+    for search_start in search_starts:
+        for page_index in range(search_start, page_count):
+            if contains(page_index, start_phrase):
+                first_page = page_index
+                break
+        if first_page is not None:
+            break
+
+    if first_page is None:
+        return None
+
+    # The section ends on the page carrying the excluded-studies heading;
+    # without one, keep everything to the end as the whole-text search did
+    last_page = page_count - 1
+    for page_index in range(first_page, page_count):
+        if contains(page_index, end_phrase):
+            last_page = page_index
+            break
+
+    return first_page, last_page
+
+def page_range(bounds, page_count):
+    # Fall back to the whole document when the section could not be located,
+    # which matches the old behaviour of searching the full text
+    if bounds is None:
+        return range(page_count)
+    return range(bounds[0], bounds[1] + 1)
+
+def locate_backend_section(backend):
+    """Locate the section in a document opened with pdf_backends.open_backend."""
+    return locate_section_pages(backend.page_count, backend.contains, backend.toc())
+
+def section_pages(backend):
+    """Return the page texts of the included-studies section of an open document."""
+    with stage("locate"):
+        bounds = locate_backend_section(backend)
+    with stage("extract"):
+        return [backend.page_text(page_index) for page_index in page_range(bounds, backend.page_count)]
@@ -0,0 +1,388 @@
+import argparse
+import csv
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from collections import Counter, defaultdict
+
+from pdf_processing import HEADER, extract_reference_rows
+from extraction_cache import add_cache_arguments, configure_cache, configure_cache_from_args, get_cache
+from pdf_backends import add_backend_argument
+from run_manifest import STATUS_DONE, STATUS_FAILED, fingerprint
+from output_sink import open_sink
+
+# Sharded process_all_pdfs runs over a shared filesystem.
+#
+# Any number of workers, on one host or many, point at the same PDF directory
+# and run directory and take PDFs from a work queue kept as plain files, with
+# no broker or database server:
+#
+#   claims/<pdf>.claim   created with O_CREAT|O_EXCL, so exactly one worker
+#                        gets each PDF; its mtime is the worker's heartbeat
+#   done/<pdf>.json      written once the rows are in the worker's part file
+#   parts/<worker>.csv   each worker's own rows, never written by another; a
+#                        worker id carries a random part, so a restarted
+#                        worker that gets a dead one's PID starts a new file
+#
+# A claim whose heartbeat is older than --stale-after belongs to a worker that
+# died; the next worker to see it moves it aside with an atomic rename and
+# claims the PDF afresh. A worker that was only slow may still finish the
+# same PDF, so merge keeps the rows of the worker named in the done file and
+# drops every other copy, along with any row torn by a worker dying mid-write.
+#
+# Usage:
+#   python shard_run.py work <pdf_dir> <run_dir> [--workers 4]   (on each host)
+#   python shard_run.py status <pdf_dir> <run_dir>
+#   python shard_run.py merge <run_dir> <output.csv>
+
+CLAIMS_DIR = "claims"
+DONE_DIR = "done"
+PARTS_DIR = "parts"
+DEFAULT_STALE_AFTER = 600
+
+def run_paths(run_dir):
+    return tuple(os.path.join(run_dir, name) for name in (CLAIMS_DIR, DONE_DIR, PARTS_DIR))
+
+def worker_name():
+    # Unique across hosts sharing the run directory, and readable in status
+    # output; PIDs repeat across restarts (routinely in containers), the
+    # random part does not
+    return f"{socket.gethostname()}-{os.getpid()}-{os.urandom(4).hex()}"
+
+def claim_path(claims_dir, file_name):
+    return os.path.join(claims_dir, f"{file_name}.claim")
+
+def done_path(done_dir, file_name):
+    return os.path.join(done_dir, f"{file_name}.json")
+
+def is_stale(path, stale_after):
+    try:
+        return time.time() - os.stat(path).st_mtime > stale_after
+    except FileNotFoundError:
+        return False
+
+def create_claim(path, worker):
+    # O_EXCL makes creation atomic: only one worker can create the claim
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump({"worker": worker, "claimed": time.time()}, f)
+    return True
+
+def reclaim_stale(path, worker, stale_after):
+    """
+    Take over a claim whose heartbeat has stopped.
+
+    The claim is renamed to a name unique to this worker, which only one
+    worker can do; if the file turns out to be a fresh claim another worker
+    made in the meantime, it is linked back in place.
+
+    Returns:
+    bool: True if the stale claim was removed and the PDF can be claimed again
+    """
+    if not is_stale(path, stale_after):
+        return False
+    tombstone = f"{path}.stale-{worker}"
+    try:
+        os.rename(path, tombstone)
+    except FileNotFoundError:
+        return False
+    try:
+        if not is_stale(tombstone, stale_after):
+            try:
+                os.link(tombstone, path)
+            except FileExistsError:
+                pass
+            return False
+        with open(tombstone, encoding='utf-8') as f:
+            logging.warning("Reclaiming %s from %s", os.path.basename(path), f.read())
+        return True
+    finally:
+        os.remove(tombstone)
+
+def claim(claims_dir, done_dir, file_name, worker, stale_after):
+    """Claim one PDF for this worker; False if it is finished or held by a live worker."""
+    if os.path.exists(done_path(done_dir, file_name)):
+        return False
+    path = claim_path(claims_dir, file_name)
+    if create_claim(path, worker):
+        # The PDF may have finished between the done check and the claim
+        if os.path.exists(done_path(done_dir, file_name)):
+            os.remove(path)
+            return False
+        return True
+    return reclaim_stale(path, worker, stale_after) and create_claim(path, worker)
+
+def claim_owner(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f).get("worker")
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def release_claim(path, worker):
+    """
+    Remove this worker's claim once its PDF is done.
+
+    A worker that was slow rather than dead may find its claim taken over;
+    the claim is then another worker's, and is left in place. As in
+    reclaim_stale, the claim is first renamed to a name unique to this
+    worker, so it cannot be swapped between the check and the removal.
+
+    Returns:
+    bool: True if the claim was this worker's and has been removed
+    """
+    tombstone = f"{path}.release-{worker}"
+    try:
+        os.rename(path, tombstone)
+    except FileNotFoundError:
+        return False
+    try:
+        if claim_owner(tombstone) == worker:
+            return True
+        logging.warning("Claim on %s was taken over by %s; leaving it in place",
+                        os.path.basename(path), claim_owner(tombstone))
+        try:
+            os.link(tombstone, path)
+        except FileExistsError:
+            pass
+        return False
+    finally:
+        os.remove(tombstone)
+
+def write_done(done_dir, file_name, record):
+    # Written under a temporary name and renamed, so a reader never sees half a record
+    path = done_path(done_dir, file_name)
+    tmp_path = f"{path}.{record['worker']}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(record, f)
+    os.replace(tmp_path, path)
+
+class Heartbeat:
+    """Refreshes the mtime of the worker's current claim from a background thread."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.path = None
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            path = self.path
+            if path is not None:
+                try:
+                    os.utime(path)
+                except FileNotFoundError:
+                    pass
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stopped.set()
+        self.thread.join()
+
+def list_pdfs(directory_path):
+    return sorted(filename for filename in os.listdir(directory_path) if filename.endswith('.pdf'))
+
+def run_worker(directory_path, run_dir, backend="pymupdf", segmenter="regex", stale_after=DEFAULT_STALE_AFTER):
+    """
+    Claim and process PDFs until none are left unclaimed.
+
+    Args:
+    directory_path (str): Directory containing PDF files
+    run_dir (str): Shared run directory holding the queue and the part files
+    backend (str): PDF library to extract text with (see pdf_backends)
+    segmenter (str): "regex" or "layout" (see process_all_pdfs)
+    stale_after (float): Seconds without a heartbeat after which a claim is taken over
+
+    Returns:
+    tuple: (files processed, files failed)
+    """
+    claims_dir, done_dir, parts_dir = run_paths(run_dir)
+    worker = worker_name()
+    processed = failed = 0
+    part_file = os.path.join(parts_dir, f"{worker}.csv")
+
+    with open(part_file, 'x', newline='') as csvfile, Heartbeat(stale_after / 4) as heartbeat:
+        writer = csv.writer(csvfile)
+        writer.writerow(HEADER)
+
+        for filename in list_pdfs(directory_path):
+            if not claim(claims_dir, done_dir, filename, worker, stale_after):
+                continue
+            heartbeat.path = claim_path(claims_dir, filename)
+            file_path = os.path.abspath(os.path.join(directory_path, filename))
+            record = {"worker": worker, "path": file_path}
+            try:
+                record["size"], record["mtime"], record["sha256"] = fingerprint(file_path)
+                rows = extract_reference_rows(file_path, backend, segmenter)
+            except Exception as e:
+                failed += 1
+                record.update(status=STATUS_FAILED, rows=0, error=f"{type(e).__name__}: {e}")
+                logging.warning("Failed to process %s: %s", filename, record["error"])
+            else:
+                # Rows reach the part file before the done record names this worker
+                writer.writerows(rows)
+                csvfile.flush()
+                os.fsync(csvfile.fileno())
+                record.update(status=STATUS_DONE, rows=len(rows))
+                logging.info("Finished processing %s (%s).", filename, worker)
+            write_done(done_dir, filename, record)
+            heartbeat.path = None
+            release_claim(claim_path(claims_dir, filename), worker)
+            processed += 1
+
+    logging.info("Worker %s processed %d files (%d failed).", worker, processed, failed)
+    return processed, failed
+
+def init_worker(cache_args):
+    configure_cache(*cache_args)
+
+def work(directory_path, run_dir, workers=1, backend="pymupdf", segmenter="regex", stale_after=DEFAULT_STALE_AFTER):
+    """Run queue workers on this host: one in-process, or `workers` worker processes."""
+    for path in run_paths(run_dir):
+        os.makedirs(path, exist_ok=True)
+    if workers <= 1:
+        return [run_worker(directory_path, run_dir, backend, segmenter, stale_after)]
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    # Workers use the same extraction cache as the parent
+    cache = get_cache()
+    cache_args = (cache.cache_dir, cache.max_bytes) if cache is not None else (None,)
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(cache_args,)) as executor:
+        futures = [executor.submit(run_worker, directory_path, run_dir, backend, segmenter, stale_after)
+                   for _ in range(workers)]
+        return [future.result() for future in futures]
+
+def load_done(done_dir):
+    # Done record of every finished PDF, keyed by file name
+    records = {}
+    for name in os.listdir(done_dir):
+        if name.endswith('.json'):
+            with open(os.path.join(done_dir, name), encoding='utf-8') as f:
+                records[name[:-len('.json')]] = json.load(f)
+    return records
+
+def queue_status(directory_path, run_dir, stale_after=DEFAULT_STALE_AFTER):
+    """
+    Count the PDFs of a sharded run by state.
+
+    Returns:
+    Counter: done, failed, claimed (live workers), stale (dead workers) and pending
+    """
+    claims_dir, done_dir, _ = run_paths(run_dir)
+    done = load_done(done_dir) if os.path.isdir(done_dir) else {}
+    counts = Counter()
+    for filename in list_pdfs(directory_path):
+        if filename in done:
+            counts[done[filename]["status"]] += 1
+        elif os.path.exists(claim_path(claims_dir, filename)):
+            counts["stale" if is_stale(claim_path(claims_dir, filename), stale_after) else "claimed"] += 1
+        else:
+            counts["pending"] += 1
+    return counts
+
+def merge(run_dir, output_file):
+    """
+    Combine the workers' part files into one output, one copy of each PDF's rows.
+
+    A PDF's rows are taken from the part file of the worker its done record
+    names; copies left by a worker whose claim was taken over, and rows of
+    PDFs that never got a done record, are dropped, as are malformed rows
+    (such as a last line cut short when a worker died).
+
+    Args:
+    run_dir (str): Run directory of the sharded run
+    output_file (str): Output file (.csv, .jsonl or .parquet)
+
+    Returns:
+    tuple: (files merged, files failed)
+    """
+    claims_dir, done_dir, parts_dir = run_paths(run_dir)
+    done = load_done(done_dir)
+    rows_by_file = defaultdict(list)
+    dropped = malformed = 0
+    for part in sorted(os.listdir(parts_dir)):
+        if not part.endswith('.csv'):
+            continue
+        worker = part[:-len('.csv')]
+        with open(os.path.join(parts_dir, part), newline='') as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            for row in reader:
+                if len(row) != len(HEADER) or not row[2].isdigit():
+                    malformed += 1
+                    continue
+                record = done.get(row[0])
+                if record is not None and record["worker"] == worker and record["status"] == STATUS_DONE:
+                    rows_by_file[row[0]].append((row[0], row[1], int(row[2])))
+                else:
+                    dropped += 1
+
+    failed = sorted(name for name, record in done.items() if record["status"] != STATUS_DONE)
+    with open_sink(output_file, HEADER) as sink:
+        for filename in sorted(rows_by_file):
+            rows = rows_by_file[filename]
+            if len(rows) != done[filename]["rows"]:
+                logging.warning("%s: %d rows in the part file, %d recorded", filename, len(rows), done[filename]["rows"])
+            sink.write_many(rows)
+
+    open_claims = sum(name.endswith('.claim') for name in os.listdir(claims_dir)) if os.path.isdir(claims_dir) else 0
+    if open_claims:
+        logging.warning("%d PDFs are still claimed; the merged output is missing them.", open_claims)
+    if malformed:
+        logging.warning("%d malformed rows in the part files were skipped.", malformed)
+    logging.info("Merged %d files (%d duplicate or unfinished rows dropped, %d files failed) into %s.",
+                 len(rows_by_file), dropped, len(failed), output_file)
+    for filename in failed:
+        logging.warning("Failed: %s: %s", filename, done[filename].get("error"))
+    return len(rows_by_file), len(failed)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run process_all_pdfs across many workers or hosts through a shared work queue.")
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"], help="Set the logging level")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    work_parser = subparsers.add_parser("work", help="Claim and process PDFs until the queue is empty")
+    work_parser.add_argument("directory_path", help="Directory containing PDF files")
+    work_parser.add_argument("run_dir", help="Run directory on the shared filesystem")
+    work_parser.add_argument("--workers", type=int, default=1, help="Worker processes on this host")
+    work_parser.add_argument("--stale-after", type=float, default=DEFAULT_STALE_AFTER, help="Seconds without a heartbeat before a claim is taken over")
+    work_parser.add_argument("--segmenter", default="regex", choices=["regex", "layout"], help="Count references by separator regex, or segment them from the page layout")
+    add_backend_argument(work_parser)
+    add_cache_arguments(work_parser)
+
+    status_parser = subparsers.add_parser("status", help="Count PDFs by queue state")
+    status_parser.add_argument("directory_path", help="Directory containing PDF files")
+    status_parser.add_argument("run_dir", help="Run directory on the shared filesystem")
+    status_parser.add_argument("--stale-after", type=float, default=DEFAULT_STALE_AFTER, help="Seconds without a heartbeat before a claim counts as stale")
+
+    merge_parser = subparsers.add_parser("merge", help="Combine the part files into one output")
+    merge_parser.add_argument("run_dir", help="Run directory on the shared filesystem")
+    merge_parser.add_argument("output_file_path", help="Output file (.csv, .jsonl or .parquet)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.command == "work":
+        configure_cache_from_args(args)
+        results = work(args.directory_path, args.run_dir, args.workers, args.backend, args.segmenter, args.stale_after)
+        return 1 if any(failed for _, failed in results) else 0
+    if args.command == "status":
+        counts = queue_status(args.directory_path, args.run_dir, args.stale_after)
+        for state in ("done", "failed", "claimed", "stale", "pending"):
+            print(f"{state:<8} {counts[state]}")
+        return 0
+    _, failed = merge(args.run_dir, args.output_file_path)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,94 @@
+import re
+
+# Cheap structural PDF classification for pdfimage_analyzer.
+#
+# Instead of decoding text, this estimates how much text a page carries from
+# its content stream: the string operands of text-showing operators inside
+# BT ... ET blocks are measured in bytes, and halved for pages whose fonts
+# are two-byte (Type0/CID) fonts. Images are counted from the /Image XObjects
+# in the page resources without decoding them. Estimates well clear of the
+# Text-based/Image-based thresholds are trusted; anything near a threshold is
+# reported as ambiguous so the caller can fall back to full text extraction.
+#
+# Text, fonts and images inside Form XObjects (reused page furniture, or a
+# whole page wrapped in a form by some producers) live in the form's own
+# content stream and resources, which are not followed; a file with forms on
+# an inspected page is reported as ambiguous too.
+
+TEXT_OBJECT_RE = re.compile(rb'(?<![A-Za-z])BT(?![A-Za-z])(.*?)(?<![A-Za-z])ET(?![A-Za-z])', re.S)
+# Literal strings (with escapes) and hex strings, the operands of Tj, TJ, ' and "
+STRING_OPERAND_RE = re.compile(rb'\((?:\\.|[^\\)])*\)|<[0-9A-Fa-f\s]*>')
+WHITESPACE_BYTES_RE = re.compile(rb'\s+')
+
+# How far past the thresholds an estimate must land to be trusted
+TEXT_MARGIN = 2.0
+IMAGE_MARGIN = 0.5
+
+def estimate_text_chars(content, two_byte_fonts=False):
+    """
+    Estimate the number of characters a content stream shows.
+
+    Args:
+    content (bytes): Decompressed page content stream
+    two_byte_fonts (bool): The page uses Type0 fonts, which take two bytes per glyph
+
+    Returns:
+    int: Estimated character count
+    """
+    total = 0
+    for text_object in TEXT_OBJECT_RE.finditer(content):
+        for operand in STRING_OPERAND_RE.finditer(text_object.group(1)):
+            token = operand.group()
+            if token[:1] == b'(':
+                # Escapes such as \( or \n stand for one character
+                total += len(token) - 2 - token.count(b'\\')
+            else:
+                total += len(WHITESPACE_BYTES_RE.sub(b'', token[1:-1])) // 2
+    return total // 2 if two_byte_fonts else total
+
+def classify_structural(document, max_pages=5):
+    """
+    Classify a PDF from its content streams and resources alone.
+
+    Args:
+    document (PdfBackend): Document opened with pdf_backends.open_backend
+    max_pages (int): Maximum number of pages to inspect
+
+    Returns:
+    dict or None: Pages, Type, Avg Text/Page, Images and Searchable in the same
+    form as analyze_pdf, or None when the estimate is too close to a threshold
+    or a page draws Form XObjects
+    """
+    num_pages = document.page_count
+    total_text = 0
+    total_images = 0
+    has_text_content = False
+
+    for page_num in range(min(num_pages, max_pages)):
+        if document.page_form_count(page_num):
+            return None
+        fonts = document.page_font_types(page_num)
+        if fonts:
+            chars = estimate_text_chars(document.page_content_stream(page_num), "Type0" in fonts)
+            total_text += chars
+            if chars > 10:
+                has_text_content = True
+        total_images += document.page_image_count(page_num)
+
+    text_to_page_ratio = total_text / num_pages
+
+    # Same thresholds as the full analysis, with a margin either side
+    if has_text_content and text_to_page_ratio > 100 * TEXT_MARGIN:
+        pdf_type = "Text-based"
+    elif total_images > 0 and text_to_page_ratio < 50 * IMAGE_MARGIN and not has_text_content:
+        pdf_type = "Image-based"
+    else:
+        return None
+
+    return {
+        "Pages": num_pages,
+        "Type": pdf_type,
+        "Avg Text/Page": round(text_to_page_ratio, 2),
+        "Images": total_images,
+        "Searchable": "Yes" if has_text_content else "No",
+    }
@@ -0,0 +1,43 @@
+import glob
+import os
+import unittest
+
+import matchers
+
+# scan_chunk against the separate scans it stands in for, on the bench
+# fixtures' included-studies text.
+#
+# Usage: python -m unittest test_matchers
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_fixtures")
+
+def separate_scans(text):
+    identifiers = matchers.IDENTIFIER_RE.findall(text)
+    return ([value for kind, value in identifiers if kind == 'DOI'],
+            [value for kind, value in identifiers if kind == 'PMID'],
+            matchers.AUTHOR_YEAR_SPLIT_RE.findall(text),
+            len(matchers.BLOCK_RE.findall(text)))
+
+class ScanChunkTest(unittest.TestCase):
+    def test_fixtures_agree_with_separate_scans(self):
+        paths = sorted(glob.glob(os.path.join(FIXTURES_DIR, "*.txt")))
+        self.assertTrue(paths)
+        for path in paths:
+            with open(path, encoding='utf-8') as f:
+                text = f.read()
+            with self.subTest(fixture=os.path.basename(path)):
+                self.assertEqual(tuple(matchers.scan_chunk(text)), separate_scans(text))
+
+    def test_year_after_author_counts_as_separator(self):
+        # The year of a mid-line key is a digit-run separator for BLOCK_RE
+        text = "Tan X, de Souza 2011 trial. El-Sayed 2007 [PMID: 12345]"
+        self.assertEqual(tuple(matchers.scan_chunk(text)), separate_scans(text))
+        self.assertEqual(matchers.scan_chunk(text).block_separators, 2)
+
+    def test_multi_word_phrase_at_line_start_is_not_a_separator(self):
+        # BLOCK_RE's line-start case takes one capitalised word and a year
+        text = "Journal of\nPerinatal Medicine 2006;34:1-5.\nTen Hof 1999 \nSmith 2000a"
+        self.assertEqual(tuple(matchers.scan_chunk(text)), separate_scans(text))
+
+if __name__ == "__main__":
+    unittest.main()
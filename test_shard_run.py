@@ -0,0 +1,100 @@
+import csv
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import shard_run
+
+# Regression tests for the claim handover between a slow worker and the
+# worker that reclaimed its stale claim, and for merging what they leave.
+#
+# Usage: python -m unittest test_shard_run
+
+class ReclaimRaceTest(unittest.TestCase):
+    def setUp(self):
+        self.run_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.run_dir)
+        self.claims_dir, self.done_dir, _ = shard_run.run_paths(self.run_dir)
+        os.makedirs(self.claims_dir)
+        os.makedirs(self.done_dir)
+        self.path = shard_run.claim_path(self.claims_dir, "review.pdf")
+
+    def make_stale(self):
+        old = time.time() - 3600
+        os.utime(self.path, (old, old))
+
+    def test_slow_worker_leaves_reclaimed_claim(self):
+        self.assertTrue(shard_run.claim(self.claims_dir, self.done_dir, "review.pdf", "host-a", 60))
+        self.make_stale()
+        self.assertTrue(shard_run.claim(self.claims_dir, self.done_dir, "review.pdf", "host-b", 60))
+
+        # A finishes late: B's claim must survive
+        self.assertFalse(shard_run.release_claim(self.path, "host-a"))
+        with open(self.path, encoding='utf-8') as f:
+            self.assertEqual(json.load(f)["worker"], "host-b")
+
+        self.assertTrue(shard_run.release_claim(self.path, "host-b"))
+        self.assertFalse(os.path.exists(self.path))
+        self.assertEqual(os.listdir(self.claims_dir), [])
+
+    def test_release_of_missing_claim_is_tolerated(self):
+        self.assertFalse(shard_run.release_claim(self.path, "host-a"))
+
+    def test_live_claim_is_not_reclaimed(self):
+        self.assertTrue(shard_run.claim(self.claims_dir, self.done_dir, "review.pdf", "host-a", 60))
+        self.assertFalse(shard_run.claim(self.claims_dir, self.done_dir, "review.pdf", "host-b", 60))
+        self.assertEqual(shard_run.claim_owner(self.path), "host-a")
+
+class MergeTest(unittest.TestCase):
+    def setUp(self):
+        self.run_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.run_dir)
+        self.claims_dir, self.done_dir, self.parts_dir = shard_run.run_paths(self.run_dir)
+        for path in shard_run.run_paths(self.run_dir):
+            os.makedirs(path)
+        self.output = os.path.join(self.run_dir, "merged.csv")
+
+    def write_part(self, worker, rows, tail=""):
+        with open(os.path.join(self.parts_dir, f"{worker}.csv"), 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(shard_run.HEADER)
+            writer.writerows(rows)
+            f.write(tail)
+
+    def write_done(self, file_name, worker, rows):
+        shard_run.write_done(self.done_dir, file_name, {"worker": worker, "path": file_name, "status": shard_run.STATUS_DONE,
+                                                        "rows": rows})
+
+    def merged_rows(self):
+        with open(self.output, newline='') as f:
+            return list(csv.reader(f))[1:]
+
+    def test_rows_of_reclaimed_worker_are_dropped(self):
+        # host-a's claim went stale and host-b redid a.pdf; only B's rows count
+        self.write_part("host-a", [("a.pdf", "Smith 2000", 2), ("a.pdf", "Jones 2001", 1)])
+        self.write_part("host-b", [("a.pdf", "Smith 2000", 3), ("b.pdf", "Lee 2002", 1)])
+        self.write_done("a.pdf", "host-b", 1)
+        self.write_done("b.pdf", "host-b", 1)
+
+        self.assertEqual(shard_run.merge(self.run_dir, self.output), (2, 0))
+        self.assertEqual(self.merged_rows(), [["a.pdf", "Smith 2000", "3"], ["b.pdf", "Lee 2002", "1"]])
+
+    def test_torn_last_line_is_skipped(self):
+        # A worker killed mid-write leaves half a row behind
+        self.write_part("host-a", [("a.pdf", "Smith 2000", 2)], tail="a.pdf,Smi")
+        self.write_part("host-b", [("b.pdf", "Lee 2002", 1)], tail="b.pdf,Lee 2003,")
+        self.write_done("a.pdf", "host-a", 1)
+        self.write_done("b.pdf", "host-b", 1)
+
+        self.assertEqual(shard_run.merge(self.run_dir, self.output), (2, 0))
+        self.assertEqual(self.merged_rows(), [["a.pdf", "Smith 2000", "2"], ["b.pdf", "Lee 2002", "1"]])
+
+    def test_worker_names_differ_within_one_process(self):
+        # A restarted worker reusing a PID must not reopen the dead one's part file
+        self.assertNotEqual(shard_run.worker_name(), shard_run.worker_name())
+
+if __name__ == "__main__":
+    unittest.main()
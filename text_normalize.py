@@ -0,0 +1,114 @@
+import re
+from array import array
+from bisect import bisect_right
+
+# Whitespace-insensitive search over extracted PDF text.
+#
+# pdfminer output often breaks or drops the spaces inside headings
+# ("Referencesto studies includedinthis review"), so the section boundaries
+# are found on a copy with every whitespace character removed. Instead of
+# splitting the references out of that squashed copy, which loses the word
+# boundaries the split patterns rely on, NormalizedText keeps the start of
+# every run of non-whitespace characters in both texts, one pair per run.
+# Positions found on the squashed text map back to the original by bisecting
+# the runs, and the pattern then runs over that span of the original text
+# through pos/endpos, without slicing it out.
+
+NON_WHITESPACE_RE = re.compile(r'\S+')
+WHITESPACE_RE = re.compile(r'\s+')
+
+class NormalizedText:
+    """
+    A text and its whitespace-free form, with a map between their offsets.
+
+    Args:
+    text (str): Original text
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.normalized = WHITESPACE_RE.sub('', text)
+        # 4 bytes per offset; only texts past 4 GiB need the 8-byte type
+        typecode = 'I' if len(text) < 2 ** 32 else 'Q'
+        # Start of each run in the squashed and the original text; the
+        # squashed starts end with its length, so run i is
+        # normalized[run_starts[i]:run_starts[i + 1]]
+        self.run_starts = array(typecode)
+        self.original_starts = array(typecode)
+        length = 0
+        for match in NON_WHITESPACE_RE.finditer(text):
+            self.run_starts.append(length)
+            self.original_starts.append(match.start())
+            length += match.end() - match.start()
+        self.run_starts.append(length)
+
+    def find(self, term, start=0):
+        """
+        Find a term regardless of the whitespace inside it.
+
+        Args:
+        term (str): Term to find; its whitespace is ignored too
+        start (int): Original offset to search from
+
+        Returns:
+        tuple or None: (start, end) original offsets of the match, with end just
+        past its last character, or None if the term does not occur
+        """
+        term = "".join(NON_WHITESPACE_RE.findall(term))
+        if not term:
+            return None
+        index = self.normalized.find(term, self.normalized_index(start))
+        if index == -1:
+            return None
+        return self.original_offset(index), self.original_offset(index + len(term) - 1) + 1
+
+    def original_offset(self, index):
+        """Original offset of the squashed character at an index."""
+        run = bisect_right(self.run_starts, index) - 1
+        return self.original_starts[run] + index - self.run_starts[run]
+
+    def normalized_index(self, offset):
+        """Index of the first squashed character at or after an original offset."""
+        # The last run starting at or before offset, if offset falls inside it
+        run = bisect_right(self.original_starts, offset) - 1
+        if run >= 0:
+            index = self.run_starts[run] + offset - self.original_starts[run]
+            if index < self.run_starts[run + 1]:
+                return index
+        # Otherwise offset is in whitespace, or before the first run: the next run starts it
+        return self.run_starts[run + 1]
+
+    def between(self, start_term, end_term):
+        """
+        Original (start, end) offsets of the text between two terms, or None if either is missing.
+
+        The end term is searched for after the start term.
+        """
+        start = self.find(start_term)
+        if start is None:
+            return None
+        end = self.find(end_term, start[1])
+        if end is None:
+            return None
+        return start[1], end[0]
+
+def split_span(pattern, text, start, end):
+    """
+    Split text[start:end] on a compiled pattern without copying the span first.
+
+    Args:
+    pattern (re.Pattern): Separator pattern
+    text (str): Full text
+    start (int): Span start offset
+    end (int): Span end offset
+
+    Returns:
+    list: The pieces between separators (capturing groups are not included)
+    """
+    pieces = []
+    position = start
+    for match in pattern.finditer(text, start, end):
+        pieces.append(text[position:match.start()])
+        position = match.end()
+    pieces.append(text[position:end])
+    return pieces
@@ -0,0 +1,171 @@
+import argparse
+import logging
+import os
+from functools import partial
+
+from pdfimage_analyzer import RESULT_FIELDS, SummaryCounter, classify_document, generate_summary
+from pdf_processing import reference_rows_from_pages
+from pdf_backends import open_backend, add_backend_argument
+from pdf_input import map_pdf
+from section_locator import section_pages as locate_section_pages
+from extraction_cache import (add_cache_arguments, cached, configure_cache, configure_cache_from_args, file_digest,
+                              get_cache)
+from output_sink import open_sink
+from records import PdfProfile
+import instrumentation
+from instrumentation import add_profile_arguments, configure_from_args, document, stage
+
+# Triage and reference extraction in one pass.
+#
+# Running pdfimage_analyzer.py and then process_all_pdfs.py over a corpus
+# opens and parses every PDF twice, usually with two different libraries.
+# Here each PDF is mapped and opened once: it is classified as in
+# pdfimage_analyzer, and only the types worth extracting (Text-based by
+# default) go on to the included-studies section, on the same open document.
+# The pages classification already extracted stay in the document's text
+# memo, and image-only scans are dropped before any section search.
+#
+# The output joins the two reports: one row per bold heading, carrying the
+# file's triage columns, and a single row with no heading for files that
+# were not extracted, had no headings or failed.
+#
+# Usage: python triage_extract.py <directory> <output.csv> [--workers 4] [--extract-hybrid]
+
+JOINED_FIELDS = RESULT_FIELDS[:-1] + ['Bold Text', 'Number of References', 'Extracted', 'Error']
+
+def triage_extract_pdf(pdf_path, max_pages=5, backend="pymupdf", early_exit=False, extract_types=("Text-based",)):
+    """
+    Classify one PDF and, if its type is in extract_types, count its references per bold heading.
+
+    Args:
+    pdf_path (str): Path to the PDF file
+    max_pages (int): Maximum number of pages to classify from
+    backend (str): PDF library for both steps (see pdf_backends)
+    early_exit (bool): Stop classifying from page text once the file is settled as Text-based;
+        "Avg Text/Page" is then a lower bound and differs from pdfimage_analyzer's
+    extract_types (tuple): PDF types whose references are extracted
+
+    Returns:
+    tuple: (PdfProfile, [(file_name, heading, count)] rows, error or None,
+    profiling records)
+    """
+    triage = PdfProfile(os.path.basename(pdf_path))
+    rows = []
+    error = None
+    with document(pdf_path):
+        try:
+            with map_pdf(pdf_path) as data:
+                with stage("open"):
+                    pdf = open_backend(pdf_path, backend, data)
+                with pdf:
+                    with stage("triage"):
+                        triage = classify_document(pdf, pdf_path, max_pages, early_exit)
+                    if triage.type in extract_types:
+                        if get_cache() is not None:
+                            file_digest(pdf_path, data)
+                        pages = cached(pdf_path, backend, "text", lambda: locate_section_pages(pdf))
+                        rows = reference_rows_from_pages(pdf_path, pages)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+    triage.error = error
+    return triage, rows, error, instrumentation.drain()
+
+def joined_rows(triage, rows, error, extracted):
+    # One row per heading with the triage columns repeated, or one bare row
+    base = triage.as_dict()
+    base['Extracted'] = 'Yes' if extracted else 'No'
+    base['Error'] = error
+    if not rows:
+        return [base]
+    return [{**base, 'Bold Text': heading, 'Number of References': count} for _, heading, count in rows]
+
+def init_worker(cache_args, profile_memory):
+    configure_cache(*cache_args)
+    instrumentation.init_worker(profile_memory)
+
+def triage_extract_directory(directory_path, output_file, workers=1, chunksize=4, max_pages=5, backend="pymupdf",
+                             early_exit=False, extract_types=("Text-based",), profile_report=None):
+    """
+    Classify every PDF in a directory and count the references of the text-based ones, in one pass.
+
+    Args:
+    directory_path (str): Directory containing PDF files
+    output_file (str): Output file (.csv, .jsonl or .parquet)
+    workers (int): Number of worker processes (1 = serial)
+    chunksize (int): PDFs handed to a worker process at a time
+    max_pages (int): Maximum number of pages to classify from
+    backend (str): PDF library to read the files with (see pdf_backends)
+    early_exit (bool): See triage_extract_pdf
+    extract_types (tuple): PDF types whose references are extracted
+    profile_report (str): Run report path; needs profiling enabled (see instrumentation)
+
+    Returns:
+    SummaryCounter: Triage totals for the run
+    """
+    pdf_files = sorted(filename for filename in os.listdir(directory_path) if filename.lower().endswith('.pdf'))
+    file_paths = [os.path.abspath(os.path.join(directory_path, filename)) for filename in pdf_files]
+    process_one = partial(triage_extract_pdf, max_pages=max_pages, backend=backend, early_exit=early_exit,
+                          extract_types=extract_types)
+
+    summary = SummaryCounter()
+    profile_records = []
+    extracted_files = 0
+    with open_sink(output_file, JOINED_FIELDS) as sink:
+        if workers > 1:
+            from concurrent.futures import ProcessPoolExecutor  # Serial runs skip loading multiprocessing
+
+            # Workers use the same extraction cache as the parent
+            cache = get_cache()
+            cache_args = (cache.cache_dir, cache.max_bytes) if cache is not None else (None,)
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                           initargs=(cache_args, instrumentation.worker_args()))
+            results = executor.map(process_one, file_paths, chunksize=chunksize)
+        else:
+            executor = None
+            results = map(process_one, file_paths)
+
+        try:
+            for idx, (triage, rows, error, records) in enumerate(results, start=1):
+                profile_records.extend(records)
+                extracted = error is None and triage.type in extract_types
+                extracted_files += extracted
+                summary.add(triage)
+                sink.write_many(joined_rows(triage, rows, error, extracted))
+                if error is not None:
+                    logging.warning("Failed to process %s (%d/%d): %s", triage.file_name, idx, len(file_paths), error)
+                else:
+                    logging.info("Finished processing %s (%d/%d): %s, %d headings.", triage.file_name, idx,
+                                 len(file_paths), triage.type, len(rows))
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+    logging.info("%d of %d files extracted. Results saved to %s.", extracted_files, len(file_paths), output_file)
+    if profile_report:
+        instrumentation.write_report(profile_report, profile_records)
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Classify PDFs and count the references of the text-based ones in a single pass.")
+    parser.add_argument("directory_path", help="Directory containing PDF files")
+    parser.add_argument("output_file_path", help="Output file (.csv, .jsonl or .parquet)")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes (1 = serial)")
+    parser.add_argument("--chunksize", type=int, default=4, help="PDFs handed to a worker process at a time")
+    parser.add_argument("--max-pages", type=int, default=5, help="Maximum number of pages to classify from")
+    parser.add_argument("--early-exit", action="store_true", help="Stop extracting page text once a PDF is settled as Text-based (Avg Text/Page becomes a lower bound)")
+    parser.add_argument("--extract-hybrid", action="store_true", help="Also extract references from Hybrid PDFs")
+    add_backend_argument(parser)
+    add_cache_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    configure_from_args(args)
+    configure_cache_from_args(args)
+    extract_types = ("Text-based", "Hybrid") if args.extract_hybrid else ("Text-based",)
+    summary = triage_extract_directory(args.directory_path, args.output_file_path, args.workers, args.chunksize,
+                                       args.max_pages, args.backend, args.early_exit, extract_types, args.profile)
+    generate_summary(summary)
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,336 @@
+import argparse
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import signal
+import struct
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from triage_extract import JOINED_FIELDS, joined_rows, triage_extract_pdf
+from extraction_cache import add_cache_arguments, configure_cache, configure_cache_from_args, get_cache
+from pdf_backends import add_backend_argument, preload_backend
+from run_manifest import (STATUS_DONE, STATUS_FAILED, ManifestWriter, default_manifest_path, drop_output_rows,
+                          fingerprint, load_manifest, select_pending)
+from output_sink import open_sink
+
+# Long-running intake daemon: triage and reference extraction for each PDF
+# as it lands in a directory.
+#
+# A pool of worker processes is started once, with the PDF library imported
+# in each, so a new file costs only its own triage and extraction rather than
+# an interpreter start and the library imports. The directory is watched with
+# inotify (Linux, through ctypes) for files closed after writing or moved in;
+# elsewhere, or with --poll, it is rescanned every --poll-interval seconds and
+# a file is taken once its size and mtime hold still for one interval.
+#
+# Results are appended to a CSV in the triage_extract layout, and each file
+# is recorded in the run manifest (see run_manifest), so a restarted daemon
+# only picks up files added or changed while it was down. A file that changes
+# after it was processed is processed again and its earlier rows replaced.
+# Replacing them rewrites the whole CSV (drop_output_rows), so each changed
+# file costs time in proportion to the output so far: fine for an intake of
+# some thousands of files, but a long-lived daemon with frequent changes
+# should be pointed at a fresh output file now and then.
+#
+# A worker that dies (out of memory, killed, a crash in the PDF library)
+# breaks the whole pool and every file in flight with it. The pool is
+# started again, and each of those files is given one more try before it is
+# recorded as failed; failed files are retried when the daemon restarts.
+#
+# Usage: python watch_daemon.py <intake_dir> <output.csv> [--workers 4] [--poll]
+
+# inotify(7) constants
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, name length
+
+# Times a file may be in flight when the worker pool breaks before it is recorded as failed
+MAX_POOL_BREAKS = 2
+POOL_BROKEN_ERROR = "BrokenProcessPool: a worker process died while this file was in flight"
+
+def is_pdf(name):
+    return name.lower().endswith('.pdf')
+
+def list_pdfs(directory_path):
+    return sorted(os.path.abspath(os.path.join(directory_path, name))
+                  for name in os.listdir(directory_path) if is_pdf(name))
+
+class InotifyWatcher:
+    """Reports PDFs closed after writing, or moved into the directory, through inotify."""
+
+    def __init__(self, directory_path):
+        self.directory_path = directory_path
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory_path), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for {directory_path}")
+
+    def wait(self, timeout):
+        """Block up to timeout seconds; return the paths of PDFs that were written or moved in."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            buffer = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        paths = []
+        offset = 0
+        while offset < len(buffer):
+            _, mask, _, length = EVENT_HEADER.unpack_from(buffer, offset)
+            offset += EVENT_HEADER.size
+            name = buffer[offset:offset + length].rstrip(b"\0").decode(errors="surrogateescape")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost: fall back to a full listing
+                logging.warning("inotify queue overflowed; rescanning %s", self.directory_path)
+                return list_pdfs(self.directory_path)
+            if name and is_pdf(name):
+                paths.append(os.path.abspath(os.path.join(self.directory_path, name)))
+        return paths
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingWatcher:
+    """Reports PDFs whose size and mtime changed and then held still for one poll interval."""
+
+    def __init__(self, directory_path, interval=2.0):
+        self.directory_path = directory_path
+        self.interval = interval
+        self.previous = self.snapshot()
+        # Files already present are the startup scan's, not the watcher's
+        self.reported = dict(self.previous)
+        self.next_poll = time.monotonic() + interval
+
+    def snapshot(self):
+        stats = {}
+        with os.scandir(self.directory_path) as entries:
+            for entry in entries:
+                if is_pdf(entry.name):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    stats[entry.path] = (stat.st_size, stat.st_mtime)
+        return stats
+
+    def wait(self, timeout):
+        """Block up to timeout seconds; return the paths of PDFs that settled since the last report."""
+        delay = self.next_poll - time.monotonic()
+        if delay > timeout:
+            time.sleep(timeout)
+            return []
+        time.sleep(max(delay, 0))
+        self.next_poll = time.monotonic() + self.interval
+        current = self.snapshot()
+        settled = [path for path, stat in current.items()
+                   if self.previous.get(path) == stat and self.reported.get(path) != stat]
+        for path in settled:
+            self.reported[path] = current[path]
+        self.previous = current
+        return [os.path.abspath(path) for path in sorted(settled)]
+
+    def close(self):
+        pass
+
+def open_watcher(directory_path, poll=False, poll_interval=2.0):
+    if not poll and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(directory_path)
+        except (OSError, AttributeError) as e:
+            logging.warning("inotify unavailable (%s); polling every %.1fs", e, poll_interval)
+    return PollingWatcher(directory_path, poll_interval)
+
+def init_worker(cache_args, backend):
+    # Pay the library imports once per worker, before the first file arrives
+    configure_cache(*cache_args)
+    preload_backend(backend)
+
+def warm_up():
+    pass
+
+def start_pool(workers, cache_args, backend):
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(cache_args, backend))
+    # One task per worker starts them all now, rather than on the first files
+    for future in [executor.submit(warm_up) for _ in range(workers)]:
+        future.result()
+    return executor
+
+def process_file(pdf_path, max_pages=5, backend="pymupdf", extract_types=("Text-based",)):
+    # Runs in a worker process; the fingerprint is taken before extraction so
+    # the manifest describes the contents the rows came from
+    try:
+        file_fingerprint = fingerprint(pdf_path)
+    except OSError as e:
+        return None, None, [], f"{type(e).__name__}: {e}"
+    triage, rows, error, _ = triage_extract_pdf(pdf_path, max_pages, backend, False, extract_types)
+    return file_fingerprint, triage, rows, error
+
+def watch_directory(directory_path, output_file, workers=2, max_pages=5, backend="pymupdf",
+                    extract_types=("Text-based",), poll=False, poll_interval=2.0, manifest_file=None):
+    """
+    Process every new or changed PDF in a directory until stopped (SIGINT/SIGTERM).
+
+    Args:
+    directory_path (str): Intake directory
+    output_file (str): Output CSV, appended to (JOINED_FIELDS columns)
+    workers (int): Worker processes kept running
+    max_pages (int): Maximum number of pages to classify from
+    backend (str): PDF library (see pdf_backends)
+    extract_types (tuple): PDF types whose references are extracted
+    poll (bool): Poll the directory instead of using inotify
+    poll_interval (float): Seconds between directory scans when polling
+    manifest_file (str): Run manifest path, defaults to <output_file>.manifest.jsonl
+
+    Returns:
+    int: Files processed
+    """
+    manifest_file = manifest_file or default_manifest_path(output_file)
+    manifest = load_manifest(manifest_file)
+    processed = 0
+
+    # Workers share the parent's extraction cache
+    cache = get_cache()
+    cache_args = (cache.cache_dir, cache.max_bytes) if cache is not None else (None,)
+    executor = start_pool(workers, cache_args, backend)
+    logging.info("%d workers ready (%s backend loaded).", workers, backend)
+
+    watcher = open_watcher(directory_path, poll, poll_interval)
+    in_flight = {}  # future -> (path, time the file was seen)
+    queued = set()  # Paths that changed again while in flight
+    pool_breaks = {}  # path -> times the pool broke while it was in flight
+
+    def submit(path, seen):
+        if any(in_flight_path == path for in_flight_path, _ in in_flight.values()):
+            queued.add(path)
+            return
+        if not select_pending([path], manifest, incremental=True):
+            return  # Touched but unchanged since it was processed
+        in_flight[executor.submit(process_file, path, max_pages, backend, extract_types)] = (path, seen)
+
+    # SIGTERM ends the loop between files rather than in the middle of a write
+    stopping = []
+    previous_handler = signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+    try:
+        with ManifestWriter(manifest_file) as manifest_writer:
+            def finish(path, file_fingerprint, output_rows, status, rows, error):
+                if manifest.get(path) is not None:
+                    # A changed file replaces its earlier rows
+                    drop_output_rows(output_file, [os.path.basename(path)])
+                with open_sink(output_file, JOINED_FIELDS, append=True) as sink:
+                    sink.write_many(output_rows)
+                manifest_writer.record(path, file_fingerprint, status, rows=rows, error=error)
+                size, mtime, sha256 = file_fingerprint
+                manifest[path] = {"path": path, "size": size, "mtime": mtime, "sha256": sha256, "status": status}
+
+            # Files that arrived or changed while the daemon was down; any rows
+            # they have are stale or were written just before a crash
+            startup = select_pending(list_pdfs(directory_path), manifest, incremental=True)
+            drop_output_rows(output_file, [os.path.basename(path) for path in startup])
+            logging.info("Watching %s; %d files to catch up on.", directory_path, len(startup))
+            for path in startup:
+                submit(path, time.monotonic())
+
+            while not stopping:
+                for path in watcher.wait(0.05 if in_flight else 1.0):
+                    if os.path.exists(path):
+                        submit(path, time.monotonic())
+                if not in_flight:
+                    continue
+
+                done, _ = wait(in_flight, timeout=0, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path, seen = in_flight.pop(future)
+                    name = os.path.basename(path)
+                    try:
+                        file_fingerprint, triage, rows, error = future.result()
+                    except BrokenProcessPool:
+                        # Which file killed the worker is unknown; every one still
+                        # in flight is lost, while finished ones keep their results
+                        lost = [path]
+                        for other in list(in_flight):
+                            if not other.done() or other.exception() is not None:
+                                lost.append(in_flight.pop(other)[0])
+                        logging.error("A worker process died; restarting the pool with %d files in flight.", len(lost))
+                        executor.shutdown(cancel_futures=True)
+                        executor = start_pool(workers, cache_args, backend)
+                        for lost_path in lost:
+                            pool_breaks[lost_path] = pool_breaks.get(lost_path, 0) + 1
+                            if pool_breaks[lost_path] < MAX_POOL_BREAKS:
+                                submit(lost_path, time.monotonic())
+                                continue
+                            pool_breaks.pop(lost_path)
+                            queued.discard(lost_path)
+                            try:
+                                lost_fingerprint = fingerprint(lost_path)
+                            except OSError as e:
+                                logging.warning("Skipped %s: %s: %s", os.path.basename(lost_path), type(e).__name__, e)
+                                continue
+                            finish(lost_path, lost_fingerprint,
+                                   [{'File Name': os.path.basename(lost_path), 'Extracted': 'No', 'Error': POOL_BROKEN_ERROR}],
+                                   STATUS_FAILED, 0, POOL_BROKEN_ERROR)
+                            processed += 1
+                            logging.error("%s: failed, in flight each time the pool broke.", os.path.basename(lost_path))
+                        break  # Anything else finished is picked up on the next pass
+                    pool_breaks.pop(path, None)
+                    if triage is None:
+                        # Gone before a worker got to it
+                        logging.warning("Skipped %s: %s", name, error)
+                        continue
+
+                    extracted = error is None and triage.type in extract_types
+                    status = STATUS_FAILED if error is not None else STATUS_DONE
+                    finish(path, file_fingerprint, joined_rows(triage, rows, error, extracted), status, len(rows), error)
+                    processed += 1
+                    logging.info("%s: %s, %d headings, written %.2fs after it arrived.", name, triage.type or "failed",
+                                 len(rows), time.monotonic() - seen)
+
+                    if path in queued:
+                        queued.discard(path)
+                        submit(path, time.monotonic())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        logging.info("Stopping; %d files in progress will be picked up on the next start.", len(in_flight))
+        signal.signal(signal.SIGTERM, previous_handler)
+        watcher.close()
+        executor.shutdown(cancel_futures=True)
+    return processed
+
+def main():
+    parser = argparse.ArgumentParser(description="Watch a directory and triage and extract each PDF as it arrives.")
+    parser.add_argument("directory_path", help="Intake directory to watch")
+    parser.add_argument("output_file_path", help="Output CSV file, appended to")
+    parser.add_argument("--workers", type=int, default=2, help="Worker processes kept running")
+    parser.add_argument("--max-pages", type=int, default=5, help="Maximum number of pages to classify from")
+    parser.add_argument("--extract-hybrid", action="store_true", help="Also extract references from Hybrid PDFs")
+    parser.add_argument("--poll", action="store_true", help="Poll the directory instead of using inotify")
+    parser.add_argument("--poll-interval", type=float, default=2.0, help="Seconds between directory scans when polling")
+    parser.add_argument("--manifest", help="Run manifest path (default: <output_file_path>.manifest.jsonl)")
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"], help="Set the logging level")
+    add_backend_argument(parser)
+    add_cache_arguments(parser)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level, format='%(asctime)s - %(levelname)s - %(message)s')
+    configure_cache_from_args(args)
+    extract_types = ("Text-based", "Hybrid") if args.extract_hybrid else ("Text-based",)
+    watch_directory(args.directory_path, args.output_file_path, args.workers, args.max_pages, args.backend,
+                    extract_types, args.poll, args.poll_interval, args.manifest)
+    return 0
+
+if __name__ == "__main__":
+    exit(main())